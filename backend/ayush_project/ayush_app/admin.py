@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Patient, Diagnosis , AuditLog
+from .models import Patient, Diagnosis , AuditLog, PipelineJob
 # Register your models here.
 
 admin.site.register(Patient)
 admin.site.register(Diagnosis)
-admin.site.register(AuditLog)
\ No newline at end of file
+admin.site.register(AuditLog)
+admin.site.register(PipelineJob)
\ No newline at end of file
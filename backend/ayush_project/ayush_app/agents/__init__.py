@@ -5,3 +5,4 @@ from .extraction_agent import ExtractionAgent
 from .mapping_agent import MappingAgent
 from .validation_agent import ValidationAgent
 from .output_agent import OutputAgent
+from .registry import AgentRegistry, get_registry
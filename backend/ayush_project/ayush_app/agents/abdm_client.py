@@ -1,9 +1,12 @@
 # agents/abdm_client.py
 import os
-import time
 import requests
 from dotenv import load_dotenv
 
+from .http_clients import AsyncClientHolder, build_session
+from .resilience import abdm_dependency
+from .token_broker import get_token_manager
+
 load_dotenv()
 
 ABDM_CLIENT_ID = os.getenv("ABDM_CLIENT_ID")
@@ -15,47 +18,83 @@ DEFAULT_TIMEOUT = 10  # seconds
 
 class ABDMClient:
     def __init__(self):
-        self._token = None
-        self._expires = 0
+        # Keep-alive pools: requests.Session for sync callers, httpx for the async pipeline
+        self._session = build_session()
+        self._async = AsyncClientHolder(DEFAULT_TIMEOUT)
 
-    def _fetch_token(self):
+    def _token_request(self):
         if not ABDM_CLIENT_ID or not ABDM_CLIENT_SECRET or not ABDM_TOKEN_URL:
             raise EnvironmentError("ABDM credentials or token URL not configured")
-        data = {
+        return {
             "client_id": ABDM_CLIENT_ID,
             "client_secret": ABDM_CLIENT_SECRET,
             "grant_type": "client_credentials"
         }
-        r = requests.post(ABDM_TOKEN_URL, data=data, timeout=DEFAULT_TIMEOUT)
+
+    def _fetch_token(self):
+        r = self._session.post(ABDM_TOKEN_URL, data=self._token_request(), timeout=DEFAULT_TIMEOUT)
         r.raise_for_status()
-        js = r.json()
-        self._token = js.get("access_token")
-        self._expires = time.time() + js.get("expires_in", 3600)
+        return r.json()
 
-    def _token_ok(self):
-        return self._token and time.time() < self._expires - 30
+    def _tokens(self):
+        """Token shared by every ABDMClient in this process and across workers (see token_broker)."""
+        return get_token_manager("abdm", self._fetch_token, f"{ABDM_CLIENT_ID}@{ABDM_TOKEN_URL}")
 
-    def push_condition(self, fhir_json):
+    def _condition_url(self):
         if not ABDM_FHIR_BASE:
             raise EnvironmentError("ABDM FHIR base URL not configured")
-        try:
-            if not self._token_ok():
-                self._fetch_token()
+        return f"{ABDM_FHIR_BASE.rstrip('/')}/Condition"
+
+    @staticmethod
+    def _headers(token):
+        return {"Authorization": f"Bearer {token}", "Content-Type": "application/fhir+json"}
+
+    def _push_once(self, url, fhir_json):
+        tokens = self._tokens()
+        token = tokens.token()
 
-            headers = {"Authorization": f"Bearer {self._token}", "Content-Type": "application/fhir+json"}
-            url = f"{ABDM_FHIR_BASE.rstrip('/')}/Condition"
-            r = requests.post(url, json=fhir_json, headers=headers, timeout=DEFAULT_TIMEOUT)
+        r = self._session.post(url, json=fhir_json, headers=self._headers(token), timeout=DEFAULT_TIMEOUT)
 
-            if r.status_code == 401:
-                self._fetch_token()
-                headers["Authorization"] = f"Bearer {self._token}"
-                r = requests.post(url, json=fhir_json, headers=headers, timeout=DEFAULT_TIMEOUT)
+        if r.status_code == 401:
+            token = tokens.invalidate(token)
+            r = self._session.post(url, json=fhir_json, headers=self._headers(token), timeout=DEFAULT_TIMEOUT)
+
+        r.raise_for_status()
+        return r.json()
 
-            r.raise_for_status()
-            return r.json()
+    async def _apush_once(self, url, fhir_json):
+        tokens = self._tokens()
+        token = await tokens.atoken()
+
+        http = self._async.get()
+        r = await http.post(url, json=fhir_json, headers=self._headers(token))
+
+        if r.status_code == 401:
+            token = await tokens.ainvalidate(token)
+            r = await http.post(url, json=fhir_json, headers=self._headers(token))
+
+        r.raise_for_status()
+        return r.json()
+
+    def push_condition(self, fhir_json):
+        """
+        POST a FHIR Condition behind the ABDM circuit breaker. Raises
+        CircuitOpenError without calling ABDM while the circuit is open.
+        """
+        url = self._condition_url()
+        try:
+            return abdm_dependency.call(lambda: self._push_once(url, fhir_json))
         except requests.RequestException as e:
             # network/http error
             raise
         except EnvironmentError:
             # credentials missing
             raise
+
+    async def apush_condition(self, fhir_json):
+        """Async push_condition() for the LangGraph pipeline, using the pooled httpx client."""
+        url = self._condition_url()
+        return await abdm_dependency.acall(lambda: self._apush_once(url, fhir_json))
+
+    async def aclose(self):
+        await self._async.aclose()
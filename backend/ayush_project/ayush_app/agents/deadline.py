@@ -0,0 +1,57 @@
+# agents/deadline.py
+import math
+import os
+import time
+
+# Default latency budget for interactive /run_pipeline/ requests (seconds); 0 = none
+PIPELINE_LATENCY_BUDGET = float(os.getenv("PIPELINE_LATENCY_BUDGET", "0"))
+# Optional steps are skipped when less than this many seconds remain
+SKIP_ENRICHMENT_BELOW = float(os.getenv("PIPELINE_SKIP_ENRICHMENT_BELOW", "1.5"))
+SKIP_DETAILED_TRANSLATION_BELOW = float(os.getenv("PIPELINE_SKIP_DETAILED_BELOW", "1.0"))
+SKIP_VALIDATION_BELOW = float(os.getenv("PIPELINE_SKIP_VALIDATION_BELOW", "1.0"))
+# Shortest timeout handed to an external call, so a nearly spent budget fails fast rather than with 0
+MIN_CALL_TIMEOUT = 0.05
+
+
+class Deadline:
+    """
+    Absolute wall-clock deadline for one pipeline run. The epoch timestamp
+    travels in PipelineState["deadline"]; Deadline() (no timestamp) never
+    expires, so agents can take `deadline=None` and behave as before.
+    """
+
+    def __init__(self, at=None):
+        self.at = at
+
+    @classmethod
+    def after(cls, seconds):
+        return cls(time.time() + seconds if seconds else None)
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state.get("deadline"))
+
+    @property
+    def bounded(self):
+        return self.at is not None
+
+    def remaining(self):
+        if self.at is None:
+            return math.inf
+        return max(0.0, self.at - time.time())
+
+    def allows(self, seconds):
+        return self.remaining() >= seconds
+
+    def spent(self):
+        """Whether a bounded budget is (all but) used up - a call timing out now was cut short by it."""
+        return self.bounded and self.remaining() < MIN_CALL_TIMEOUT
+
+    def timeout(self, default):
+        """Per-call timeout: `default`, capped by what is left of the budget."""
+        return max(MIN_CALL_TIMEOUT, min(default, self.remaining()))
+
+
+def skipped_step(step, deadline):
+    """A skipped_steps entry recording why an optional step did not run."""
+    return {"step": step, "reason": f"latency budget: {deadline.remaining():.2f}s left"}
@@ -1,8 +1,8 @@
 # agents/extraction_agent.py
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from groq import Groq
 
 ENV_PATH = Path(__file__).resolve().parents[4] / ".env"
 if ENV_PATH.exists():
@@ -10,20 +10,77 @@ if ENV_PATH.exists():
 else:
     load_dotenv()
 
+from .deadline import Deadline
+from .http_clients import GROQ_TIMEOUT, build_groq_client
+from .llm_batcher import strip_code_fence
+from .resilience import groq_dependency
+from .term_scanner import get_term_scanner
 from .tools import find_term_in_text
 
 DEFAULT_MODEL = os.getenv("GROQ_EXTRACTION_MODEL", "llama-3.3-70b-versatile")
+# When enabled, a seed-term hit found by the local scanner skips the Groq call
+SCAN_FIRST = os.getenv("EXTRACTION_SCAN_FIRST", "0") == "1"
+# Upper bound on terms taken from one note (each one is mapped and validated)
+MAX_TERMS = int(os.getenv("EXTRACTION_MAX_TERMS", "8"))
+
+
+def parse_term_list(content):
+    """
+    Parse the JSON array returned by the multi-term prompt. Tolerates a
+    ```json fence around it; returns None if the reply is not a list of strings.
+    """
+    try:
+        terms = json.loads(strip_code_fence(content))
+    except ValueError:
+        return None
+    if not isinstance(terms, list) or not all(isinstance(t, str) for t in terms):
+        return None
+    return [t.strip() for t in terms if t.strip()]
+
+
+def locate_terms(text, terms, limit=None):
+    """
+    Attach character spans to extracted terms: [{term, start, end}]. Terms
+    are de-duplicated case-insensitively; a term that does not occur
+    verbatim in the text keeps start/end as None.
+    """
+    lowered = text.lower()
+    seen = set()
+    located = []
+    for term in terms:
+        key = term.casefold()
+        if key in seen:
+            continue
+        seen.add(key)
+        start = lowered.find(term.lower())
+        located.append({
+            "term": term,
+            "start": start if start >= 0 else None,
+            "end": start + len(term) if start >= 0 else None,
+        })
+        if limit and len(located) >= limit:
+            break
+    return located
 
 
 class ExtractionAgent:
-    def __init__(self, groq_api_key=None):
+    def __init__(self, groq_api_key=None, scan_first=None):
         api_key = groq_api_key or os.getenv("GROQ_API_KEY")
-        self.client = Groq(api_key=api_key) if api_key else None
+        self.client = build_groq_client(api_key) if api_key else None
+        self.scan_first = SCAN_FIRST if scan_first is None else scan_first
+        self.max_terms = MAX_TERMS
 
     def run(self, text):
         """
-        Always tries Groq API first. Only falls back to CSV if Groq API fails.
+        Tries Groq API first (or the local term scanner first when scan_first
+        is enabled). Only falls back to CSV if Groq API fails.
         """
+        # Step 0: Optional sub-millisecond tier - known seed term in the note
+        if self.scan_first:
+            hit = find_term_in_text(text)
+            if hit:
+                return hit
+
         prompt = f"Extract only the AYUSH disease term from this text: {text}"
         
         # Step 1: ALWAYS try Groq API first (real API call)
@@ -31,12 +88,12 @@ class ExtractionAgent:
             if not self.client:
                 raise RuntimeError("Groq client missing - check GROQ_API_KEY in .env")
             
-            resp = self.client.chat.completions.create(
+            resp = groq_dependency.call(lambda: self.client.chat.completions.create(
                 model=DEFAULT_MODEL,
                 messages=[{"role": "user", "content": prompt}],
-            max_tokens=20,
+                max_tokens=20,
                 temperature=0,
-        )
+            ))
             
             extracted = resp.choices[0].message.content.strip()
             if extracted:
@@ -53,3 +110,63 @@ class ExtractionAgent:
         
         # Last resort: return original text
         return text
+
+    def _scan(self, text):
+        hits = get_term_scanner().best_matches(text)
+        seen = set()
+        terms = []
+        for hit in hits:
+            if hit["term"].casefold() in seen:
+                continue
+            seen.add(hit["term"].casefold())
+            terms.append({"term": hit["term"], "start": hit["start"], "end": hit["end"]})
+        return terms[:self.max_terms]
+
+    def run_many(self, text, deadline=None):
+        """
+        Multi-term variant of run(): every AYUSH disease term in the note,
+        as [{term, start, end}] with spans into `text`. Same tiers as run():
+        scanner (when scan_first), Groq, then the CSV seed-term scanner; the
+        whole text is the last resort. The Groq call's timeout is capped by
+        the `deadline`.
+        """
+        deadline = deadline or Deadline()
+        if self.scan_first:
+            hits = self._scan(text)
+            if hits:
+                return hits
+
+        prompt = (
+            "Extract every AYUSH disease term mentioned in this clinical text. "
+            "Return ONLY a JSON array of the terms exactly as they are written in the text, "
+            "most significant first, e.g. [\"Vataja Jwara\", \"Kasa\"]. "
+            f"Return [] if there are none.\n\nText: {text}"
+        )
+
+        try:
+            if not self.client:
+                raise RuntimeError("Groq client missing - check GROQ_API_KEY in .env")
+
+            resp = groq_dependency.call(lambda: self.client.chat.completions.create(
+                model=DEFAULT_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=100,
+                temperature=0,
+                timeout=deadline.timeout(GROQ_TIMEOUT),
+            ), deadline)
+
+            content = resp.choices[0].message.content.strip()
+            terms = parse_term_list(content)
+            if terms is None and content:
+                # Model ignored the format - treat the reply as a single term like run()
+                terms = [content]
+            if terms:
+                return locate_terms(text, terms, self.max_terms)
+        except Exception as e:
+            print(f"Groq API call failed for multi-term extraction: {str(e)}")
+
+        fallback = self._scan(text)
+        if fallback:
+            return fallback
+
+        return [{"term": text, "start": 0, "end": len(text)}]
@@ -0,0 +1,77 @@
+# agents/http_clients.py
+import asyncio
+import os
+
+import httpx
+import requests
+from groq import Groq
+from requests.adapters import HTTPAdapter
+
+# Connection pool limits shared by the ICD and ABDM clients
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # seconds
+HTTP_ENABLE_HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "1") == "1"
+# Per-request Groq timeout (seconds); retries are left to agents/resilience.py
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "10"))
+
+
+def http2_available():
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    if not HTTP_ENABLE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_session():
+    """requests.Session with a keep-alive pool, for the sync search()/push_condition() APIs."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def build_groq_client(api_key):
+    """Groq client with the SDK's own retries off, so the shared retry budget and breaker apply."""
+    return Groq(api_key=api_key, max_retries=0, timeout=GROQ_TIMEOUT)
+
+
+def build_async_client(timeout):
+    """httpx.AsyncClient with pooled keep-alive connections and HTTP/2 when available."""
+    limits = httpx.Limits(
+        max_connections=HTTP_POOL_MAXSIZE,
+        max_keepalive_connections=HTTP_POOL_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2_available(), timeout=timeout)
+
+
+class AsyncClientHolder:
+    """
+    Lazily creates one AsyncClient per event loop. httpx pools are bound to
+    the loop they were first used on, so a client is rebuilt if it is asked
+    for from a different loop.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._client = None
+        self._loop = None
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = build_async_client(self.timeout)
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
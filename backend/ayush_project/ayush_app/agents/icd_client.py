@@ -1,11 +1,23 @@
 # agents/icd_client.py
+import asyncio
+import contextvars
 import os
 import time
+import httpx
 import requests
 import re
+import sqlite3
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
 from pathlib import Path
 
+from .deadline import Deadline
+from .metrics import count_cache
+from .http_clients import AsyncClientHolder, build_session
+from .resilience import CircuitOpenError, cut_short, icd_dependency, raise_for_transient_status
+from .token_broker import get_token_manager
+
 # Load env vars from repo root
 ENV_PATH = Path(__file__).resolve().parents[4] / ".env"
 if ENV_PATH.exists():
@@ -20,9 +32,20 @@ ICD_TOKEN_URL = os.getenv("ICD_TOKEN_URL", "https://icdaccessmanagement.who.int/
 # Force the correct URL (matching user's working script)
 ICD_SEARCH_URL = "https://id.who.int/icd/release/11/2024-01/mms/search"
 ICD_API_VERSION = os.getenv("ICD_API_VERSION", "v2")
+# live: WHO API only | offline: local MMS index only | hybrid: index, then API when it finds nothing
+ICD_SEARCH_MODE = os.getenv("ICD_SEARCH_MODE", "live").lower()
+ICD_INDEX_PATH = os.getenv("ICD_INDEX_PATH")
 
 DEFAULT_TIMEOUT = 10  # seconds
 
+# Search result cache (seconds); zero-result and failed searches expire sooner
+ICD_CACHE_TTL = int(os.getenv("ICD_CACHE_TTL", "86400"))
+ICD_NEGATIVE_CACHE_TTL = int(os.getenv("ICD_NEGATIVE_CACHE_TTL", "600"))
+ICD_ERROR_CACHE_TTL = int(os.getenv("ICD_ERROR_CACHE_TTL", "30"))
+ICD_CACHE_MAX_ENTRIES = int(os.getenv("ICD_CACHE_MAX_ENTRIES", "2048"))
+# Debug: attach each result's full WHO entity as "raw" (large; off by default)
+ICD_KEEP_RAW = os.getenv("ICD_KEEP_RAW", "0") == "1"
+
 def clean_html(text):
     """Remove WHO HTML tags like <em class='found'>."""
     if not text:
@@ -52,122 +75,316 @@ def extract_description(entity):
     
     return None
 
+class SearchCache:
+    """
+    Bounded in-memory TTL cache with LRU eviction, shared by every
+    ICD11Client in the process. A TTL of 0 disables caching for that entry.
+    """
+
+    def __init__(self, max_entries=ICD_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_search_cache = SearchCache()
+
+
 class ICD11Client:
-    def __init__(self):
-        self._token = None
-        self._expires = 0
+    def __init__(self, mode=None, index_path=None):
+        self.mode = (mode or ICD_SEARCH_MODE).lower()
+        self.index_path = index_path or ICD_INDEX_PATH
+        self._index = None
+        # Keep-alive pools: requests.Session for sync callers, httpx for the async pipeline
+        self._session = build_session()
+        self._async = AsyncClientHolder(DEFAULT_TIMEOUT)
 
-    def _fetch_token(self):
+    def _token_request(self):
         if not ICD_CLIENT_ID or not ICD_CLIENT_SECRET or not ICD_TOKEN_URL:
             raise EnvironmentError("ICD11 credentials or token URL not configured")
-        data = {
+        return {
             "grant_type": "client_credentials",
             "client_id": ICD_CLIENT_ID,
             "client_secret": ICD_CLIENT_SECRET,
             "scope": "icdapi_access"
         }
+
+    def _fetch_token(self):
+        data = self._token_request()
         print(f"🔑 Fetching ICD API token from {ICD_TOKEN_URL}")
-        r = requests.post(ICD_TOKEN_URL, data=data, timeout=DEFAULT_TIMEOUT)
+        r = self._session.post(ICD_TOKEN_URL, data=data, timeout=DEFAULT_TIMEOUT)
         r.raise_for_status()
         js = r.json()
-        self._token = js.get("access_token")
-        self._expires = time.time() + js.get("expires_in", 3600)
         print(f"✅ ICD API token obtained (expires in {js.get('expires_in', 3600)}s)")
+        return js
+
+    def _tokens(self):
+        """Token shared by every ICD11Client in this process and across workers (see token_broker)."""
+        return get_token_manager("icd", self._fetch_token, f"{ICD_CLIENT_ID}@{ICD_TOKEN_URL}")
 
-    def _token_ok(self):
-        return self._token and time.time() < self._expires - 30
+    def _get_index(self):
+        if self._index is None:
+            from .icd_index import ICDIndex
+            self._index = ICDIndex(self.index_path)
+        return self._index
+
+    def _search_offline(self, query):
+        try:
+            results = self._get_index().search(query)
+            print(f"📚 Local ICD-11 index returned {len(results)} results for '{query}'")
+            return results
+        except sqlite3.Error as e:
+            # Missing or unreadable index - behave like an empty search
+            print(f"❌ Local ICD-11 index unavailable: {str(e)}")
+            return []
 
     def search(self, query):
         """
-        Returns list of dicts with code, title, description, and raw data.
+        Returns list of dicts with code, title and description.
+        In offline/hybrid mode the local MMS index answers first; the live
+        API is only consulted in live mode or as the hybrid fallback.
+        """
+        if self.mode in ("offline", "hybrid"):
+            results = self._search_offline(query)
+            if results or self.mode == "offline":
+                return results
+        key = self._cache_key(query)
+        cached = self._cached(query, key)
+        if cached is not None:
+            return cached
+        return self._store(key, *self._request_search(query))
+
+    async def asearch(self, query, deadline=None):
+        """
+        Async search() for the LangGraph pipeline, using the pooled httpx
+        client. With a `deadline` the request timeout (and any retry) is
+        capped by the remaining latency budget.
+        """
+        if self.mode in ("offline", "hybrid"):
+            # SQLite FTS query: keep it off the event loop
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, contextvars.copy_context().run, self._search_offline, query
+            )
+            if results or self.mode == "offline":
+                return results
+        key = self._cache_key(query)
+        cached = self._cached(query, key)
+        if cached is not None:
+            return cached
+        return self._store(key, *(await self._arequest_search(query, deadline or Deadline())))
+
+    @staticmethod
+    def _cache_key(query):
+        return (" ".join((query or "").lower().split()), ICD_SEARCH_URL, ICD_API_VERSION)
+
+    # Live WHO API searches sit behind the process-wide result cache. Hits,
+    # misses and errors are cached with their own TTLs; cached entries
+    # never carry the raw entity payload.
+    @staticmethod
+    def _cached(query, key):
+        cached = _search_cache.get(key)
+        count_cache("icd_search", cached is not None)
+        if cached is None:
+            return None
+        print(f"💾 ICD cache hit for '{query}' ({len(cached)} results)")
+        return [dict(r) for r in cached]
+
+    @staticmethod
+    def _store(key, results, ok):
+        if ok is None:
+            return results  # cut short (open circuit, latency budget): says nothing about the query
+        if results:
+            ttl = ICD_CACHE_TTL
+        else:
+            ttl = ICD_NEGATIVE_CACHE_TTL if ok else ICD_ERROR_CACHE_TTL
+        _search_cache.set(key, [{k: v for k, v in r.items() if k != "raw"} for r in results], ttl)
+        return results
+
+    @staticmethod
+    def _search_headers(token):
+        return {
+            "Authorization": f"Bearer {token}",
+            "API-Version": ICD_API_VERSION,
+            "Accept-Language": "en",
+            "Accept": "application/json",
+            "Content-Type": "application/x-www-form-urlencoded"  # Important: form-data (not JSON)
+        }
+
+    @staticmethod
+    def _config_ok():
+        # Verify credentials and URL are loaded
+        if not ICD_CLIENT_ID or not ICD_CLIENT_SECRET:
+            print(f"❌ ICD API credentials missing: CLIENT_ID={bool(ICD_CLIENT_ID)}, CLIENT_SECRET={bool(ICD_CLIENT_SECRET)}")
+            return False
+        if not ICD_SEARCH_URL:
+            print(f"❌ ICD_SEARCH_URL not configured")
+            return False
+        return True
+
+    def _search_once(self, query, body):
+        """One search attempt (token refresh included); 429/5xx raise for the retry policy."""
+        tokens = self._tokens()
+        token = tokens.token()
+
+        print(f"🔍 Searching ICD-11 API for: '{query}'")
+        print(f"   URL: {ICD_SEARCH_URL}")
+        r = self._session.post(ICD_SEARCH_URL, headers=self._search_headers(token), data=body, timeout=DEFAULT_TIMEOUT)
+
+        if r.status_code == 401:
+            # Token expired - refresh once
+            print("🔄 Token expired, refreshing...")
+            token = tokens.invalidate(token)
+            r = self._session.post(ICD_SEARCH_URL, headers=self._search_headers(token), data=body, timeout=DEFAULT_TIMEOUT)
+        return raise_for_transient_status(r)
+
+    async def _asearch_once(self, query, body, timeout=DEFAULT_TIMEOUT):
+        tokens = self._tokens()
+        token = await tokens.atoken()
+
+        print(f"🔍 Searching ICD-11 API for: '{query}'")
+        print(f"   URL: {ICD_SEARCH_URL}")
+        http = self._async.get()
+        r = await http.post(ICD_SEARCH_URL, headers=self._search_headers(token), data=body, timeout=timeout)
+
+        if r.status_code == 401:
+            # Token expired - refresh once
+            print("🔄 Token expired, refreshing...")
+            token = await tokens.ainvalidate(token)
+            r = await http.post(ICD_SEARCH_URL, headers=self._search_headers(token), data=body, timeout=timeout)
+        return raise_for_transient_status(r)
+
+    def _request_search(self, query):
+        """
+        Returns (results, ok): results are dicts with code, title, description,
+        and raw data; ok is False when the call failed rather than found nothing,
+        and None when it was never made or was cut short (not cached).
         Uses POST with form-data (exactly matching the working ICD_api_key.py script).
+        Runs behind the ICD circuit breaker: while it is open the search
+        fails immediately and the caller falls back to the CSV mapping.
         """
         try:
-            # Verify credentials and URL are loaded
-            if not ICD_CLIENT_ID or not ICD_CLIENT_SECRET:
-                print(f"❌ ICD API credentials missing: CLIENT_ID={bool(ICD_CLIENT_ID)}, CLIENT_SECRET={bool(ICD_CLIENT_SECRET)}")
-                return []
-            
-            if not ICD_SEARCH_URL:
-                print(f"❌ ICD_SEARCH_URL not configured")
-                return []
-            
-            if not self._token_ok():
-                self._fetch_token()
-
-            headers = {
-                "Authorization": f"Bearer {self._token}",
-                "API-Version": ICD_API_VERSION,
-                "Accept-Language": "en",
-                "Accept": "application/json",
-                "Content-Type": "application/x-www-form-urlencoded"  # Important: form-data (not JSON)
-            }
-            
+            if not self._config_ok():
+                return [], False
+
             # Use POST with form-data (exactly as in working ICD_api_key.py)
-            body = {
-                "q": query,
-                "chapterFilter": "mms"
-            }
-            
-            print(f"🔍 Searching ICD-11 API for: '{query}'")
-            print(f"   URL: {ICD_SEARCH_URL}")
-            r = requests.post(ICD_SEARCH_URL, headers=headers, data=body, timeout=DEFAULT_TIMEOUT)
-
-            if r.status_code == 401:
-                # Token expired - refresh once
-                print("🔄 Token expired, refreshing...")
-                self._fetch_token()
-                headers["Authorization"] = f"Bearer {self._token}"
-                r = requests.post(ICD_SEARCH_URL, headers=headers, data=body, timeout=DEFAULT_TIMEOUT)
-
-            if r.status_code != 200:
-                print(f"❌ ICD Search error {r.status_code}: {r.text[:200]}")
-                return []
-
-            data = r.json()
-            
-            # Debug: Check what the API actually returned
-            if not data:
-                print(f"⚠️ ICD API returned empty JSON for '{query}'")
-                return []
-            
-            ents = data.get("destinationEntities", [])
-            
-            # Debug: Log raw response structure
-            if not ents:
-                print(f"⚠️ ICD API returned 0 results for '{query}'")
-                print(f"   Response keys: {list(data.keys())}")
-                if "destinationEntities" in data:
-                    print(f"   destinationEntities type: {type(data['destinationEntities'])}")
-                return []
-            
-            out = []
-            for e in ents[:10]:  # Get more results to allow better prioritization
-                title = clean_html(e.get("title", ""))
-                code = e.get("theCode")
-                description = extract_description(e)
-                
-                if code and title:
-                    out.append({
-                        "code": code,
-                        "title": title,
-                        "description": description,  # Add description
-                        "raw": e
-                    })
-            
-            print(f"✅ ICD API returned {len(out)} results for '{query}'")
-            return out
+            body = {"q": query, "chapterFilter": "mms"}
+            r = icd_dependency.call(lambda: self._search_once(query, body))
+            return self._parse_search_response(query, r)
+        except CircuitOpenError as e:
+            print(f"⚡ {str(e)} ('{query}')")
+            return [], None
         except requests.RequestException as e:
             # network or http error — log and return empty
             print(f"❌ ICD API request failed for '{query}': {str(e)}")
-            return []
-        except EnvironmentError as e:
+            return [], False
+        except Exception as e:
+            return self._search_failed(query, e)
+
+    async def _arequest_search(self, query, deadline):
+        """Async twin of _request_search over the pooled httpx client."""
+        try:
+            if not self._config_ok():
+                return [], False
+
+            body = {"q": query, "chapterFilter": "mms"}
+            r = await icd_dependency.acall(
+                lambda: self._asearch_once(query, body, deadline.timeout(DEFAULT_TIMEOUT)),
+                deadline,
+            )
+            return self._parse_search_response(query, r)
+        except CircuitOpenError as e:
+            print(f"⚡ {str(e)} ('{query}')")
+            return [], None
+        except httpx.HTTPError as e:
+            if cut_short(e, deadline):
+                print(f"⏱️ ICD API search for '{query}' cut short by the latency budget")
+                return [], None
+            # network or http error — log and return empty
+            print(f"❌ ICD API request failed for '{query}': {str(e)}")
+            return [], False
+        except Exception as e:
+            return self._search_failed(query, e)
+
+    @staticmethod
+    def _search_failed(query, e):
+        if isinstance(e, EnvironmentError):
             # credentials missing — log and return empty
             print(f"❌ ICD API credentials missing: {str(e)}")
-            return []
-        except Exception as e:
-            # unexpected error — log and return empty
-            print(f"❌ ICD API unexpected error for '{query}': {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            return []
+            return [], False
+        # unexpected error — log and return empty
+        print(f"❌ ICD API unexpected error for '{query}': {str(e)}")
+        import traceback
+        print(traceback.format_exc())
+        return [], False
+
+    @staticmethod
+    def _parse_search_response(query, r):
+        if r.status_code != 200:
+            print(f"❌ ICD Search error {r.status_code}: {r.text[:200]}")
+            return [], False
+
+        data = r.json()
+        
+        # Debug: Check what the API actually returned
+        if not data:
+            print(f"⚠️ ICD API returned empty JSON for '{query}'")
+            return [], True
+        
+        ents = data.get("destinationEntities", [])
+        
+        # Debug: Log raw response structure
+        if not ents:
+            print(f"⚠️ ICD API returned 0 results for '{query}'")
+            print(f"   Response keys: {list(data.keys())}")
+            if "destinationEntities" in data:
+                print(f"   destinationEntities type: {type(data['destinationEntities'])}")
+            return [], True
+        
+        out = []
+        for e in ents[:10]:  # Get more results to allow better prioritization
+            title = clean_html(e.get("title", ""))
+            code = e.get("theCode")
+            description = extract_description(e)
+            
+            if code and title:
+                result = {
+                    "code": code,
+                    "title": title,
+                    "description": description,  # Add description
+                }
+                if ICD_KEEP_RAW:
+                    result["raw"] = e
+                out.append(result)
+        
+        print(f"✅ ICD API returned {len(out)} results for '{query}'")
+        return out, True
+
+    async def aclose(self):
+        await self._async.aclose()
@@ -0,0 +1,161 @@
+# agents/icd_index.py
+import csv
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+BASE = Path(__file__).resolve().parents[1]
+DEFAULT_INDEX_PATH = BASE / "data" / "icd11_mms_index.sqlite3"
+
+# Column names used by the WHO MMS tabulation export (LinearizationMiniOutput /
+# SimpleTabulation) plus the optional enrichment columns we accept.
+CODE_COLUMNS = ("code", "thecode")
+TITLE_COLUMNS = ("title",)
+SYNONYM_COLUMNS = ("synonyms", "indexterms", "index terms", "inclusions")
+DEFINITION_COLUMNS = ("definition", "description")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS icd_entities USING fts5(
+    code, title, synonyms, definition,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _pick(row, names):
+    for name in names:
+        value = row.get(name)
+        if value:
+            return value.strip()
+    return ""
+
+
+def _clean_title(title):
+    # The tabulation export indents titles with "- " per hierarchy level
+    return re.sub(r"^(?:-\s*)+", "", title or "").strip()
+
+
+def _split_synonyms(value):
+    return [s.strip() for s in re.split(r"[;|\n]", value or "") if s.strip()]
+
+
+def iter_tabulation_rows(path):
+    """
+    Stream (code, title, synonyms, definition) tuples out of an ICD-11 MMS
+    tabular export. Tab-separated .txt/.tsv and comma-separated .csv are
+    supported; rows without a code (chapters, blocks) are skipped.
+    """
+    path = Path(path)
+    delimiter = "," if path.suffix.lower() == ".csv" else "\t"
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        for raw in reader:
+            row = {(k or "").strip().lower(): v for k, v in raw.items()}
+            code = _pick(row, CODE_COLUMNS)
+            title = _clean_title(_pick(row, TITLE_COLUMNS))
+            if not code or not title:
+                continue
+            synonyms = _split_synonyms(_pick(row, SYNONYM_COLUMNS))
+            definition = _pick(row, DEFINITION_COLUMNS)
+            yield code, title, synonyms, definition
+
+
+def build_index(source_path, index_path=None, batch_size=1000):
+    """
+    (Re)build the local FTS5 index from an MMS tabular export.
+    Writes to a temporary file and swaps it in, so readers never see a
+    half-built index. Returns the number of entities indexed.
+    """
+    index_path = Path(index_path or DEFAULT_INDEX_PATH)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    count = 0
+    try:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(SCHEMA)
+            batch = []
+            for code, title, synonyms, definition in iter_tabulation_rows(source_path):
+                batch.append((code, title, "; ".join(synonyms), definition))
+                if len(batch) >= batch_size:
+                    conn.executemany("INSERT INTO icd_entities VALUES (?, ?, ?, ?)", batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany("INSERT INTO icd_entities VALUES (?, ?, ?, ?)", batch)
+                count += len(batch)
+            conn.execute("INSERT INTO icd_entities(icd_entities) VALUES ('optimize')")
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        # Missing source, bad row, full disk...: leave no half-built file behind
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return count
+
+
+def _match_expression(query, operator):
+    tokens = re.findall(r"\w+", (query or "").lower())
+    return f" {operator} ".join(f'"{t}"*' for t in tokens)
+
+
+class ICDIndex:
+    """
+    Read-only search over the local ICD-11 MMS FTS5 index.
+    Results use the same shape as ICD11Client.search (code/title/description).
+    """
+
+    def __init__(self, index_path=None):
+        self.path = Path(index_path or DEFAULT_INDEX_PATH)
+        self._conn = sqlite3.connect(
+            f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    def search(self, query, limit=10):
+        # All query terms first; fall back to any term when that finds nothing
+        for operator in ("AND", "OR"):
+            expression = _match_expression(query, operator)
+            if not expression:
+                return []
+            with self._lock:
+                rows = self._conn.execute(
+                    """
+                    SELECT code, title, synonyms, definition
+                    FROM icd_entities
+                    WHERE icd_entities MATCH ?
+                    ORDER BY lower(title) = ? DESC,
+                             bm25(icd_entities, 4.0, 10.0, 3.0, 1.0),
+                             length(title)
+                    LIMIT ?
+                    """,
+                    (expression, (query or "").strip().lower(), limit),
+                ).fetchall()
+            if rows:
+                return [self._to_result(query, row) for row in rows]
+        return []
+
+    @staticmethod
+    def _to_result(query, row):
+        code, title, synonyms, definition = row
+        tokens = set(re.findall(r"\w+", (query or "").lower()))
+        # Mirror the live API: prefer the property value that matched the query
+        description = next(
+            (s for s in _split_synonyms(synonyms) if tokens & set(re.findall(r"\w+", s.lower()))),
+            None,
+        )
+        return {
+            "code": code,
+            "title": title,
+            "description": description or definition or None,
+        }
+
+    def close(self):
+        self._conn.close()
@@ -1,38 +1,50 @@
-import asyncio
-import sys
+import os
 
+from ..deadline import Deadline
+from ..metrics import collect_timings
+from .batch import run_batch
 from .graph import build_graph
+from .runtime import get_runtime, shutdown_runtime
+
+PIPELINE_TIMEOUT = float(os.getenv("PIPELINE_TIMEOUT", "60"))  # seconds
+PIPELINE_BATCH_TIMEOUT = float(os.getenv("PIPELINE_BATCH_TIMEOUT", "600"))  # seconds
+# How many extracted terms are mapped/validated at the same time
+PIPELINE_MAX_PARALLEL_TERMS = int(os.getenv("PIPELINE_MAX_PARALLEL_TERMS", "4"))
+# Extra time the runtime waits past a latency budget before giving up on the run
+PIPELINE_DEADLINE_GRACE = float(os.getenv("PIPELINE_DEADLINE_GRACE", "2"))  # seconds
 
 
 class LangGraphAYUSHPipeline:
-    def __init__(self):
+    def __init__(self, max_parallel_terms=None):
         self.graph = build_graph()
+        self.config = {"max_concurrency": max_parallel_terms or PIPELINE_MAX_PARALLEL_TERMS}
 
-    def run(self, raw_text, patient_ref, auto_push=False):
-        state = {
+    @staticmethod
+    def _initial_state(raw_text, patient_ref, auto_push, budget=None):
+        return {
             "raw_text": raw_text,
             "patient_ref": patient_ref,
-            "auto_push": auto_push
+            "auto_push": auto_push,
+            "deadline": Deadline.after(budget).at,
+            "skipped_steps": [],
         }
-        
+
+    @staticmethod
+    def _timeout(timeout, budget):
+        timeout = timeout or PIPELINE_TIMEOUT
+        return min(timeout, budget + PIPELINE_DEADLINE_GRACE) if budget else timeout
+
+    def run(self, raw_text, patient_ref, auto_push=False, timeout=None, budget=None):
+        """
+        Run the graph for one note. `budget` (seconds) sets a deadline that
+        every node and external call works within; optional steps skipped
+        to meet it are listed in the result's skipped_steps.
+        """
+        state = self._initial_state(raw_text, patient_ref, auto_push, budget)
+
         try:
-            # Check if there's a running event loop
-            try:
-                loop = asyncio.get_running_loop()
-                # If loop is running, we need nest_asyncio
-                try:
-                    import nest_asyncio
-                    nest_asyncio.apply()
-                    return loop.run_until_complete(self.graph.ainvoke(state))
-                except ImportError:
-                    # nest_asyncio not installed - use thread pool
-                    import concurrent.futures
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(asyncio.run, self.graph.ainvoke(state))
-                        return future.result(timeout=60)  # 60 second timeout
-            except RuntimeError:
-                # No running loop, safe to use asyncio.run
-                return asyncio.run(self.graph.ainvoke(state))
+            # Submit to the long-lived per-process loop instead of spinning up a new one
+            return get_runtime().submit(self._invoke(state), timeout=self._timeout(timeout, budget))
         except Exception as e:
             import traceback
             error_msg = f"Pipeline execution error: {str(e)}"
@@ -47,3 +59,45 @@ class LangGraphAYUSHPipeline:
                 "reason": f"Pipeline failed: {str(e)}",
                 "needs_human_review": True
             }
+
+    async def _invoke(self, state):
+        """ainvoke, plus a "timings" provenance entry when metrics are enabled."""
+        with collect_timings() as timings:
+            result = await self.graph.ainvoke(state, config=self.config)
+        if timings is not None:
+            result.setdefault("provenance", []).append({"step": "timings", "value": timings.summary()})
+        return result
+
+    def stream(self, raw_text, patient_ref, auto_push=False, timeout=None, budget=None):
+        """
+        Yield (event, data) as the graph runs, using LangGraph's astream on
+        the pipeline runtime: "extract" and "output" carry the graph state,
+        "map" and "validate" are emitted once per extracted term (with its
+        term_index, whichever route the term took). Stop iterating (or
+        close the generator) to cancel the remaining nodes. `budget` works
+        as in run().
+        """
+        state = self._initial_state(raw_text, patient_ref, auto_push, budget)
+        updates = self.graph.astream(state, config=self.config, stream_mode=["updates", "custom"])
+        for mode, chunk in get_runtime().stream(updates, timeout=self._timeout(timeout, budget)):
+            if mode == "custom":
+                yield chunk["event"], chunk
+                continue
+            for node, node_state in chunk.items():
+                if node in ("map_term", "fast_term"):
+                    for result in node_state["term_results"]:
+                        yield "validate", result
+                elif node != "reduce":
+                    yield node, node_state
+
+    def run_batch(self, items, timeout=None):
+        """
+        Run many (raw_text, patient_ref, auto_push) items with term
+        deduplication (see batch.run_batch). Returns final states in order.
+        """
+        return get_runtime().submit(run_batch(items), timeout=timeout or PIPELINE_BATCH_TIMEOUT)
+
+    @staticmethod
+    def shutdown(timeout=10):
+        """Stop the pipeline runtime loop (also registered with atexit)."""
+        shutdown_runtime(timeout)
@@ -0,0 +1,126 @@
+# agents/langgraph_pipeline/batch.py
+import asyncio
+import copy
+import os
+
+from ..mapping_agent import normalize_ayush_term
+from . import routing
+from .nodes import (
+    extract_node, mapping_node, validation_node, reduce_terms_node, output_node,
+    term_state, term_result, choose_route, apply_route,
+)
+
+BATCH_CONCURRENCY = int(os.getenv("PIPELINE_BATCH_CONCURRENCY", "8"))
+
+# State written by mapping_node / validation_node that is shared by every
+# item with the same term (and, for validation, the same clinical context)
+MAPPING_FIELDS = (
+    "candidates", "mapping_source", "needs_manual_review", "english_translation",
+    "detailed_translation", "review_reasons", "manual_review_candidates",
+)
+VALIDATION_FIELDS = ("best", "confidence", "reason", "needs_human_review")
+
+
+def term_key(term):
+    return normalize_ayush_term(term or "").casefold()
+
+
+def context_key(state):
+    # ValidationAgent only shows the first 200 characters of the note to the LLM
+    return term_key(state.get("ayush_term")), (state.get("raw_text") or "")[:200]
+
+
+def _adopt(state, template, fields):
+    """Copy shared node output from a template state into an item's state."""
+    for field in fields:
+        if field in template:
+            state[field] = copy.deepcopy(template[field])
+    state.setdefault("provenance", []).extend(copy.deepcopy(template["provenance"]))
+
+
+async def run_batch(items, concurrency=None):
+    """
+    Run the pipeline over many notes at once. Extraction and output run per
+    item; the route is chosen, and MappingAgent run, once per distinct
+    normalized term, and ValidationAgent once per distinct (term, context),
+    across every term of every note. Fast-routed terms skip mapping and
+    validation. Returns final states in input order.
+    """
+    semaphore = asyncio.Semaphore(concurrency or BATCH_CONCURRENCY)
+
+    async def limited(node, state):
+        async with semaphore:
+            return await node(state)
+
+    states = [
+        {
+            "raw_text": item["raw_text"],
+            "patient_ref": item["patient_ref"],
+            "auto_push": item.get("auto_push", False),
+        }
+        for item in items
+    ]
+
+    # 1. Extraction - every note, concurrently
+    await asyncio.gather(*(limited(extract_node, s) for s in states))
+
+    # One sub-state per (note, extracted term)
+    owners, terms = [], []
+    for s in states:
+        for i, term in enumerate(s.get("ayush_terms") or [{"term": s.get("ayush_term", "")}]):
+            owners.append(s)
+            terms.append(term_state(s, i, term))
+
+    # 2. Routing and mapping - once per distinct term
+    by_term = {}
+    for s in terms:
+        by_term.setdefault(term_key(s.get("ayush_term")), []).append(s)
+    routes = await asyncio.gather(*(
+        choose_route(members[0].get("ayush_term", ""), any(s["auto_push"] for s in members))
+        for members in by_term.values()
+    ))
+    full_route = []
+    for members, (route, fields) in zip(by_term.values(), routes):
+        for s in members:
+            apply_route(s, route, copy.deepcopy(fields))
+        routing.route_counters.record(route, len(members))
+        if fields is None:
+            full_route.append(members)
+    mapped = await asyncio.gather(*(
+        limited(mapping_node, {"ayush_term": members[0].get("ayush_term", ""), "provenance": []})
+        for members in full_route
+    ))
+    for members, template in zip(full_route, mapped):
+        for s in members:
+            _adopt(s, template, MAPPING_FIELDS)
+    print(
+        f"📦 Batch: {len(states)} notes, {len(terms)} terms → {len(by_term)} distinct terms, "
+        f"{len(full_route)} mapped ({len(by_term) - len(full_route)} fast-path)"
+    )
+
+    # 3. Validation - once per distinct term/context
+    by_context = {}
+    for members in full_route:
+        for s in members:
+            by_context.setdefault(context_key(s), []).append(s)
+    validated = await asyncio.gather(*(
+        limited(validation_node, {
+            **{k: copy.deepcopy(v) for k, v in members[0].items() if k in MAPPING_FIELDS},
+            "ayush_term": members[0].get("ayush_term", ""),
+            "raw_text": members[0].get("raw_text", ""),
+            "provenance": [],
+        })
+        for members in by_context.values()
+    ))
+    for members, template in zip(by_context.values(), validated):
+        for s in members:
+            _adopt(s, template, VALIDATION_FIELDS)
+
+    for owner, sub in zip(owners, terms):
+        owner.setdefault("term_results", []).append(term_result(sub))
+    for s in states:
+        await reduce_terms_node(s)
+
+    # 4. Output - FHIR per term of each item (and ABDM push when requested)
+    await asyncio.gather(*(limited(output_node, s) for s in states))
+    return states
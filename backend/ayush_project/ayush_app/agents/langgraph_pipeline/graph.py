@@ -3,8 +3,10 @@ from langgraph.graph import END
 from .state import PipelineState
 from .nodes import (
     extract_node,
-    mapping_node,
-    validation_node,
+    route_terms,
+    map_term_node,
+    fast_term_node,
+    reduce_terms_node,
     output_node,
 )
 
@@ -15,21 +17,24 @@ def build_graph():
 
     # Add nodes
     workflow.add_node("extract", extract_node)
-    workflow.add_node("map", mapping_node)
-    workflow.add_node("validate", validation_node)
+    workflow.add_node("map_term", map_term_node)
+    workflow.add_node("fast_term", fast_term_node)
+    workflow.add_node("reduce", reduce_terms_node)
     workflow.add_node("output", output_node)
 
     # Start → Extract
     workflow.set_entry_point("extract")
 
-    # Extract → Mapping
-    workflow.add_edge("extract", "map")
+    # Extract → one map_term (mapping + validation) per extracted term, in parallel;
+    # confident terms take fast_term instead
+    workflow.add_conditional_edges("extract", route_terms, ["map_term", "fast_term"])
 
-    # Mapping → Validation
-    workflow.add_edge("map", "validate")
+    # Per-term results → Reduce
+    workflow.add_edge("map_term", "reduce")
+    workflow.add_edge("fast_term", "reduce")
 
-    # Validation → Output
-    workflow.add_edge("validate", "output")
+    # Reduce → Output
+    workflow.add_edge("reduce", "output")
 
     # Output → END
     workflow.add_edge("output", END)
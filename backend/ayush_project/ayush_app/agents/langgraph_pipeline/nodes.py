@@ -1,50 +1,183 @@
 # agents/langgraph_pipeline/nodes.py
 import asyncio
+import contextvars
 from typing import Dict, Any
 from concurrent.futures import ThreadPoolExecutor
 
-from ..extraction_agent import ExtractionAgent
-from ..mapping_agent import MappingAgent
-from ..validation_agent import ValidationAgent
-from ..output_agent import OutputAgent
+from langgraph.config import get_stream_writer
+from langgraph.types import Send
 
-import os
-GROQ_KEY = os.getenv("GROQ_API_KEY")
+from ..deadline import SKIP_VALIDATION_BELOW, Deadline, skipped_step
+from ..metrics import instrumented
+from ..registry import get_registry
+from ..validation_agent import skipped_validation
+from . import routing
+from .payloads import mapping_summary, output_summary, slim_candidates, validation_summary
 
 # small thread pool for blocking IO calls
 _executor = ThreadPoolExecutor(max_workers=6)
 
 async def run_in_thread(func, *args, **kwargs):
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(_executor, lambda: func(*args, **kwargs))
+    # Carry contextvars (per-run timings) into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, lambda: ctx.run(func, *args, **kwargs))
 
 
 # -------------------------
 # NODE: Extract AYUSH Term
 # -------------------------
+@instrumented("extract")
 async def extract_node(state: Dict[str, Any]):
     try:
-        extractor = ExtractionAgent(GROQ_KEY)
+        extractor = get_registry().extraction()
         # extractor.run is sync -> run in thread
-        ayush = await run_in_thread(extractor.run, state["raw_text"])
-        state["ayush_term"] = ayush
-        state.setdefault("provenance", []).append({"step": "extract", "value": ayush})
+        terms = await run_in_thread(extractor.run_many, state["raw_text"], Deadline.from_state(state))
+        if not terms:
+            terms = [{"term": state["raw_text"][:50], "start": None, "end": None}]
+        state["ayush_terms"] = terms
+        state["ayush_term"] = terms[0]["term"]
+        state.setdefault("provenance", []).append({"step": "extract", "value": [t["term"] for t in terms]})
     except Exception as e:
         print(f"Extraction node error: {str(e)}")
         state["ayush_term"] = state.get("raw_text", "Unknown")[:50]
+        state["ayush_terms"] = [{"term": state["ayush_term"], "start": None, "end": None}]
         state.setdefault("provenance", []).append({"step": "extract", "error": str(e)})
     return state
 
 
+# -------------------------
+# FAN-OUT: one map_term task per extracted term
+# -------------------------
+# Per-term fields carried from the map/validate sub-state into term_results
+TERM_FIELDS = (
+    "candidates", "mapping_source", "needs_manual_review", "english_translation",
+    "detailed_translation", "review_reasons", "manual_review_candidates",
+    "best", "confidence", "reason", "needs_human_review", "route",
+)
+
+
+def term_state(state, index, term):
+    """Sub-state mapped and validated for a single extracted term."""
+    return {
+        "raw_text": state.get("raw_text", ""),
+        "ayush_term": term.get("term", ""),
+        "term_index": index,
+        "start": term.get("start"),
+        "end": term.get("end"),
+        "deadline": state.get("deadline"),
+        "auto_push": state.get("auto_push", False),
+        "provenance": [],
+    }
+
+
+def term_result(sub):
+    result = {
+        "term_index": sub["term_index"],
+        "ayush_term": sub.get("ayush_term", ""),
+        "start": sub.get("start"),
+        "end": sub.get("end"),
+    }
+    result.update({k: sub[k] for k in TERM_FIELDS if k in sub})
+    result["skipped_steps"] = sub.get("skipped_steps", [])
+    result["provenance"] = sub.get("provenance", [])
+    return result
+
+
+async def choose_route(term, auto_push=False):
+    """
+    (route, fields) for one extracted term: a fast route with the per-term
+    fields it fills in (see routing.py), or ("full", None) for the
+    mapping + validation path. Runs that push to ABDM never take the
+    confirmed route - those terms are validated as usual.
+    """
+    if not routing.FAST_PATH:
+        return routing.ROUTE_FULL, None
+    fast = routing.fast_path(term)
+    if fast is None and not auto_push:
+        # ORM lookup -> run in thread
+        fast = await run_in_thread(routing.confirmed_fast_path, term)
+    return fast or (routing.ROUTE_FULL, None)
+
+
+def apply_route(sub, route, fields):
+    sub["route"] = route
+    if fields:
+        sub.update(fields)
+        sub.setdefault("provenance", []).append({"step": "fast_path", "value": {"route": route, **validation_summary(fields)}})
+
+
+@instrumented("route")
+async def route_terms(state: Dict[str, Any]):
+    """Send each extracted term to map_term, or past it to fast_term when a fast route applies."""
+    terms = state.get("ayush_terms") or [{"term": state.get("ayush_term", ""), "start": None, "end": None}]
+    subs = [term_state(state, i, term) for i, term in enumerate(terms)]
+    routes = await asyncio.gather(*(choose_route(sub["ayush_term"], sub["auto_push"]) for sub in subs))
+    sends = []
+    for sub, (route, fields) in zip(subs, routes):
+        apply_route(sub, route, fields)
+        routing.route_counters.record(route)
+        sends.append(Send("map_term" if fields is None else "fast_term", sub))
+    return sends
+
+
+# -------------------------
+# NODE: Map + validate one term
+# -------------------------
+async def map_term_node(sub: Dict[str, Any]):
+    await mapping_node(sub)
+    # Candidates go out to stream consumers before validation starts
+    get_stream_writer()({"event": "map", **term_result(sub)})
+    await validation_node(sub)
+    return {"term_results": [term_result(sub)]}
+
+
+# -------------------------
+# NODE: Fast-path term (already resolved by its route)
+# -------------------------
+@instrumented("fast_term")
+async def fast_term_node(sub: Dict[str, Any]):
+    get_stream_writer()({"event": "map", **term_result(sub)})
+    return {"term_results": [term_result(sub)]}
+
+
+# -------------------------
+# NODE: Reduce per-term results
+# -------------------------
+@instrumented("reduce")
+async def reduce_terms_node(state: Dict[str, Any]):
+    """
+    Fan-in after map_term: per-term provenance moves to the top-level trail
+    and skipped optional steps are listed at the top level too (both tagged
+    with term_index); the first term's mapping is copied to the top-level
+    fields so single-term consumers keep working.
+    """
+    results = state.get("term_results") or []
+    provenance = state.setdefault("provenance", [])
+    skipped_steps = state.setdefault("skipped_steps", [])
+    for result in results:
+        for entry in result.pop("provenance", []):
+            provenance.append({**entry, "term_index": result["term_index"]})
+        for entry in result.get("skipped_steps", []):
+            skipped_steps.append({**entry, "term_index": result["term_index"]})
+    if results:
+        primary = results[0]
+        state["ayush_term"] = primary["ayush_term"]
+        state.update({k: primary[k] for k in TERM_FIELDS if k in primary})
+    return state
+
+
 # -------------------------
 # NODE: Map to ICD
 # -------------------------
+@instrumented("mapping")
 async def mapping_node(state: Dict[str, Any]):
     try:
-        mapper = MappingAgent()
+        mapper = get_registry().mapping()
         # mapping_agent.run is async in your code -> await it
-        result = await mapper.run(state.get("ayush_term", ""))
-        state["candidates"] = result.get("candidates", [])
+        result = await mapper.run(state.get("ayush_term", ""), deadline=Deadline.from_state(state))
+        result["candidates"] = slim_candidates(result.get("candidates"))
+        state["candidates"] = result["candidates"]
         state["mapping_source"] = result.get("mapping_source", "unknown")
         state["needs_manual_review"] = result.get("needs_manual_review", False)
         # Store translations in state
@@ -56,7 +189,8 @@ async def mapping_node(state: Dict[str, Any]):
             state.setdefault("review_reasons", []).append(result["manual_review_reason"])
         if state.get("needs_manual_review"):
             state["manual_review_candidates"] = result.get("candidates", [])
-        state.setdefault("provenance", []).append({"step": "mapping", "value": result})
+        state.setdefault("skipped_steps", []).extend(result.get("skipped_steps", []))
+        state.setdefault("provenance", []).append({"step": "mapping", "value": mapping_summary(result)})
     except Exception as e:
         print(f"Mapping node error: {str(e)}")
         state["candidates"] = []
@@ -70,11 +204,20 @@ async def mapping_node(state: Dict[str, Any]):
 # -------------------------
 # NODE: Validate
 # -------------------------
+@instrumented("validation")
 async def validation_node(state: Dict[str, Any]):
     try:
-        validator = ValidationAgent(GROQ_KEY)
-        # validator.run is sync -> run in thread
-        out = await run_in_thread(validator.run, state.get("ayush_term", ""), state.get("raw_text", ""), state.get("candidates", []))
+        validator = get_registry().validation()
+        deadline = Deadline.from_state(state)
+        candidates = state.get("candidates", [])
+        if candidates and not deadline.allows(SKIP_VALIDATION_BELOW):
+            # Optional step: keep the first candidate, flagged for review
+            print(f"⏱️ Skipping LLM validation of '{state.get('ayush_term', '')}' ({deadline.remaining():.2f}s left)")
+            state.setdefault("skipped_steps", []).append(skipped_step("validation", deadline))
+            out = skipped_validation(candidates)
+        else:
+            # validator.run is sync -> run in thread
+            out = await run_in_thread(validator.run, state.get("ayush_term", ""), state.get("raw_text", ""), candidates, deadline)
         state["best"] = out.get("best", {"code": "UNK"})
         state["confidence"] = out.get("confidence", 0.0)
         state["reason"] = out.get("reason", "")
@@ -82,7 +225,7 @@ async def validation_node(state: Dict[str, Any]):
         state["needs_human_review"] = out.get("needs_human_review", True) or manual_flag
         if manual_flag and state.get("review_reasons"):
             state.setdefault("provenance", []).append({"step": "manual_review", "value": state["review_reasons"]})
-        state.setdefault("provenance", []).append({"step": "validation", "value": out})
+        state.setdefault("provenance", []).append({"step": "validation", "value": validation_summary(out)})
     except Exception as e:
         print(f"Validation node error: {str(e)}")
         # Use first candidate if available, otherwise UNK
@@ -98,19 +241,35 @@ async def validation_node(state: Dict[str, Any]):
 # -------------------------
 # NODE: Output (FHIR + push)
 # -------------------------
-async def output_node(state: Dict[str, Any]):
+async def _output_term(term, patient_ref, auto_push):
     try:
-        agent = OutputAgent()
-        # agent.run is sync -> run in thread
-        out = await run_in_thread(agent.run, state, patient_ref=state.get("patient_ref", "Patient/example"), auto_push=state.get("auto_push", False))
-        state["fhir"] = out.get("fhir")
-        state["pushed"] = out.get("pushed", False)
-        state["push_response"] = out.get("push_response")
-        state.setdefault("provenance", []).append({"step": "output", "value": out})
+        agent = get_registry().output()
+        # ABDM push goes through the pooled async client - no thread hop
+        out = await agent.arun(term, patient_ref=patient_ref, auto_push=auto_push)
+        return {"fhir": out.get("fhir"), "pushed": out.get("pushed", False), "push_response": out.get("push_response")}, None
     except Exception as e:
         print(f"Output node error: {str(e)}")
-        state["fhir"] = None
-        state["pushed"] = False
-        state["push_response"] = {"error": str(e)}
-        state.setdefault("provenance", []).append({"step": "output", "error": str(e)})
+        return {"fhir": None, "pushed": False, "push_response": {"error": str(e)}}, str(e)
+
+
+@instrumented("output")
+async def output_node(state: Dict[str, Any]):
+    """One FHIR Condition (and optional ABDM push) per extracted term."""
+    terms = state.get("term_results") or [state]
+    outs = await asyncio.gather(*(
+        _output_term(term, state.get("patient_ref", "Patient/example"), state.get("auto_push", False))
+        for term in terms
+    ))
+    provenance = state.setdefault("provenance", [])
+    for term, (out, error) in zip(terms, outs):
+        term.update(out)
+        entry = {"step": "output", "error": error} if error else {"step": "output", "value": output_summary(out)}
+        if "term_index" in term:
+            entry["term_index"] = term["term_index"]
+        provenance.append(entry)
+    primary = outs[0][0]
+    state["fhir"] = primary["fhir"]
+    state["pushed"] = primary["pushed"]
+    state["push_response"] = primary["push_response"]
+    state["fhir_conditions"] = [out["fhir"] for out, _ in outs if out["fhir"]]
     return state
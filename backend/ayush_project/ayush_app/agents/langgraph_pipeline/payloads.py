@@ -0,0 +1,95 @@
+# agents/langgraph_pipeline/payloads.py
+import os
+
+from ..icd_client import ICD_KEEP_RAW
+from .state import PipelineState
+
+# Keep each step's full output in provenance (debugging); by default steps
+# record a summary that points at the state fields holding the data
+PIPELINE_VERBOSE_PROVENANCE = os.getenv("PIPELINE_VERBOSE_PROVENANCE", "0") == "1"
+
+# The only keys a candidate carries through state, prompts and responses
+CANDIDATE_FIELDS = (
+    "code",
+    "title",
+    "description",
+    "score",
+    "source",
+    "source_term",
+    "english_term",
+    "detailed_term",
+    "llm_enriched",
+    "llm_match",
+    "llm_reason",
+)
+
+# Top-level keys a caller may select with /run_pipeline/?fields=
+RESULT_FIELDS = frozenset(PipelineState.__annotations__) - {"deadline", "patient_ref", "auto_push"}
+# Default selection for /run_pipeline/batch/ items: the note is not echoed back
+BATCH_RESULT_FIELDS = sorted(RESULT_FIELDS - {"raw_text"})
+
+
+def slim_candidate(candidate):
+    """A candidate reduced to CANDIDATE_FIELDS (plus `raw` with ICD_KEEP_RAW)."""
+    slim = {k: candidate[k] for k in CANDIDATE_FIELDS if k in candidate}
+    if ICD_KEEP_RAW and "raw" in candidate:
+        slim["raw"] = candidate["raw"]
+    return slim
+
+
+def slim_candidates(candidates):
+    return [slim_candidate(c) for c in candidates or []]
+
+
+def mapping_summary(result):
+    """Provenance for mapping_node; the candidates themselves are in state["candidates"]."""
+    if PIPELINE_VERBOSE_PROVENANCE:
+        return result
+    return {
+        "mapping_source": result.get("mapping_source"),
+        "candidate_codes": [c.get("code") for c in result.get("candidates", [])],
+        "needs_manual_review": result.get("needs_manual_review", False),
+        "english_translation": result.get("english_translation"),
+        "detailed_translation": result.get("detailed_translation"),
+    }
+
+
+def validation_summary(out):
+    """Provenance for validation_node (and fast routes); the chosen candidate is in state["best"]."""
+    if PIPELINE_VERBOSE_PROVENANCE:
+        return out
+    summary = {
+        "code": (out.get("best") or {}).get("code"),
+        "confidence": out.get("confidence"),
+        "needs_human_review": out.get("needs_human_review"),
+    }
+    if out.get("prompt_stats"):
+        summary["prompt_stats"] = out["prompt_stats"]
+    return summary
+
+
+def output_summary(out):
+    """Provenance for output_node; the resource is in state["fhir"] / fhir_conditions."""
+    if PIPELINE_VERBOSE_PROVENANCE:
+        return out
+    return {"fhir_id": (out.get("fhir") or {}).get("id"), "pushed": out.get("pushed", False)}
+
+
+def parse_fields(value):
+    """
+    ?fields=best,confidence as a list of result keys, or None for the
+    whole result. Raises ValueError naming any unknown key.
+    """
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = sorted(set(fields) - RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def select_fields(result, fields):
+    if fields is None:
+        return result
+    return {f: result[f] for f in fields if f in result}
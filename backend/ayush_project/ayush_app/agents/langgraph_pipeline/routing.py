@@ -0,0 +1,153 @@
+# agents/langgraph_pipeline/routing.py
+import os
+import threading
+
+from ..mapping_agent import normalize_ayush_term
+from ..tools import PRIORITY_CODES, deterministic_lookup, icd_title_for_code
+
+# Route confident terms past translation, ICD search, enrichment and LLM validation
+FAST_PATH = os.getenv("PIPELINE_FAST_PATH", "1") == "1"
+# Confidence recorded for fast-path results; like ValidationAgent, below 0.9 still needs human review
+FAST_PATH_EXACT_CONFIDENCE = float(os.getenv("FAST_PATH_EXACT_CONFIDENCE", "0.8"))
+FAST_PATH_PRIORITY_CONFIDENCE = float(os.getenv("FAST_PATH_PRIORITY_CONFIDENCE", "0.9"))
+# A term is "previously confirmed" once clinicians reviewing this many diagnoses
+# all chose the same ICD code (ConfirmedMapping); a count of 0 disables the lookup
+FAST_PATH_CONFIRMED_MIN_COUNT = int(os.getenv("FAST_PATH_CONFIRMED_MIN_COUNT", "2"))
+FAST_PATH_CONFIRMED_CONFIDENCE = float(os.getenv("FAST_PATH_CONFIRMED_CONFIDENCE", "0.9"))
+
+ROUTE_FULL = "full"
+ROUTE_PRIORITY = "priority"
+ROUTE_EXACT = "exact"
+ROUTE_CONFIRMED = "confirmed"
+ROUTES = (ROUTE_FULL, ROUTE_PRIORITY, ROUTE_EXACT, ROUTE_CONFIRMED)
+
+
+def _fast_result(route, candidate, confidence, mapping_source, reason):
+    """Per-term fields a fast route fills in instead of mapping_node + validation_node."""
+    return {
+        "route": route,
+        "candidates": [candidate],
+        "mapping_source": mapping_source,
+        "needs_manual_review": False,
+        "best": candidate,
+        "confidence": confidence,
+        "reason": reason,
+        "needs_human_review": confidence < 0.9,
+    }
+
+
+def _csv_candidate(row, score):
+    return {
+        "code": row["icd_code"],
+        "title": row["icd_title"],
+        "source_term": row["ayush_term"],
+        "score": score,
+        "source": "csv",
+    }
+
+
+def confirmed_term_key(term):
+    """ConfirmedMapping key for an AYUSH term."""
+    return normalize_ayush_term(term or "").lower().strip()
+
+
+def fast_path(term):
+    """
+    (route, fields) for a term that can skip the expensive nodes using the
+    seed mappings alone - a PRIORITY_CODES override or a single exact
+    deterministic match with no review flag - else None.
+    """
+    normalized = normalize_ayush_term(term or "")
+    key = normalized.lower().strip()
+    if not key:
+        return None
+    det = deterministic_lookup(normalized)
+
+    priority_code = PRIORITY_CODES.get(key)
+    if priority_code:
+        row = det["primary"] if det and det["primary"]["icd_code"] == priority_code else None
+        candidate = _csv_candidate(row, FAST_PATH_PRIORITY_CONFIDENCE) if row else {
+            "code": priority_code,
+            "title": icd_title_for_code(priority_code) or priority_code,
+            "source_term": normalized,
+            "score": FAST_PATH_PRIORITY_CONFIDENCE,
+            "source": "priority",
+        }
+        return ROUTE_PRIORITY, _fast_result(
+            ROUTE_PRIORITY, candidate, FAST_PATH_PRIORITY_CONFIDENCE, "deterministic",
+            "Clinical priority mapping for this term.",
+        )
+
+    if det and not det["needs_review"] and len(det["matches"]) == 1 and det["matches"][0]["match_type"] == "exact":
+        candidate = _csv_candidate(det["primary"], FAST_PATH_EXACT_CONFIDENCE)
+        return ROUTE_EXACT, _fast_result(
+            ROUTE_EXACT, candidate, FAST_PATH_EXACT_CONFIDENCE, "deterministic",
+            "Single exact match in the seed mappings.",
+        )
+    return None
+
+
+def confirmed_fast_path(term):
+    """
+    (route, fields) when clinicians reviewing earlier diagnoses of the term
+    all chose one ICD code (see FAST_PATH_CONFIRMED_*), else None. Only
+    human reviews count, never the route's own results. One indexed
+    ConfirmedMapping lookup; blocking ORM call - run it in a thread.
+    """
+    if FAST_PATH_CONFIRMED_MIN_COUNT <= 0:
+        return None
+    key = confirmed_term_key(term)
+    if not key:
+        return None
+    try:
+        from ...models import ConfirmedMapping
+
+        rows = list(
+            ConfirmedMapping.objects.filter(term=key, confirmations__gt=0)
+            .values("icd_code", "confirmations")[:2]
+        )
+    except Exception as e:
+        print(f"⚠️ Confirmed-mapping lookup failed for '{key}': {str(e)}")
+        return None
+    if len(rows) != 1 or rows[0]["confirmations"] < FAST_PATH_CONFIRMED_MIN_COUNT:
+        return None
+
+    code, n = rows[0]["icd_code"], rows[0]["confirmations"]
+    candidate = {
+        "code": code,
+        "title": icd_title_for_code(code) or code,
+        "source_term": normalize_ayush_term(term),
+        "score": FAST_PATH_CONFIRMED_CONFIDENCE,
+        "source": "confirmed",
+    }
+    return ROUTE_CONFIRMED, _fast_result(
+        ROUTE_CONFIRMED, candidate, FAST_PATH_CONFIRMED_CONFIDENCE, "confirmed",
+        f"Confirmed by {n} clinician reviews of earlier diagnoses.",
+    )
+
+
+class RouteCounters:
+    """Thread-safe count of extracted terms per route."""
+
+    def __init__(self):
+        self._counts = dict.fromkeys(ROUTES, 0)
+        self._lock = threading.Lock()
+
+    def record(self, route, n=1):
+        with self._lock:
+            self._counts[route] = self._counts.get(route, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            "total": total,
+            "routes": {
+                route: {"count": n, "fraction": round(n / total, 4) if total else 0.0}
+                for route, n in counts.items()
+            },
+        }
+
+
+route_counters = RouteCounters()
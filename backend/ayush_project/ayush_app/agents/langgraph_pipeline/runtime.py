@@ -0,0 +1,168 @@
+# agents/langgraph_pipeline/runtime.py
+import asyncio
+import atexit
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+
+class PipelineRuntime:
+    """
+    Owns one long-lived event loop running in a dedicated daemon thread.
+    Sync callers (Django views, management commands) hand coroutines to it
+    with submit(); loop-bound resources such as HTTP pools and async LLM
+    clients therefore survive between requests.
+    """
+
+    def __init__(self, name="ayush-pipeline-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._shutdown_hooks = []
+        self._closed = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(self._ready.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            # Cancel whatever is still pending so coroutines can clean up
+            pending = [t for t in asyncio.all_tasks(self._loop) if not t.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def submit(self, coro, timeout=None):
+        """
+        Run `coro` on the runtime loop and block until it finishes.
+        On timeout (or if the caller is interrupted) the task is cancelled
+        and the exception propagates.
+        """
+        if self._closed:
+            coro.close()
+            raise RuntimeError("Pipeline runtime is shut down")
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("submit() cannot block on the runtime loop from inside it")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Pipeline run timed out after {timeout}s")
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stream(self, agen, timeout=None):
+        """
+        Drive the async iterator `agen` on the runtime loop and yield its
+        items to a sync caller as they arrive. Closing the returned
+        generator early (e.g. a disconnected HTTP client) cancels the task;
+        exceeding `timeout` overall raises TimeoutError.
+        """
+        if self._closed:
+            raise RuntimeError("Pipeline runtime is shut down")
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+            except Exception as e:
+                items.put((None, e))
+            finally:
+                items.put((done, None))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item, error = items.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError(f"Pipeline stream timed out after {timeout}s")
+                if error is not None:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def add_shutdown_hook(self, hook):
+        """Register an async callable to await on the loop during shutdown()."""
+        self._shutdown_hooks.append(hook)
+
+    def shutdown(self, timeout=10):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._shutdown_hooks:
+            async def run_hooks():
+                await asyncio.gather(*(hook() for hook in self._shutdown_hooks), return_exceptions=True)
+            try:
+                asyncio.run_coroutine_threadsafe(run_hooks(), self._loop).result(timeout)
+            except Exception as e:
+                print(f"Pipeline runtime shutdown hook error: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
+
+_runtime = None
+_runtime_pid = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """
+    One runtime per worker process. A runtime inherited across fork() has no
+    running thread, so a fresh one is created when the pid changes.
+    """
+    global _runtime, _runtime_pid
+    pid = os.getpid()
+    with _runtime_lock:
+        if _runtime is None or _runtime_pid != pid or _runtime.closed:
+            _runtime = PipelineRuntime()
+            _runtime_pid = pid
+        return _runtime
+
+
+def current_runtime():
+    """The live runtime of this process, or None if none has been started."""
+    with _runtime_lock:
+        if _runtime is not None and _runtime_pid == os.getpid() and not _runtime.closed:
+            return _runtime
+    return None
+
+
+def shutdown_runtime(timeout=10):
+    global _runtime
+    with _runtime_lock:
+        runtime, _runtime = _runtime, None
+    if runtime is not None and _runtime_pid == os.getpid():
+        runtime.shutdown(timeout)
+
+
+atexit.register(shutdown_runtime)
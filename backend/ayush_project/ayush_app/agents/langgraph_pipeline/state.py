@@ -1,8 +1,22 @@
-from typing import List, Dict, Any, TypedDict, Optional
+from typing import Annotated, List, Dict, Any, TypedDict, Optional
+
+
+def merge_term_results(left, right):
+    """
+    Reducer for the per-term fan-out: results are keyed by term_index, so
+    nodes that return the whole state after the fan-in do not duplicate them.
+    """
+    merged = {r["term_index"]: r for r in (left or [])}
+    for r in right or []:
+        merged[r["term_index"]] = r
+    return [merged[i] for i in sorted(merged)]
+
 
 class PipelineState(TypedDict, total=False):
     raw_text: str
     ayush_term: str
+    ayush_terms: List[Dict[str, Any]]
+    term_results: Annotated[List[Dict[str, Any]], merge_term_results]
     candidates: List[Dict[str, Any]]
     best: Dict[str, Any]
     confidence: float
@@ -13,7 +27,13 @@ class PipelineState(TypedDict, total=False):
     review_reasons: List[str]
     manual_review_selected: Dict[str, Any]
     mapping_source: str
+    route: str
+    english_translation: str
+    detailed_translation: str
     fhir: Dict[str, Any]
+    fhir_conditions: List[Dict[str, Any]]
+    deadline: Optional[float]
+    skipped_steps: List[Dict[str, Any]]
     pushed: bool
     push_response: Any
     provenance: List[Dict[str, Any]]
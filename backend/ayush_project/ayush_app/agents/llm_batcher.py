@@ -0,0 +1,105 @@
+# agents/llm_batcher.py
+import asyncio
+import json
+import os
+import re
+
+# Micro-batching of small Groq prompts (bulk workloads); off by default
+GROQ_MICROBATCH = os.getenv("GROQ_MICROBATCH", "0") == "1"
+GROQ_MICROBATCH_MAX_ITEMS = int(os.getenv("GROQ_MICROBATCH_MAX_ITEMS", "16"))
+GROQ_MICROBATCH_MAX_WAIT_MS = float(os.getenv("GROQ_MICROBATCH_MAX_WAIT_MS", "20"))
+
+
+def strip_code_fence(content):
+    """Drop a ```json ... ``` fence some models wrap JSON replies in."""
+    return re.sub(r"^```(?:json)?\s*|\s*```$", "", (content or "").strip())
+
+
+def parse_keyed_reply(content, count):
+    """
+    Parse a batched reply of the form {"1": ..., "2": ...} into
+    {0-based index: value}. Unknown keys are ignored; an unparseable reply
+    yields {} so every item falls back to a single call.
+    """
+    try:
+        data = json.loads(strip_code_fence(content))
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {int(key) - 1: value for key, value in data.items() if key.isdigit() and 1 <= int(key) <= count}
+
+
+class MicroBatcher:
+    """
+    Collects concurrent submit() calls for up to `max_wait` seconds or
+    `max_items` requests and answers them with one `batch_fn(payloads)`
+    call. batch_fn returns {index: answer} for the payloads it could
+    answer; anything missing (or a failed batch) goes through
+    `single_fn(payload)` instead. A batch of one goes straight to single_fn.
+
+    State is bound to the running event loop and reset if a different
+    loop uses the batcher.
+    """
+
+    def __init__(self, name, batch_fn, single_fn, max_items=None, max_wait_ms=None):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.max_items = max_items or GROQ_MICROBATCH_MAX_ITEMS
+        self.max_wait = (GROQ_MICROBATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self.batches = 0
+        self.fallbacks = 0
+        self._loop = None
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, payload):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._pending, self._timer, self._tasks = loop, [], None, set()
+        future = loop.create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        batch = [(payload, future) for payload, future in batch if not future.done()]
+        answers = {}
+        if len(batch) > 1:
+            try:
+                answers = await self.batch_fn([payload for payload, _ in batch]) or {}
+                self.batches += 1
+            except Exception as e:
+                print(f"⚠️ Batched {self.name} call failed for {len(batch)} items: {str(e)}")
+                answers = {}
+            missing = sum(1 for i in range(len(batch)) if i not in answers)
+            if missing:
+                print(f"⚠️ Batched {self.name} reply missed {missing} of {len(batch)} items; using single calls")
+                self.fallbacks += missing
+
+        async def resolve(index, payload, future):
+            try:
+                answer = answers[index] if index in answers else await self.single_fn(payload)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(answer)
+
+        await asyncio.gather(*(resolve(i, payload, future) for i, (payload, future) in enumerate(batch)))
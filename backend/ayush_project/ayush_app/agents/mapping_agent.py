@@ -1,10 +1,21 @@
 # ayush_app/agents/mapping_agent.py
 
 import asyncio
+import json
 import re
 from .tools import deterministic_lookup
 from .icd_client import ICD11Client
-from groq import Groq
+from .translation_cache import get_translation_cache
+from .http_clients import GROQ_TIMEOUT, build_groq_client
+from .deadline import (
+    Deadline,
+    SKIP_DETAILED_TRANSLATION_BELOW,
+    SKIP_ENRICHMENT_BELOW,
+    skipped_step,
+)
+from .resilience import groq_dependency
+from .metrics import instrumented
+from .llm_batcher import GROQ_MICROBATCH, MicroBatcher, parse_keyed_reply, strip_code_fence
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -16,6 +27,12 @@ if ENV_PATH.exists():
 else:
     load_dotenv()
 
+MAPPING_MODEL = os.getenv("GROQ_MAPPING_MODEL", "llama-3.3-70b-versatile")
+MAPPING_CONCURRENT = os.getenv("MAPPING_CONCURRENT", "0") == "1"
+ENRICH_CONCURRENCY = int(os.getenv("MAPPING_ENRICH_CONCURRENCY", "5"))
+# One Groq call returning simple, simple_base and detailed translations as JSON
+COMBINED_TRANSLATION = os.getenv("MAPPING_COMBINED_TRANSLATION", "1") == "1"
+
 client = ICD11Client()
 
 # Initialize Groq client
@@ -25,12 +42,11 @@ def get_groq_client():
     if not groq_client:
         api_key = os.getenv("GROQ_API_KEY")
         if api_key:
-            groq_client = Groq(api_key=api_key)
+            groq_client = build_groq_client(api_key)
     return groq_client
 
-async def async_icd(term):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, client.search, term)
+async def async_icd(term, deadline=None):
+    return await client.asearch(term, deadline=deadline)
 
 def normalize_ayush_term(term):
     """Normalize AYUSH term variants."""
@@ -93,15 +109,56 @@ def derive_simple_from_csv(det) -> str | None:
         print(f"🔎 Derived ICD search term '{simple}' from CSV title '{title}'")
     return simple
 
-async def translate_ayush_to_english_simple(ayush_term, use_base_term=False):
+def clean_simple_translation(text):
+    """Single lowercase word, letters only (e.g. 'Fever.' -> 'fever')."""
+    words = (text or "").strip().split()
+    word = re.sub(r'[^a-zA-Z]', '', words[0]) if words else ""
+    return word.lower() or None
+
+def clean_detailed_translation(text):
+    """First line of the reply, parentheses removed, lowercase."""
+    phrase = (text or "").strip().split('\n')[0].strip()
+    phrase = re.sub(r'\([^)]*\)', '', phrase).strip()
+    return phrase.lower() or None
+
+async def groq_complete(groq, prompt, max_tokens, deadline=None, **kwargs):
+    """
+    Run a blocking Groq chat completion in the default executor behind the
+    Groq circuit breaker and retry policy; returns the reply text. The
+    request timeout is capped by the `deadline`'s remaining budget.
+    """
+    deadline = deadline or Deadline()
+    timeout = deadline.timeout(GROQ_TIMEOUT)
+    loop = asyncio.get_event_loop()
+    resp = await groq_dependency.acall(lambda: loop.run_in_executor(
+        None,
+        lambda: groq.chat.completions.create(
+            model=MAPPING_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=0,
+            timeout=timeout,
+            **kwargs
+        )
+    ), deadline)
+    return resp.choices[0].message.content
+
+async def translate_ayush_to_english_simple(ayush_term, use_base_term=False, deadline=None):
     """Translate to simplest medical term."""
     try:
+        term_to_translate = extract_base_term(ayush_term) if use_base_term else ayush_term
+        mode = "simple_base" if use_base_term else "simple"
+
+        cache = get_translation_cache()
+        cached = await cache.aget(term_to_translate, mode, MAPPING_MODEL) if cache else None
+        if cached:
+            print(f"💾 Cached translation '{term_to_translate}' → '{cached}'")
+            return cached
+
         groq = get_groq_client()
         if not groq:
             return None
         
-        term_to_translate = extract_base_term(ayush_term) if use_base_term else ayush_term
-        
         prompt = f"""Translate this Ayurvedic term to the SIMPLEST English medical word that ICD-11 would recognize.
 
 Return ONLY a single, simple medical word (e.g., "fever", "cough", "diarrhea").
@@ -116,29 +173,24 @@ Term: {term_to_translate}
 
 Simple word:"""
         
-        loop = asyncio.get_event_loop()
-        resp = await loop.run_in_executor(
-            None,
-            lambda: groq.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=10,
-                temperature=0
-            )
-        )
-        
-        english_term = resp.choices[0].message.content.strip()
-        english_term = english_term.split()[0] if english_term.split() else english_term
-        english_term = re.sub(r'[^a-zA-Z]', '', english_term)
+        english_term = clean_simple_translation(await groq_complete(groq, prompt, max_tokens=10, deadline=deadline))
         print(f"✅ Translated '{term_to_translate}' → '{english_term}'")
-        return english_term.lower() if english_term else None
+        if cache and english_term:
+            await cache.aset(term_to_translate, mode, MAPPING_MODEL, english_term)
+        return english_term
     except Exception as e:
         print(f"❌ Translation failed: {str(e)}")
         return None
 
-async def translate_ayush_to_english_detailed(ayush_term):
+async def translate_ayush_to_english_detailed(ayush_term, deadline=None):
     """Translate to detailed English term (for description matching)."""
     try:
+        cache = get_translation_cache()
+        cached = await cache.aget(ayush_term, "detailed", MAPPING_MODEL) if cache else None
+        if cached:
+            print(f"💾 Cached detailed translation '{ayush_term}' → '{cached}'")
+            return cached
+
         groq = get_groq_client()
         if not groq:
             return None
@@ -156,34 +208,162 @@ Term: {ayush_term}
 
 Medical phrase:"""
         
-        loop = asyncio.get_event_loop()
-        resp = await loop.run_in_executor(
-            None,
-            lambda: groq.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=30,
-                temperature=0
-            )
-        )
-        
-        english_term = resp.choices[0].message.content.strip()
-        english_term = english_term.split('\n')[0].strip()
-        english_term = re.sub(r'\([^)]*\)', '', english_term).strip()
+        english_term = clean_detailed_translation(await groq_complete(groq, prompt, max_tokens=30, deadline=deadline))
         print(f"✅ Detailed translation '{ayush_term}' → '{english_term}'")
-        return english_term.lower() if english_term else None
+        if cache and english_term:
+            await cache.aset(ayush_term, "detailed", MAPPING_MODEL, english_term)
+        return english_term
     except Exception as e:
         print(f"❌ Detailed translation failed: {str(e)}")
         return None
 
-async def enrich_description_with_llm(code, title, translated_term):
-    """Use LLM to understand if an ICD code matches the translated term."""
+def validate_combined_translation(data):
+    """
+    Check one {simple, simple_base, detailed} object from the LLM. Returns
+    the cleaned values (None where empty) or None if a key is missing, a
+    value is not a string/null, or nothing usable came back.
+    """
+    keys = ("simple", "simple_base", "detailed")
+    if not isinstance(data, dict) or any(k not in data for k in keys):
+        return None
+    if any(data[k] is not None and not isinstance(data[k], str) for k in keys):
+        return None
+    parsed = {
+        "simple": clean_simple_translation(data["simple"]),
+        "simple_base": clean_simple_translation(data["simple_base"]),
+        "detailed": clean_detailed_translation(data["detailed"]),
+    }
+    if not any(parsed.values()):
+        return None
+    return parsed
+
+def parse_combined_translation(content):
+    """Strictly parse the combined translation reply (see validate_combined_translation)."""
     try:
-        groq = get_groq_client()
-        if not groq:
+        data = json.loads(strip_code_fence(content))
+    except ValueError:
+        return None
+    return validate_combined_translation(data)
+
+COMBINED_TRANSLATION_KEYS = """- "simple": the SIMPLEST single English medical word for the term (e.g. "fever", "cough", "diarrhea"), not a phrase
+- "simple_base": the simplest single English medical word for the base term
+- "detailed": a descriptive English medical phrase for the term"""
+
+async def _combined_translation_call(payload, deadline=None):
+    ayush_term, base_term = payload
+    prompt = f"""Translate this Ayurvedic term to English medical terms that ICD-11 would recognize.
+
+Return ONLY a JSON object with exactly these keys:
+{COMBINED_TRANSLATION_KEYS}
+
+Examples:
+- "Vataja Jwara" (base term "Jwara") → {{"simple": "fever", "simple_base": "fever", "detailed": "fever with chills"}}
+- "Kaphaja Kasa" (base term "Kasa") → {{"simple": "cough", "simple_base": "cough", "detailed": "productive cough"}}
+- "Pittaja Jwara" (base term "Jwara") → {{"simple": "fever", "simple_base": "fever", "detailed": "fever with sweating"}}
+
+Term: {ayush_term}
+Base term: {base_term}"""
+
+    content = await groq_complete(
+        get_groq_client(), prompt, max_tokens=60, deadline=deadline, response_format={"type": "json_object"}
+    )
+    return parse_combined_translation(content)
+
+async def _combined_translation_batch(payloads):
+    """Translate several terms in one prompt; answers keyed by item number."""
+    items = "\n".join(
+        f'{i}. Term: "{ayush_term}" | Base term: "{base_term}"'
+        for i, (ayush_term, base_term) in enumerate(payloads, 1)
+    )
+    prompt = f"""Translate each numbered Ayurvedic term below to English medical terms that ICD-11 would recognize.
+
+Return ONLY a JSON object keyed by item number ("1", "2", ...). Each value must be an object with exactly these keys:
+{COMBINED_TRANSLATION_KEYS}
+
+Example: {{"1": {{"simple": "fever", "simple_base": "fever", "detailed": "fever with chills"}}}}
+
+Items:
+{items}"""
+
+    content = await groq_complete(
+        get_groq_client(), prompt, max_tokens=60 * len(payloads), response_format={"type": "json_object"}
+    )
+    answers = parse_keyed_reply(content, len(payloads))
+    return {i: parsed for i, data in answers.items() if (parsed := validate_combined_translation(data))}
+
+_translation_batcher = MicroBatcher("translation", _combined_translation_batch, _combined_translation_call)
+
+async def translate_ayush_to_english_combined(ayush_term, base_term, deadline=None):
+    """
+    Simple, base-term and detailed translations from one Groq call (or a
+    share of one micro-batched call when GROQ_MICROBATCH is on). Results
+    are stored under the same cache keys as the individual translate_*
+    functions. When some are already cached only the missing ones are
+    requested, each with its individual call. Returns None when Groq is
+    unavailable or the reply does not parse, so callers can fall back to
+    individual calls. Requests with a latency budget skip the
+    micro-batching window.
+    """
+    try:
+        cache = get_translation_cache()
+        cached = {"simple": None, "simple_base": None, "detailed": None}
+        if cache:
+            cached["simple"], cached["simple_base"], cached["detailed"] = await asyncio.gather(
+                cache.aget(ayush_term, "simple", MAPPING_MODEL),
+                cache.aget(base_term, "simple_base", MAPPING_MODEL),
+                cache.aget(ayush_term, "detailed", MAPPING_MODEL),
+            )
+        # The base-term word is only a fallback for a missing simple word
+        missing = [k for k in ("simple", "detailed") if not cached[k]]
+        if not cached["simple"] and not cached["simple_base"] and base_term != ayush_term:
+            missing.append("simple_base")
+        if not missing:
+            print(f"💾 Cached translations '{ayush_term}' → '{cached['simple']}' / '{cached['detailed']}'")
+            return cached
+
+        if not get_groq_client():
             return None
-        
-        prompt = f"""Does this ICD-11 code match the medical term?
+
+        if any(cached.values()):
+            print(f"💾 Partly cached translations for '{ayush_term}'; requesting {', '.join(missing)}")
+            calls = {
+                "simple": lambda: translate_ayush_to_english_simple(ayush_term, deadline=deadline),
+                "simple_base": lambda: translate_ayush_to_english_simple(base_term, use_base_term=True, deadline=deadline),
+                "detailed": lambda: translate_ayush_to_english_detailed(ayush_term, deadline=deadline),
+            }
+            values = await asyncio.gather(*(calls[k]() for k in missing))
+            return {**cached, **dict(zip(missing, values))}
+
+        if GROQ_MICROBATCH and not (deadline and deadline.bounded):
+            parsed = await _translation_batcher.submit((ayush_term, base_term))
+        else:
+            parsed = await _combined_translation_call((ayush_term, base_term), deadline)
+        if parsed is None:
+            print(f"⚠️ Combined translation for '{ayush_term}' did not parse; using individual calls")
+            return None
+        print(f"✅ Translated '{ayush_term}' → {parsed}")
+        if cache:
+            if parsed["simple"]:
+                await cache.aset(ayush_term, "simple", MAPPING_MODEL, parsed["simple"])
+            if parsed["simple_base"]:
+                await cache.aset(base_term, "simple_base", MAPPING_MODEL, parsed["simple_base"])
+            if parsed["detailed"]:
+                await cache.aset(ayush_term, "detailed", MAPPING_MODEL, parsed["detailed"])
+        return parsed
+    except Exception as e:
+        print(f"❌ Combined translation failed: {str(e)}")
+        return None
+
+def _enrichment(title, matches, reason):
+    return {
+        "matches": matches,
+        "reason": reason,
+        "enriched_description": f"{title}. {reason}" if reason else title
+    }
+
+async def _enrichment_call(payload, deadline=None):
+    code, title, translated_term = payload
+    prompt = f"""Does this ICD-11 code match the medical term?
 
 ICD Code: {code}
 ICD Title: {title}
@@ -192,27 +372,45 @@ Medical Term: {translated_term}
 Answer with ONLY "yes" or "no" and a brief reason (one sentence).
 
 Format: yes/no - reason"""
-        
-        loop = asyncio.get_event_loop()
-        resp = await loop.run_in_executor(
-            None,
-            lambda: groq.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=50,
-                temperature=0
-            )
-        )
-        
-        result = resp.choices[0].message.content.strip()
-        is_match = result.lower().startswith("yes")
-        reason = result.split("-", 1)[1].strip() if "-" in result else ""
-        
-        return {
-            "matches": is_match,
-            "reason": reason,
-            "enriched_description": f"{title}. {reason}" if reason else title
-        }
+
+    result = (await groq_complete(get_groq_client(), prompt, max_tokens=50, deadline=deadline)).strip()
+    is_match = result.lower().startswith("yes")
+    reason = result.split("-", 1)[1].strip() if "-" in result else ""
+    return _enrichment(title, is_match, reason)
+
+async def _enrichment_batch(payloads):
+    """Judge several (code, title, term) pairs in one prompt; answers keyed by item number."""
+    items = "\n".join(
+        f'{i}. ICD Code: {code} | ICD Title: {title} | Medical Term: {term}'
+        for i, (code, title, term) in enumerate(payloads, 1)
+    )
+    prompt = f"""For each numbered item, does the ICD-11 code match the medical term?
+
+Return ONLY a JSON object keyed by item number ("1", "2", ...). Each value must be
+{{"match": true or false, "reason": "<brief reason, one sentence>"}}.
+
+Items:
+{items}"""
+
+    content = await groq_complete(
+        get_groq_client(), prompt, max_tokens=50 * len(payloads), response_format={"type": "json_object"}
+    )
+    answers = {}
+    for i, data in parse_keyed_reply(content, len(payloads)).items():
+        if isinstance(data, dict) and isinstance(data.get("match"), bool) and isinstance(data.get("reason", ""), str):
+            answers[i] = _enrichment(payloads[i][1], data["match"], data.get("reason", "").strip())
+    return answers
+
+_enrichment_batcher = MicroBatcher("enrichment", _enrichment_batch, _enrichment_call)
+
+async def enrich_description_with_llm(code, title, translated_term, deadline=None):
+    """Use LLM to understand if an ICD code matches the translated term."""
+    try:
+        if not get_groq_client():
+            return None
+        if GROQ_MICROBATCH and not (deadline and deadline.bounded):
+            return await _enrichment_batcher.submit((code, title, translated_term))
+        return await _enrichment_call((code, title, translated_term), deadline)
     except Exception as e:
         print(f"❌ LLM enrichment failed for {code}: {str(e)}")
         return None
@@ -268,11 +466,141 @@ def prioritize_icd_results_by_description(results, translated_term, detailed_ter
     
     return prioritized
 
+def _apply_enrichment(r, enrichment):
+    if enrichment:
+        r["llm_enriched"] = True
+        r["llm_match"] = enrichment["matches"]
+        r["llm_reason"] = enrichment["reason"]
+        if enrichment["matches"]:
+            # Boost score if LLM confirms match
+            r["score"] = 0.9
+
+
 class MappingAgent:
-    def __init__(self):
-        pass
+    def __init__(self, concurrent=None, combined=None):
+        # Concurrent mode overlaps independent LLM/ICD calls; results match the sequential path
+        self.concurrent = MAPPING_CONCURRENT if concurrent is None else concurrent
+        self.combined = COMBINED_TRANSLATION if combined is None else combined
 
-    async def run(self, ayush_term):
+    async def _translate_simple(self, normalized_term, base_term, det, deadline):
+        """Translate to simple term (for ICD API search) - try multiple strategies."""
+        # Strategy 1: Try Groq translation of full term
+        simple_term = await translate_ayush_to_english_simple(normalized_term, use_base_term=False, deadline=deadline)
+        
+        # Strategy 2: Try Groq translation of base term
+        if not simple_term and base_term != normalized_term:
+            simple_term = await translate_ayush_to_english_simple(base_term, use_base_term=True, deadline=deadline)
+        return self._simple_fallback(simple_term, base_term, det)
+
+    @staticmethod
+    def _simple_fallback(simple_term, base_term, det):
+        # Strategy 3: Derive from CSV title (works even without Groq)
+        if not simple_term:
+            simple_term = derive_simple_from_csv(det)
+        
+        # Strategy 4: Last resort - use base term directly (might work for some terms)
+        if not simple_term and base_term:
+            # Try base term as-is (e.g., "Jwara" might work directly)
+            simple_term = base_term.lower()
+            print(f"🔎 Using base term '{simple_term}' directly for ICD API search")
+        return simple_term
+
+    async def _translate(self, normalized_term, base_term, det, deadline, skipped_steps):
+        """
+        Resolve (simple_term, detailed_term). The combined call replaces the
+        up-to-three individual Groq calls; the individual calls are the
+        fallback when it is disabled or its reply does not parse. There the
+        detailed translation is optional and skipped when the latency
+        budget runs low (the combined call gets it for free).
+        """
+        if self.combined:
+            combined = await translate_ayush_to_english_combined(normalized_term, base_term, deadline)
+            if combined is not None:
+                simple_term = combined["simple"]
+                if not simple_term and base_term != normalized_term:
+                    simple_term = combined["simple_base"]
+                return self._simple_fallback(simple_term, base_term, det), combined["detailed"]
+
+        want_detailed = deadline.allows(SKIP_DETAILED_TRANSLATION_BELOW)
+        if not want_detailed:
+            print(f"⏱️ Skipping detailed translation of '{normalized_term}' ({deadline.remaining():.2f}s left)")
+            skipped_steps.append(skipped_step("detailed_translation", deadline))
+
+        if not self.concurrent:
+            simple_term = await self._translate_simple(normalized_term, base_term, det, deadline)
+            # Translate to detailed term (for description matching)
+            detailed_term = None
+            if want_detailed:
+                detailed_term = await translate_ayush_to_english_detailed(normalized_term, deadline=deadline)
+            return simple_term, detailed_term
+        if not want_detailed:
+            return await self._translate_simple(normalized_term, base_term, det, deadline), None
+        simple_term, detailed_term = await asyncio.gather(
+            self._translate_simple(normalized_term, base_term, det, deadline),
+            translate_ayush_to_english_detailed(normalized_term, deadline=deadline),
+        )
+        return simple_term, detailed_term
+
+    @instrumented("translate_search")
+    async def _translate_and_search(self, normalized_term, base_term, det, deadline, skipped_steps):
+        """
+        Resolve (simple_term, detailed_term, icd_results).
+        Sequential mode awaits each call in turn. Concurrent mode runs the
+        translations concurrently and speculatively searches ICD with the
+        CSV-derived term while the LLM is in flight; the speculative results
+        are used only if the translation agrees.
+        """
+        if not self.concurrent:
+            simple_term, detailed_term = await self._translate(normalized_term, base_term, det, deadline, skipped_steps)
+            results = await async_icd(simple_term, deadline=deadline) if simple_term else None
+            return simple_term, detailed_term, results
+
+        csv_term = derive_simple_from_csv(det)
+        speculative = asyncio.ensure_future(async_icd(csv_term, deadline=deadline)) if csv_term else None
+        try:
+            simple_term, detailed_term = await self._translate(normalized_term, base_term, det, deadline, skipped_steps)
+            if not simple_term:
+                return simple_term, detailed_term, None
+            if speculative and simple_term == csv_term:
+                print(f"⚡ Reusing speculative ICD search for '{csv_term}'")
+                results = await speculative
+            else:
+                results = await async_icd(simple_term, deadline=deadline)
+            return simple_term, detailed_term, results
+        finally:
+            if speculative and not speculative.done():
+                speculative.cancel()
+
+    @instrumented("enrichment")
+    async def _enrich(self, prioritized, term, deadline, skipped_steps):
+        """
+        Enrich top 5 results with LLM where the description is missing.
+        Optional: skipped when the latency budget runs low.
+        """
+        targets = [r for r in prioritized[:5] if not r.get("description")]
+        if targets and not deadline.allows(SKIP_ENRICHMENT_BELOW):
+            print(f"⏱️ Skipping LLM enrichment of {len(targets)} results ({deadline.remaining():.2f}s left)")
+            skipped_steps.append(skipped_step("enrichment", deadline))
+            return
+        if not self.concurrent:
+            for r in targets:
+                print(f"🤖 Enriching description for {r.get('code')} using LLM")
+                enrichment = await enrich_description_with_llm(r.get("code"), r.get("title"), term, deadline=deadline)
+                _apply_enrichment(r, enrichment)
+            return
+
+        semaphore = asyncio.Semaphore(ENRICH_CONCURRENCY)
+
+        async def enrich_one(r):
+            async with semaphore:
+                print(f"🤖 Enriching description for {r.get('code')} using LLM")
+                return await enrich_description_with_llm(r.get("code"), r.get("title"), term, deadline=deadline)
+
+        enrichments = await asyncio.gather(*(enrich_one(r) for r in targets))
+        for r, enrichment in zip(targets, enrichments):
+            _apply_enrichment(r, enrichment)
+
+    async def run(self, ayush_term, deadline=None):
         """
         Enhanced mapping with description-based prioritization:
         1. Normalize term
@@ -281,8 +609,12 @@ class MappingAgent:
         4. Prioritize by description matching
         5. Enrich missing descriptions with LLM
         6. Fallback to CSV
+        External calls are bounded by the `deadline`; optional steps skipped
+        to stay within it are listed in the result's skipped_steps.
         """
         print(f"🔍 Mapping Agent: Processing '{ayush_term}'")
+        deadline = deadline or Deadline()
+        skipped_steps = []
         
         # Normalize
         normalized_term = normalize_ayush_term(ayush_term)
@@ -309,36 +641,18 @@ class MappingAgent:
             }
             print(f"📋 CSV found {len(csv_results['candidates'])} mappings")
         
-        # Translate to simple term (for ICD API search) - try multiple strategies
-        simple_term = None
-        
-        # Strategy 1: Try Groq translation of full term
-        simple_term = await translate_ayush_to_english_simple(normalized_term, use_base_term=False)
-        
-        # Strategy 2: Try Groq translation of base term
-        if not simple_term and base_term != normalized_term:
-            simple_term = await translate_ayush_to_english_simple(base_term, use_base_term=True)
-        
-        # Strategy 3: Derive from CSV title (works even without Groq)
-        if not simple_term:
-            simple_term = derive_simple_from_csv(det)
-        
-        # Strategy 4: Last resort - use base term directly (might work for some terms)
-        if not simple_term and base_term:
-            # Try base term as-is (e.g., "Jwara" might work directly)
-            simple_term = base_term.lower()
-            print(f"🔎 Using base term '{simple_term}' directly for ICD API search")
-        
-        # Translate to detailed term (for description matching)
-        detailed_term = await translate_ayush_to_english_detailed(normalized_term)
-        
-        # Call ICD API with simple term
+        # Translate and call ICD API with simple term
         all_icd_results = []
+        try:
+            simple_term, detailed_term, results = await self._translate_and_search(
+                normalized_term, base_term, det, deadline, skipped_steps
+            )
+        except Exception as e:
+            print(f"❌ ICD API call failed: {str(e)}")
+            simple_term, detailed_term, results = None, None, None
         if simple_term:
-            print(f"🌐 Calling ICD-11 API with: '{simple_term}'")
+            print(f"🌐 ICD-11 API searched with: '{simple_term}'")
             try:
-                results = await async_icd(simple_term)
-                
                 if results and isinstance(results, list) and len(results) > 0:
                     print(f"✅ ICD API returned {len(results)} results")
                     
@@ -350,21 +664,7 @@ class MappingAgent:
                     )
                     
                     # Enrich results with LLM if description is missing
-                    for r in prioritized[:5]:  # Process top 5
-                        if not r.get("description"):
-                            print(f"🤖 Enriching description for {r.get('code')} using LLM")
-                            enrichment = await enrich_description_with_llm(
-                                r.get("code"),
-                                r.get("title"),
-                                detailed_term or simple_term
-                            )
-                            if enrichment:
-                                r["llm_enriched"] = True
-                                r["llm_match"] = enrichment["matches"]
-                                r["llm_reason"] = enrichment["reason"]
-                                if enrichment["matches"]:
-                                    # Boost score if LLM confirms match
-                                    r["score"] = 0.9
+                    await self._enrich(prioritized, detailed_term or simple_term, deadline, skipped_steps)
                     
                     # Convert to candidate format
                     for r in prioritized:
@@ -389,7 +689,6 @@ class MappingAgent:
                     print(f"✅ Prioritized {len(all_icd_results)} ICD API results")
             except Exception as e:
                 print(f"❌ ICD API call failed: {str(e)}")
-        
         # PRIORITIZE ICD API RESULTS - Only use CSV as fallback if ICD API returns nothing
         if all_icd_results:
             # ICD API returned results - use them as primary, CSV only as additional options
@@ -415,6 +714,7 @@ class MappingAgent:
                 "manual_review_reason": review_reason,
                 "english_translation": simple_term,
                 "detailed_translation": detailed_term,
+                "skipped_steps": skipped_steps,
             }
 
         # ICD API returned no results - fallback to CSV
@@ -428,6 +728,7 @@ class MappingAgent:
                 or "ICD API returned 0 results. Using CSV fallback.",
                 "english_translation": None,
                 "detailed_translation": detailed_term,
+                "skipped_steps": skipped_steps,
             }
 
         # No results from either source
@@ -439,4 +740,5 @@ class MappingAgent:
             "manual_review_reason": "No mapping found in ICD API or CSV.",
             "english_translation": None,
             "detailed_translation": detailed_term,
+            "skipped_steps": skipped_steps,
         }
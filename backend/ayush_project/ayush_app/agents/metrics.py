@@ -0,0 +1,322 @@
+# agents/metrics.py
+import contextvars
+import functools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Collect latency histograms, counters and gauges; off = timers are shared no-ops
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+# Metrics live in each process's memory, so under gunicorn/uwsgi every worker
+# exposes only its own share. Each sample carries worker="<this value>" (the
+# pid when unset); scrape every worker separately and aggregate with
+# sum without (worker) (...) in queries.
+METRICS_WORKER_LABEL = os.getenv("METRICS_WORKER_LABEL", "")
+
+# Seconds; covers cache hits (ms) through slow LLM calls and whole runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def worker_id():
+    """The `worker` label value: METRICS_WORKER_LABEL, else this process's pid (re-read after a fork)."""
+    return METRICS_WORKER_LABEL or str(os.getpid())
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    pairs.append(f'worker="{_escape(worker_id())}"')
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric family with fixed label names; thread-safe."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self):
+        """(suffix, labels, value) rows for the Prometheus text format."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, n=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, n=1, **labels):
+        self.inc(-n, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(_label_key(self.labelnames, labels))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, ([*e[0]], e[1], e[2])) for key, e in self._values.items())
+        rows = []
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                rows.append(("_bucket", _format_labels(self.labelnames, key, [("le", le)]), cumulative))
+            rows.append(("_sum", _format_labels(self.labelnames, key), total))
+            rows.append(("_count", _format_labels(self.labelnames, key), n))
+        return rows
+
+
+REGISTRY = []
+
+
+def _register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+PIPELINE_RUN_SECONDS = _register(Histogram("ayush_pipeline_run_seconds", "Whole /run_pipeline/ graph runs."))
+PIPELINE_RUNS_IN_FLIGHT = _register(Gauge("ayush_pipeline_runs_in_flight", "Graph runs in progress."))
+STEP_SECONDS = _register(Histogram(
+    "ayush_pipeline_step_seconds", "LangGraph nodes and the mapping agent's sub-steps.", ("step",)
+))
+DEPENDENCY_SECONDS = _register(Histogram(
+    "ayush_dependency_call_seconds", "Single attempts of outbound Groq, ICD-11 and ABDM calls.",
+    ("dependency", "outcome"),
+))
+DEPENDENCY_IN_FLIGHT = _register(Gauge(
+    "ayush_dependency_calls_in_flight", "Outbound call attempts in progress.", ("dependency",)
+))
+TOKEN_FETCH_SECONDS = _register(Histogram(
+    "ayush_token_fetch_seconds", "OAuth token endpoint calls.", ("service", "outcome")
+))
+CACHE_REQUESTS = _register(Counter("ayush_cache_requests_total", "Cache lookups.", ("cache", "result")))
+
+
+def render_prometheus():
+    """
+    Every registered metric in the Prometheus text exposition format (0.0.4),
+    for this process only - see METRICS_WORKER_LABEL.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.clear()
+
+
+# -------------------------
+# Per-run timings (provenance "timings" block)
+# -------------------------
+_run_timings = contextvars.ContextVar("ayush_run_timings", default=None)
+
+
+class RunTimings:
+    """Step and dependency time spent on behalf of one pipeline run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind, name, seconds):
+        with self._lock:
+            entry = self._totals.setdefault((kind, name), [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def summary(self):
+        """Counts and summed milliseconds; parallel terms can make a step's sum exceed total_ms."""
+        out = {"total_ms": round((time.perf_counter() - self.started) * 1000, 1), "steps": {}, "dependencies": {}}
+        with self._lock:
+            for (kind, name), (n, seconds) in sorted(self._totals.items()):
+                out[kind][name] = {"count": n, "total_ms": round(seconds * 1000, 1)}
+        return out
+
+
+@contextmanager
+def collect_timings():
+    """Collect per-run timings for the code in this context (and the tasks/threads it starts); None when disabled."""
+    if not METRICS_ENABLED:
+        yield None
+        return
+    timings = RunTimings()
+    token = _run_timings.set(timings)
+    PIPELINE_RUNS_IN_FLIGHT.inc()
+    try:
+        yield timings
+    finally:
+        _run_timings.reset(token)
+        PIPELINE_RUNS_IN_FLIGHT.dec()
+        PIPELINE_RUN_SECONDS.observe(time.perf_counter() - timings.started)
+
+
+# -------------------------
+# Timers
+# -------------------------
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StepTimer:
+    __slots__ = ("step", "started")
+
+    def __init__(self, step):
+        self.step = step
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        STEP_SECONDS.observe(elapsed, step=self.step)
+        timings = _run_timings.get()
+        if timings is not None:
+            timings.add("steps", self.step, elapsed)
+        return False
+
+
+class _CallTimer:
+    """Times one outbound attempt; the outcome label comes from whether it raised."""
+
+    __slots__ = ("histogram", "gauge", "run_name", "labels", "started")
+
+    def __init__(self, histogram, gauge, run_name, **labels):
+        self.histogram = histogram
+        self.gauge = gauge
+        self.run_name = run_name
+        self.labels = labels
+
+    def __enter__(self):
+        if self.gauge is not None:
+            self.gauge.inc(**self.labels)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if self.gauge is not None:
+            self.gauge.dec(**self.labels)
+        self.histogram.observe(elapsed, outcome="error" if exc_type else "ok", **self.labels)
+        timings = _run_timings.get()
+        if timings is not None:
+            timings.add("dependencies", self.run_name, elapsed)
+        return False
+
+
+def time_step(step):
+    return _StepTimer(step) if METRICS_ENABLED else _NULL_TIMER
+
+
+def time_dependency(dependency):
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _CallTimer(DEPENDENCY_SECONDS, DEPENDENCY_IN_FLIGHT, dependency, dependency=dependency)
+
+
+def time_token_fetch(service):
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _CallTimer(TOKEN_FETCH_SECONDS, None, f"{service} token", service=service)
+
+
+def instrumented(step):
+    """Time an async LangGraph node (or step) under `step`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with time_step(step):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count_cache(cache, hit):
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
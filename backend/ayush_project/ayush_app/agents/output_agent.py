@@ -5,7 +5,7 @@ class OutputAgent:
     def __init__(self):
         self.abdm = ABDMClient()
 
-    def run(self, state, patient_ref, auto_push=False):
+    def _build(self, state, patient_ref, auto_push):
         try:
             fhir = build_fhir(state, patient_ref)
         except Exception as e:
@@ -17,10 +17,28 @@ class OutputAgent:
             "pushed": False,
             "push_response": None
         }
+        should_push = auto_push and not state.get("needs_human_review", True) and fhir
+        return result, should_push
+
+    def run(self, state, patient_ref, auto_push=False):
+        result, should_push = self._build(state, patient_ref, auto_push)
+        if should_push:
+            try:
+                resp = self.abdm.push_condition(result["fhir"])
+                result["pushed"] = True
+                result["push_response"] = resp
+            except Exception as e:
+                print(f"ABDM push error: {str(e)}")
+                result["push_response"] = {"error": str(e)}
+
+        return result
 
-        if auto_push and not state.get("needs_human_review", True) and fhir:
+    async def arun(self, state, patient_ref, auto_push=False):
+        """Async run() that pushes to ABDM over the pooled async client."""
+        result, should_push = self._build(state, patient_ref, auto_push)
+        if should_push:
             try:
-                resp = self.abdm.push_condition(fhir)
+                resp = await self.abdm.apush_condition(result["fhir"])
                 result["pushed"] = True
                 result["push_response"] = resp
             except Exception as e:
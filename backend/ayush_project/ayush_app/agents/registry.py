@@ -0,0 +1,80 @@
+# agents/registry.py
+import os
+import threading
+
+from .extraction_agent import ExtractionAgent
+from .mapping_agent import MappingAgent
+from . import mapping_agent
+from .validation_agent import ValidationAgent
+from .output_agent import OutputAgent
+
+
+class AgentRegistry:
+    """
+    Builds each agent (and the Groq/ICD/ABDM clients they hold) once per
+    process and hands the same instances to every pipeline node, so OAuth
+    tokens and pooled HTTP connections outlive a single request.
+    Creation is guarded by a lock; nothing awaits while holding it, so it
+    is safe from both worker threads and the pipeline event loop.
+    """
+
+    def __init__(self, groq_api_key=None):
+        self._groq_key = groq_api_key or os.getenv("GROQ_API_KEY")
+        self._lock = threading.Lock()
+        self._instances = {}
+
+    def _get(self, name, factory):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = factory()
+                    self._instances[name] = instance
+        return instance
+
+    def extraction(self):
+        return self._get("extraction", lambda: ExtractionAgent(self._groq_key))
+
+    def mapping(self):
+        return self._get("mapping", MappingAgent)
+
+    def validation(self):
+        return self._get("validation", lambda: ValidationAgent(self._groq_key))
+
+    def output(self):
+        return self._get("output", OutputAgent)
+
+    def icd_client(self):
+        # MappingAgent searches through the module-level client in mapping_agent
+        return mapping_agent.client
+
+    def abdm_client(self):
+        return self.output().abdm
+
+    async def aclose(self):
+        """Close the pooled async HTTP clients (runtime shutdown hook)."""
+        await self.icd_client().aclose()
+        if "output" in self._instances:
+            await self.abdm_client().aclose()
+
+
+_registry = None
+_registry_pid = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry, _registry_pid
+    pid = os.getpid()
+    if _registry is None or _registry_pid != pid:
+        with _registry_lock:
+            if _registry is None or _registry_pid != pid:
+                from .langgraph_pipeline.runtime import current_runtime
+
+                _registry = AgentRegistry()
+                _registry_pid = pid
+                runtime = current_runtime()
+                if runtime is not None:
+                    runtime.add_shutdown_hook(_registry.aclose)
+    return _registry
@@ -0,0 +1,318 @@
+# agents/resilience.py
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import groq
+import httpx
+import requests
+
+from .metrics import time_dependency
+
+# Circuit breaker: consecutive failed calls before opening, seconds before a half-open probe
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))
+# Retries: attempts per call (including the first), jittered exponential backoff in seconds
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "2"))
+# Shared retry budget: retries may add RETRY_BUDGET_RATIO of the call volume,
+# plus RETRY_BUDGET_MIN_PER_SEC so quiet periods can still retry
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MIN_PER_SEC = float(os.getenv("RETRY_BUDGET_MIN_PER_SEC", "1"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Statuses where a non-idempotent request (e.g. an ABDM push) was not processed
+UNPROCESSED_STATUSES = (429, 503)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open ->
+    half-open once `recovery_timeout` has passed, letting a single probe
+    call through. The probe closes the circuit on success and reopens it
+    on failure. Thread-safe.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=None, recovery_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or CIRCUIT_FAILURE_THRESHOLD
+        self.recovery_timeout = CIRCUIT_RECOVERY_TIMEOUT if recovery_timeout is None else recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            if self.state == self.CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"✅ {self.name} circuit closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"⚡ {self.name} circuit opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """End a call that says nothing about the dependency's health."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "rejected_calls": self.rejected,
+                "probe_in": retry_in,
+            }
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every dependency: each call deposits `ratio`
+    tokens, each retry spends one, and `min_per_second` tokens trickle in
+    regardless of traffic. During an outage retries stop once the bucket
+    is empty instead of multiplying load.
+    """
+
+    def __init__(self, ratio=None, min_per_second=None, max_tokens=None):
+        self.ratio = RETRY_BUDGET_RATIO if ratio is None else ratio
+        self.min_per_second = RETRY_BUDGET_MIN_PER_SEC if min_per_second is None else min_per_second
+        self.max_tokens = RETRY_BUDGET_MAX_TOKENS if max_tokens is None else max_tokens
+        self.tokens = self.max_tokens
+        self.exhausted = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._last) * self.min_per_second)
+        self._last = now
+
+    def record_call(self):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+    def snapshot(self):
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self.tokens, 2), "max_tokens": self.max_tokens, "exhausted": self.exhausted}
+
+
+def parse_retry_after(value):
+    """Retry-After header (delta-seconds or HTTP date) in seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Seconds to wait before retry number `attempt` (0-based): full-jitter
+    exponential backoff, or the server's Retry-After when given. None
+    means the server asked for longer than RETRY_MAX_DELAY - fail fast.
+    """
+    if retry_after is not None:
+        return retry_after if retry_after <= RETRY_MAX_DELAY else None
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def _status_of(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def _retry_after_of(exc):
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    return parse_retry_after(headers.get("retry-after"))
+
+
+def is_transient(exc, idempotent=True):
+    """
+    Whether a failed attempt is a dependency failure (counted by the
+    breaker). With idempotent=False, whether it is also safe to retry.
+    """
+    if idempotent:
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout, httpx.TransportError, groq.APIConnectionError)):
+            return True
+        return _status_of(exc) in RETRY_STATUSES
+    # The request may have been applied - only retry when it cannot have been
+    if isinstance(exc, (requests.ConnectionError, httpx.ConnectError, httpx.ConnectTimeout)):
+        return True
+    return _status_of(exc) in UNPROCESSED_STATUSES
+
+
+def cut_short(exc, deadline):
+    """
+    Whether a failed attempt is a timeout imposed by the request's latency
+    budget rather than by a slow dependency. It says nothing about the
+    dependency's health and its (empty) result must not be cached.
+    """
+    timeouts = (requests.Timeout, httpx.TimeoutException, groq.APITimeoutError)
+    return deadline is not None and isinstance(exc, timeouts) and deadline.spent()
+
+
+def raise_for_transient_status(response):
+    """Turn a 429/5xx response into an exception so the retry policy sees it."""
+    if response.status_code in RETRY_STATUSES:
+        response.raise_for_status()
+    return response
+
+
+class Dependency:
+    """
+    Circuit breaker plus retry policy for one remote service. call()/acall()
+    run a single-attempt function; transient failures are retried with
+    jittered backoff while the shared retry budget allows, and a call that
+    still fails counts once against the breaker. Non-transient errors (bad
+    request, missing credentials) propagate without touching the breaker.
+    """
+
+    def __init__(self, name, budget, idempotent=True, max_attempts=None, failure_threshold=None, recovery_timeout=None):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        self.budget = budget
+        self.idempotent = idempotent
+        self.max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+        self.retries = 0
+
+    def _before_call(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open; skipping call")
+        self.budget.record_call()
+
+    def _retry_delay(self, exc, attempt, deadline=None):
+        """Delay before the next attempt, or None to give up."""
+        if not is_transient(exc):
+            if _status_of(exc) is not None:
+                self.breaker.record_success()  # the service answered; not an outage
+            else:
+                self.breaker.release()
+            return None
+        if cut_short(exc, deadline):
+            self.breaker.release()  # the budget capped the timeout; not an outage
+            return None
+        if attempt + 1 >= self.max_attempts or not is_transient(exc, self.idempotent):
+            self.breaker.record_failure()
+            return None
+        delay = backoff_delay(attempt, _retry_after_of(exc))
+        # A retry that cannot finish inside the request's latency budget is wasted
+        if delay is not None and deadline is not None and delay >= deadline.remaining():
+            delay = None
+        if delay is None or not self.budget.try_spend():
+            self.breaker.record_failure()
+            return None
+        self.retries += 1
+        print(f"🔁 {self.name} attempt {attempt + 1} failed ({type(exc).__name__}); retrying in {delay:.2f}s")
+        return delay
+
+    def call(self, fn, deadline=None):
+        self._before_call()
+        attempt = 0
+        while True:
+            try:
+                with time_dependency(self.name):
+                    result = fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn, deadline=None):
+        """Like call(); `fn` returns a fresh awaitable per attempt."""
+        self._before_call()
+        attempt = 0
+        while True:
+            try:
+                with time_dependency(self.name):
+                    result = await fn()
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def snapshot(self):
+        return {**self.breaker.snapshot(), "retries": self.retries}
+
+
+retry_budget = RetryBudget()
+groq_dependency = Dependency("Groq", retry_budget)
+icd_dependency = Dependency("ICD-11 API", retry_budget)
+# FHIR pushes are not idempotent - only retried when the server cannot have applied them
+abdm_dependency = Dependency("ABDM", retry_budget, idempotent=False)
+
+DEPENDENCIES = {"groq": groq_dependency, "icd": icd_dependency, "abdm": abdm_dependency}
+
+
+def resilience_status():
+    """Breaker and retry budget state for the internal status endpoint."""
+    return {
+        "dependencies": {name: dep.snapshot() for name, dep in DEPENDENCIES.items()},
+        "retry_budget": retry_budget.snapshot(),
+    }
@@ -0,0 +1,102 @@
+# agents/term_scanner.py
+from collections import deque
+from functools import lru_cache
+
+
+class TermScanner:
+    """
+    Aho-Corasick automaton over a fixed set of lowercase patterns.
+    `scan` walks the text once and reports every occurrence that sits on
+    word boundaries, so "Kasa" does not fire inside "Vikasa".
+    """
+
+    def __init__(self, patterns):
+        # patterns: dict of lowercase pattern -> canonical term
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern, term in patterns.items():
+            if pattern:
+                self._add(pattern, term)
+        self._build_failure_links()
+
+    def _add(self, pattern, term):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), pattern, term))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text):
+        """
+        Return every boundary-aligned hit as dicts with term, matched text,
+        key and [start, end) span in the original text.
+        """
+        text = text or ""
+        hits = []
+        node = 0
+        for i, raw_ch in enumerate(text):
+            ch = raw_ch.lower()
+            # Keep spans aligned with the original text when lower() expands a char
+            if len(ch) != 1:
+                ch = raw_ch
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, pattern, term in self._out[node]:
+                start = i + 1 - length
+                if _is_boundary(text, start - 1) and _is_boundary(text, i + 1):
+                    hits.append({
+                        "term": term,
+                        "matched": text[start:i + 1],
+                        "key": pattern,
+                        "start": start,
+                        "end": i + 1,
+                    })
+        return hits
+
+    def best_matches(self, text):
+        """
+        Longest non-overlapping hits, ordered by position in the text.
+        Ties on length go to the earliest hit.
+        """
+        chosen = []
+        for hit in sorted(self.scan(text), key=lambda h: (h["start"] - h["end"], h["start"])):
+            if all(hit["end"] <= c["start"] or hit["start"] >= c["end"] for c in chosen):
+                chosen.append(hit)
+        return sorted(chosen, key=lambda h: h["start"])
+
+
+def _is_boundary(text, pos):
+    return pos < 0 or pos >= len(text) or not text[pos].isalnum()
+
+
+@lru_cache()
+def get_term_scanner():
+    """
+    Scanner compiled from every seed term and its variant keys. Each key maps
+    to the primary seed term of the mapping index, so hits resolve the same
+    way deterministic_lookup does.
+    """
+    from .tools import _mapping_index
+
+    patterns = {key: entry["primary"]["ayush_term"] for key, entry in _mapping_index().items()}
+    return TermScanner(patterns)
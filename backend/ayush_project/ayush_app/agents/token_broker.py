@@ -0,0 +1,266 @@
+# agents/token_broker.py
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from .metrics import time_token_fetch
+
+try:
+    import fcntl
+except ImportError:  # Windows - tokens are shared within the process only
+    fcntl = None
+
+# Private directory (owned by this user, mode 0700) where worker processes share
+# OAuth tokens; unset keeps tokens per process
+TOKEN_CACHE_DIR = os.getenv("TOKEN_CACHE_DIR", "")
+# A token is no longer handed out this many seconds before it expires
+TOKEN_EXPIRY_MARGIN = float(os.getenv("TOKEN_EXPIRY_MARGIN", "30"))
+# Background refresh starts this long before expiry (at most half-way through the token's lifetime)
+TOKEN_REFRESH_AHEAD = float(os.getenv("TOKEN_REFRESH_AHEAD", "300"))
+TOKEN_BACKGROUND_REFRESH = os.getenv("TOKEN_BACKGROUND_REFRESH", "1") == "1"
+TOKEN_RETRY_INTERVAL = float(os.getenv("TOKEN_RETRY_INTERVAL", "5"))  # seconds between failed background refreshes
+
+
+class TokenManager:
+    """
+    OAuth client-credentials token shared by every client of one service.
+
+    - Single-flight: concurrent callers that find no valid token wait on one
+      fetch instead of each calling the token endpoint.
+    - Cross-process: with a cache directory, the token lives in a 0600 JSON
+      file guarded by an flock, so gunicorn workers reuse each other's
+      tokens and only one of them refreshes at a time. The directory must
+      belong to this user and be closed to everyone else (0700); otherwise
+      the token stays in the process.
+    - Proactive: a daemon thread refreshes the token before it expires, so
+      requests only wait on a fetch on a cold start or after a 401.
+
+    `fetch()` is a blocking call returning the token endpoint's JSON
+    ({"access_token": ..., "expires_in": ...}).
+    """
+
+    def __init__(self, name, fetch, cache_dir=None, background=None):
+        self.name = name
+        self.service = name.split("-", 1)[0]
+        self._fetch = fetch
+        self._path = Path(cache_dir) / f"{name}.json" if cache_dir else None
+        self.background = TOKEN_BACKGROUND_REFRESH if background is None else background
+        self._token = None
+        self._issued = 0.0
+        self._expires = 0.0
+        self.fetches = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._refresher_pid = None
+        self._refresher_lock = threading.Lock()
+
+    @staticmethod
+    def _valid(record):
+        return bool(record and record.get("access_token")) and time.time() < record.get("expires_at", 0) - TOKEN_EXPIRY_MARGIN
+
+    def _current(self):
+        return {"access_token": self._token, "issued_at": self._issued, "expires_at": self._expires}
+
+    def token(self):
+        """A valid access token, fetching one only when neither this process nor the shared cache has it."""
+        if not self._valid(self._current()):
+            with self._lock:
+                if not self._valid(self._current()):
+                    self._refresh()
+        self._ensure_refresher()
+        return self._token
+
+    def invalidate(self, rejected):
+        """
+        Replace a token the server rejected (401). Only the first caller
+        holding the rejected token refetches; the rest get its result.
+        """
+        with self._lock:
+            if self._token == rejected or not self._valid(self._current()):
+                self._refresh(rejected=rejected)
+        return self._token
+
+    async def atoken(self):
+        if self._valid(self._current()):
+            self._ensure_refresher()
+            return self._token
+        return await asyncio.get_running_loop().run_in_executor(None, contextvars.copy_context().run, self.token)
+
+    async def ainvalidate(self, rejected):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, contextvars.copy_context().run, self.invalidate, rejected
+        )
+
+    # -------------------------
+    # Refresh (caller holds self._lock)
+    # -------------------------
+    def _refresh(self, rejected=None, proactive=False):
+        with self._shared_lock():
+            shared = self._read_shared()
+            fresher = shared and (not proactive or shared.get("expires_at", 0) > self._expires)
+            if fresher and self._valid(shared) and shared["access_token"] != rejected:
+                self._adopt(shared)
+                return
+            print(f"🔑 Fetching {self.name} token")
+            with time_token_fetch(self.service):
+                js = self._fetch()
+            self.fetches += 1
+            now = time.time()
+            record = {
+                "access_token": js.get("access_token"),
+                "issued_at": now,
+                "expires_at": now + js.get("expires_in", 3600),
+            }
+            self._adopt(record)
+            self._write_shared(record)
+
+    def _adopt(self, record):
+        self._token = record["access_token"]
+        self._issued = record.get("issued_at", time.time())
+        self._expires = record["expires_at"]
+
+    def _refresh_at(self):
+        lifetime = self._expires - self._issued
+        return max(self._issued + lifetime / 2, self._expires - TOKEN_REFRESH_AHEAD)
+
+    # -------------------------
+    # Shared file cache
+    # -------------------------
+    def _private_dir(self):
+        """
+        Create the cache directory if needed and confirm it is a real
+        directory owned by this user with no group/other access, so no one
+        else can read tokens or plant files (symlinks) in it.
+        """
+        directory = self._path.parent
+        try:
+            directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            st = os.lstat(directory)
+        except OSError as e:
+            print(f"⚠️ {self.name} token cache unavailable, using a per-process token: {str(e)}")
+            return False
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            print(
+                f"⚠️ {self.name} token cache {directory} is not a private directory "
+                f"(must be owned by uid {os.getuid()} with mode 0700); using a per-process token"
+            )
+            return False
+        return True
+
+    @contextmanager
+    def _shared_lock(self):
+        if self._path is None or fcntl is None or not self._private_dir():
+            yield
+            return
+        try:
+            fd = os.open(self._path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        except OSError as e:
+            print(f"⚠️ {self.name} token cache unavailable, using a per-process token: {str(e)}")
+            yield
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # closing the descriptor releases the flock
+
+    def _read_shared(self):
+        if self._path is None or not self._private_dir():
+            return None
+        try:
+            fd = os.open(self._path, os.O_RDONLY | os.O_NOFOLLOW)
+            with os.fdopen(fd) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_shared(self, record):
+        if self._path is None or not self._private_dir():
+            return
+        tmp = None
+        try:
+            # mkstemp: unpredictable name, O_EXCL, mode 0600
+            fd, tmp = tempfile.mkstemp(dir=self._path.parent, prefix=f".{self._path.name}.", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(record, f)
+            os.replace(tmp, self._path)
+            tmp = None
+        except OSError as e:
+            print(f"⚠️ Could not share {self.name} token: {str(e)}")
+        finally:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+    # -------------------------
+    # Background refresh
+    # -------------------------
+    def _ensure_refresher(self):
+        if not self.background:
+            return
+        pid = os.getpid()
+        if self._refresher_pid == pid and self._refresher.is_alive():
+            return
+        with self._refresher_lock:
+            # Threads do not survive fork - each worker process starts its own
+            if self._refresher_pid == pid and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, name=f"{self.name}-token-refresh", daemon=True
+            )
+            self._refresher_pid = pid
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        delay = None
+        while True:
+            wait = delay if delay is not None else max(0.0, self._refresh_at() - time.time())
+            if self._stop.wait(wait):
+                return
+            delay = None
+            try:
+                with self._lock:
+                    if time.time() >= self._refresh_at():
+                        self._refresh(proactive=True)
+            except Exception as e:
+                print(f"⚠️ Background {self.name} token refresh failed: {str(e)}")
+                delay = TOKEN_RETRY_INTERVAL
+
+    def close(self):
+        self._stop.set()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(service, fetch, credentials=""):
+    """
+    Process-wide TokenManager for a service, keyed by its credentials so a
+    different client id (or token URL) never reuses another one's token.
+    """
+    name = f"{service}-{hashlib.sha256(credentials.encode()).hexdigest()[:12]}"
+    with _managers_lock:
+        manager = _managers.get(name)
+        if manager is None:
+            manager = _managers[name] = TokenManager(name, fetch, TOKEN_CACHE_DIR or None)
+        return manager
+
+
+def reset_token_managers():
+    """Stop every background refresher and forget cached tokens (tests, reconfiguration)."""
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.close()
+        _managers.clear()
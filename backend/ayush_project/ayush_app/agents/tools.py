@@ -41,38 +41,13 @@ def _variant_keys(value):
     return {k for k in keys if k}
 
 
-def deterministic_lookup(term):
+def _resolve_matches(key, matches):
     """
-    Lookup AYUSH term in seed mappings with synonym awareness.
-    Returns metadata so upstream callers can trigger manual review when multiple
-    deterministic matches exist (e.g., 'Shwasa' vs 'Shwasa (Tamaka Shwasa)').
+    Resolve the primary match and review flags for a single lookup key.
+    Priority order: explicit PRIORITY_CODES → exact match → first match.
     """
-    rows = _load_seed_rows()
-    t = (term or "").lower().strip()
-    if not t:
-        return None
-
-    matches = []
-    for row in rows:
-        row_term = row.get("ayush_term", "")
-        if not row_term:
-            continue
-        keys = _variant_keys(row_term)
-        if t in keys:
-            match_entry = {
-                "ayush_term": row_term,
-                "icd_code": row.get("icd_code"),
-                "icd_title": row.get("icd_title"),
-                "match_type": "exact" if row_term.lower().strip() == t else "alias"
-            }
-            matches.append(match_entry)
-
-    if not matches:
-        return None
-
-    # Prefer explicit priorities → exact match → first match
     primary = None
-    priority_code = PRIORITY_CODES.get(t)
+    priority_code = PRIORITY_CODES.get(key)
     if priority_code:
         primary = next((m for m in matches if m["icd_code"] == priority_code), None)
     if not primary:
@@ -97,18 +72,94 @@ def deterministic_lookup(term):
     }
 
 
-def find_term_in_text(text):
+def build_mapping_index(rows):
     """
-    Lightweight fallback parser: scans the seed mappings to see if any AYUSH term
-    is already present inside the raw note. Returns the first hit, else None.
+    Build an inverted index from every variant key of every seed row to the
+    fully resolved lookup result, so deterministic_lookup is a single dict hit.
+    Rows are visited once, in CSV order, which keeps match ordering identical
+    to the previous linear scan.
     """
-    rows = _load_seed_rows()
-    lowered = (text or "").lower()
+    grouped = {}
     for row in rows:
-        term = row["ayush_term"]
-        if term and term.lower() in lowered:
-            return term
-    return None
+        row_term = row.get("ayush_term", "")
+        if not row_term:
+            continue
+        row_key = row_term.lower().strip()
+        for key in _variant_keys(row_term):
+            grouped.setdefault(key, []).append({
+                "ayush_term": row_term,
+                "icd_code": row.get("icd_code"),
+                "icd_title": row.get("icd_title"),
+                "match_type": "exact" if row_key == key else "alias"
+            })
+    return {key: _resolve_matches(key, matches) for key, matches in grouped.items()}
+
+
+@lru_cache()
+def _mapping_index():
+    return build_mapping_index(_load_seed_rows())
+
+
+@lru_cache()
+def _code_titles():
+    titles = {}
+    for row in _load_seed_rows():
+        if row.get("icd_code"):
+            titles.setdefault(row["icd_code"], row.get("icd_title"))
+    return titles
+
+
+def icd_title_for_code(code):
+    """ICD title of the first seed row with this code, or None."""
+    return _code_titles().get(code)
+
+
+def deterministic_lookup(term, index=None):
+    """
+    Lookup AYUSH term in seed mappings with synonym awareness.
+    Returns metadata so upstream callers can trigger manual review when multiple
+    deterministic matches exist (e.g., 'Shwasa' vs 'Shwasa (Tamaka Shwasa)').
+    `index` defaults to the precompiled seed index (see build_mapping_index).
+    """
+    t = (term or "").lower().strip()
+    if not t:
+        return None
+
+    entry = (index if index is not None else _mapping_index()).get(t)
+    if not entry:
+        return None
+
+    # Hand out copies so callers can annotate rows without touching the index
+    matches = [dict(m) for m in entry["matches"]]
+    primary = matches[entry["matches"].index(entry["primary"])]
+    return {
+        "primary": primary,
+        "matches": matches,
+        "needs_review": entry["needs_review"],
+        "review_reason": entry["review_reason"],
+    }
+
+
+def scan_terms_in_text(text):
+    """
+    Single-pass multi-pattern scan of a note for every seed term and variant key.
+    Returns the longest non-overlapping hits with their spans, in text order.
+    """
+    from .term_scanner import get_term_scanner
+
+    return get_term_scanner().best_matches(text)
+
+
+def find_term_in_text(text):
+    """
+    Lightweight fallback parser: scans the note for AYUSH terms already present
+    in the seed mappings. Returns the longest hit (earliest on ties), else None.
+    """
+    hits = scan_terms_in_text(text)
+    if not hits:
+        return None
+    best = min(hits, key=lambda h: (h["start"] - h["end"], h["start"]))
+    return best["term"]
 
 
 def build_fhir(state, patient_ref):
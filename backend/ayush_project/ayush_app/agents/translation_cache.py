@@ -0,0 +1,189 @@
+# agents/translation_cache.py
+import asyncio
+import contextvars
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .metrics import count_cache
+
+BASE = Path(__file__).resolve().parents[1]
+
+TRANSLATION_CACHE_ENABLED = os.getenv("TRANSLATION_CACHE_ENABLED", "1") == "1"
+TRANSLATION_CACHE_PATH = os.getenv(
+    "TRANSLATION_CACHE_PATH", str(BASE / "data" / "translation_cache.sqlite3")
+)
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))  # seconds
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "10000"))
+# A hit refreshes the entry's LRU timestamp at most this often (seconds), so reads rarely write
+TRANSLATION_CACHE_TOUCH_INTERVAL = float(os.getenv("TRANSLATION_CACHE_TOUCH_INTERVAL", "3600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS translations_accessed_at ON translations(accessed_at);
+"""
+
+
+def normalize_cache_term(term):
+    return re.sub(r"\s+", " ", (term or "").strip().lower())
+
+
+class TranslationCache:
+    """
+    SQLite-backed cache for LLM term translations, keyed by normalized term,
+    translation mode and model name. The file is shared by every worker
+    process on the host and survives restarts. Entries expire after `ttl`
+    seconds and the least recently used ones are evicted beyond `max_entries`.
+    get()/set() block on SQLite; async code uses aget()/aset(), which run
+    them in the default executor.
+    """
+
+    def __init__(self, path=None, ttl=None, max_entries=None, touch_interval=None):
+        self.path = Path(path or TRANSLATION_CACHE_PATH)
+        self.ttl = TRANSLATION_CACHE_TTL if ttl is None else ttl
+        self.max_entries = TRANSLATION_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.touch_interval = TRANSLATION_CACHE_TOUCH_INTERVAL if touch_interval is None else touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = None  # rows in the file as last seen by this process (other writers add to it)
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._ready = True
+        return conn
+
+    @staticmethod
+    def make_key(term, mode, model):
+        return f"{mode}|{model}|{normalize_cache_term(term)}"
+
+    def _count(self, hit):
+        count_cache("translation", hit)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, term, mode, model):
+        """
+        Return the cached translation, or None on a miss/expired entry.
+        Expired rows are left for set()/eviction to replace; a hit only
+        writes when its LRU timestamp is older than `touch_interval`.
+        """
+        key = self.make_key(term, mode, model)
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT value, created_at, accessed_at FROM translations WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] > self.ttl:
+                    row = None
+                elif row and now - row[2] >= self.touch_interval:
+                    with conn:
+                        conn.execute("UPDATE translations SET accessed_at = ? WHERE key = ?", (now, key))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Translation cache read failed: {str(e)}")
+            row = None
+        self._count(bool(row))
+        return row[0] if row else None
+
+    def set(self, term, mode, model, value):
+        if not value:
+            return
+        key = self.make_key(term, mode, model)
+        now = time.time()
+        try:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO translations (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                        (key, value, now, now),
+                    )
+                    if self._over_limit(conn):
+                        self._evict(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ Translation cache write failed: {str(e)}")
+
+    def _over_limit(self, conn):
+        """Count this insert; only the first call per process (and each eviction) runs COUNT(*)."""
+        with self._lock:
+            if self._entries is None:
+                self._entries = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            else:
+                self._entries += 1  # replacing an existing key over-counts; the next eviction resyncs
+            return self._entries > self.max_entries
+
+    def _evict(self, conn):
+        # LRU eviction down to 90% of the bound, so the next evictions are
+        # max_entries / 10 inserts apart rather than on every insert
+        keep = self.max_entries - self.max_entries // 10
+        count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        if count > keep:
+            conn.execute(
+                """
+                DELETE FROM translations WHERE key IN (
+                    SELECT key FROM translations ORDER BY accessed_at ASC LIMIT ?
+                )
+                """,
+                (count - keep,),
+            )
+        with self._lock:
+            self._entries = min(count, keep)
+
+    async def aget(self, term, mode, model):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, contextvars.copy_context().run, self.get, term, mode, model
+        )
+
+    async def aset(self, term, mode, model, value):
+        if not value:
+            return
+        await asyncio.get_running_loop().run_in_executor(
+            None, contextvars.copy_context().run, self.set, term, mode, model, value
+        )
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM translations")
+        finally:
+            conn.close()
+
+
+_translation_cache = None
+
+
+def get_translation_cache():
+    """Process-wide cache instance, or None when disabled."""
+    global _translation_cache
+    if not TRANSLATION_CACHE_ENABLED:
+        return None
+    if _translation_cache is None:
+        _translation_cache = TranslationCache()
+    return _translation_cache
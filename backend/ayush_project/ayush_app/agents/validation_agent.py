@@ -1,9 +1,13 @@
 # agents/validation_agent.py
 import json
 import os
+import time
 from pathlib import Path
 from dotenv import load_dotenv
-from groq import Groq
+
+from .deadline import Deadline
+from .http_clients import GROQ_TIMEOUT, build_groq_client
+from .resilience import groq_dependency
 
 ENV_PATH = Path(__file__).resolve().parents[4] / ".env"
 if ENV_PATH.exists():
@@ -12,14 +16,61 @@ else:
     load_dotenv()
 
 DEFAULT_MODEL = os.getenv("GROQ_VALIDATION_MODEL", "llama-3.3-70b-versatile")
+# Candidates shown to the LLM (after de-duplicating by code) and description characters per candidate
+VALIDATION_TOP_K = int(os.getenv("VALIDATION_TOP_K", "5"))
+VALIDATION_DESCRIPTION_CHARS = int(os.getenv("VALIDATION_DESCRIPTION_CHARS", "120"))
+CHARS_PER_TOKEN = 4  # rough English average, good enough to compare prompt sizes
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _one_line(text, limit):
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def compact_candidates(candidates, top_k=None):
+    """
+    Prompt lines for the first `top_k` distinct codes, numbered from 1 -
+    "1. CA23 | Cough | <short description>" - and the index into
+    `candidates` of each numbered line.
+    """
+    top_k = VALIDATION_TOP_K if top_k is None else top_k
+    lines, indexes, seen = [], [], set()
+    for i, c in enumerate(candidates):
+        code = c.get("code")
+        if code in seen:
+            continue
+        seen.add(code)
+        line = f"{len(lines) + 1}. {code} | {_one_line(c.get('title'), 80)}"
+        if c.get("description") and VALIDATION_DESCRIPTION_CHARS > 0:
+            line += f" | {_one_line(c['description'], VALIDATION_DESCRIPTION_CHARS)}"
+        lines.append(line)
+        indexes.append(i)
+        if len(lines) >= top_k:
+            break
+    return "\n".join(lines), indexes
+
+
+def skipped_validation(candidates):
+    """Result used when LLM validation is skipped to stay within the latency budget."""
+    return {
+        "best": candidates[0],
+        "confidence": candidates[0].get("score", 0.80),
+        "reason": "LLM validation skipped to meet the latency budget. Using first candidate.",
+        "needs_human_review": True
+    }
 
 
 class ValidationAgent:
     def __init__(self, groq_api_key=None):
         api_key = groq_api_key or os.getenv("GROQ_API_KEY")
-        self.client = Groq(api_key=api_key) if api_key else None
+        self.client = build_groq_client(api_key) if api_key else None
 
-    def run(self, ayush_term, raw_text, candidates):
+    def run(self, ayush_term, raw_text, candidates, deadline=None):
+        deadline = deadline or Deadline()
         # If no candidates, return early
         if not candidates:
             return {
@@ -31,30 +82,39 @@ class ValidationAgent:
         
         # ALWAYS try Groq API validation first (real API call)
         # Even for single deterministic candidates, validate with Groq to ensure accuracy
-        # Build better prompt for LLM validation
-        prompt_text = f"""You are a medical coding expert. Given an AYUSH term "{ayush_term}" and clinical context: "{raw_text[:200]}", 
-evaluate these ICD-11 mapping candidates and return ONLY valid JSON:
-{{
-    "best_index": <0-based index of best match>,
-    "confidence": <0.0-1.0>,
-    "reason": "<brief explanation>"
-}}
-
-Candidates:
-{json.dumps(candidates, indent=2)}
-
-Return ONLY the JSON object, no other text."""
+        # One line per distinct code keeps the prompt (and Groq latency) small
+        listing, indexes = compact_candidates(candidates)
+        prompt_text = f"""You are a medical coding expert. AYUSH term: "{ayush_term}". Clinical context: "{raw_text[:200]}".
+ICD-11 candidates (number. code | title | description):
+{listing}
+Return ONLY JSON: {{"best": <candidate number>, "confidence": <0.0-1.0>, "reason": "<brief explanation>"}}"""
+        stats = {
+            "candidates": len(candidates),
+            "shown": len(indexes),
+            "prompt_chars": len(prompt_text),
+            "prompt_tokens_est": estimate_tokens(prompt_text),
+        }
 
         try:
             if not self.client:
                 raise RuntimeError("Groq client missing - check GROQ_API_KEY in .env")
             
             # ALWAYS make real Groq API call for validation
-            resp = self.client.chat.completions.create(
+            started = time.perf_counter()
+            resp = groq_dependency.call(lambda: self.client.chat.completions.create(
                 model=DEFAULT_MODEL,
                 messages=[{"role": "user", "content": prompt_text}],
                 temperature=0,
-                max_tokens=200
+                max_tokens=200,
+                timeout=deadline.timeout(GROQ_TIMEOUT),
+            ), deadline)
+            stats["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            usage = getattr(resp, "usage", None)
+            if isinstance(getattr(usage, "prompt_tokens", None), int):
+                stats["prompt_tokens"] = usage.prompt_tokens
+            print(
+                f"🧮 Validation prompt for '{ayush_term}': {stats['shown']}/{stats['candidates']} candidates, "
+                f"~{stats['prompt_tokens_est']} tokens, {stats['latency_ms']}ms"
             )
             content = resp.choices[0].message.content.strip()
             # Remove markdown code blocks if present
@@ -70,7 +130,8 @@ Return ONLY the JSON object, no other text."""
                 "best": candidates[0] if candidates else {"code": "UNK"},
                 "confidence": candidates[0].get("score", 0.7) if candidates else 0.5,
                 "reason": f"LLM validation failed: JSON parse error. Using first candidate.",
-                "needs_human_review": True
+                "needs_human_review": True,
+                "prompt_stats": stats,
             }
         except Exception as e:
             # Fallback ONLY if Groq API fails - use first candidate with its score
@@ -80,13 +141,17 @@ Return ONLY the JSON object, no other text."""
                 "best": candidates[0] if candidates else {"code": "UNK"},
                 "confidence": fallback_confidence,
                 "reason": f"Groq API validation failed: {str(e)[:50]}. Using candidate without LLM validation.",
-                "needs_human_review": True  # Always require review if API fails
+                "needs_human_review": True,  # Always require review if API fails
+                "prompt_stats": stats,
             }
 
-        idx = int(js.get("best_index", 0))
-        if idx < 0 or idx >= len(candidates):
-            idx = 0
-        best = candidates[idx]
+        try:
+            number = int(js.get("best", 1))
+        except (TypeError, ValueError):
+            number = 1
+        if number < 1 or number > len(indexes):
+            number = 1
+        best = candidates[indexes[number - 1]]
         # Use candidate's base score if available, otherwise use LLM confidence
         base_score = best.get("score", 0.80)
         llm_confidence = float(js.get("confidence", base_score))
@@ -98,5 +163,6 @@ Return ONLY the JSON object, no other text."""
             "best": best,
             "confidence": conf,
             "reason": js.get("reason", "Validated by LLM"),
-            "needs_human_review": conf < 0.9
+            "needs_human_review": conf < 0.9,
+            "prompt_stats": stats,
         }
@@ -0,0 +1,184 @@
+import atexit
+import base64
+import hashlib
+import json
+import os
+import queue
+import threading
+import zlib
+
+from django.db import close_old_connections, connection, transaction
+
+from .models import AuditLog
+
+# Write audit rows from a background thread after the request's transaction commits
+AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "1") == "1"
+# Also keep the full pipeline state, zlib-compressed, for forensic replay (off: hashes and references only)
+AUDIT_STORE_STATE = os.getenv("AUDIT_STORE_STATE", "0") == "1"
+AUDIT_COMPRESS_LEVEL = int(os.getenv("AUDIT_COMPRESS_LEVEL", "6"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))  # rows per bulk_create
+AUDIT_FLUSH_TIMEOUT = float(os.getenv("AUDIT_FLUSH_TIMEOUT", "5"))  # seconds to drain the queue at exit
+# Default age (days) after which `manage.py archive_audit_logs` moves rows out
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "90"))
+
+AUDIT_FORMAT_VERSION = 1
+
+
+def content_hash(value):
+    """sha256 of a string, or of the canonical JSON encoding of anything else."""
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def compress_state(state):
+    raw = json.dumps(state, separators=(",", ":"), default=str).encode()
+    return base64.b64encode(zlib.compress(raw, AUDIT_COMPRESS_LEVEL)).decode("ascii")
+
+
+def decode_audit_state(details):
+    """The full pipeline state kept with AUDIT_STORE_STATE, or None."""
+    if details.get("pipeline_state_zlib"):
+        return json.loads(zlib.decompress(base64.b64decode(details["pipeline_state_zlib"])))
+    return details.get("pipeline_state")  # rows written before the compact format
+
+
+def _term_summary(term):
+    best = term.get("best") or {}
+    candidates = term.get("candidates") or []
+    summary = {
+        "ayush_term": term.get("ayush_term"),
+        "code": best.get("code"),
+        "confidence": term.get("confidence"),
+        "needs_human_review": term.get("needs_human_review"),
+        "candidate_codes": [c.get("code") for c in candidates],
+        "candidates_sha256": content_hash(candidates),
+    }
+    if term.get("route"):
+        summary["route"] = term["route"]
+    if term.get("fhir"):
+        summary["fhir_sha256"] = content_hash(term["fhir"])
+    if term.get("pushed") is not None:
+        summary["pushed"] = term["pushed"]
+    return summary
+
+
+def _step_summary(entry):
+    """Provenance entry without its payload - the payload lives in the Diagnosis/FHIR it produced."""
+    step = {"step": entry.get("step")}
+    if "term_index" in entry:
+        step["term_index"] = entry["term_index"]
+    if entry.get("error"):
+        step["error"] = entry["error"]
+    return step
+
+
+def compact_audit_details(patient_id, diagnoses, raw_text, result):
+    """
+    Audit record for one pipeline run: references to the stored rows,
+    content hashes of the input text and of each term's candidates and
+    FHIR resource, and the provenance trail without its payloads. A few
+    hundred bytes instead of the full state.
+    """
+    terms = result.get("term_results") or [result]
+    details = {
+        "v": AUDIT_FORMAT_VERSION,
+        "patient_id": patient_id,
+        "diagnosis_id": diagnoses[0].id,
+        "diagnosis_ids": [d.id for d in diagnoses],
+        "raw_text_sha256": content_hash(raw_text or ""),
+        "terms": [_term_summary(term) for term in terms],
+        "steps": [_step_summary(entry) for entry in result.get("provenance") or []],
+    }
+    if result.get("skipped_steps"):
+        details["skipped_steps"] = result["skipped_steps"]
+    if AUDIT_STORE_STATE:
+        details["pipeline_state_zlib"] = compress_state(result)
+    return details
+
+
+def _bulk_write(rows):
+    AuditLog.objects.bulk_create(rows, batch_size=AUDIT_BATCH_SIZE)
+
+
+class AuditWriter:
+    """
+    Daemon thread that writes queued AuditLog rows with bulk_create, so
+    audit writes never sit on the request path. Rows are lost only if the
+    process dies before the queue drains (see AUDIT_FLUSH_TIMEOUT).
+    """
+
+    _STOP = object()
+
+    def __init__(self, write=_bulk_write, batch_size=AUDIT_BATCH_SIZE):
+        self._write = write
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        for row in rows:
+            self._queue.put(row)
+
+    def flush(self):
+        """Block until every submitted row has been written (tests, shutdown)."""
+        self._queue.join()
+
+    def close(self, timeout=AUDIT_FLUSH_TIMEOUT):
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = any(row is self._STOP for row in batch)
+                rows = [row for row in batch if row is not self._STOP]
+                if rows:
+                    close_old_connections()
+                    try:
+                        self._write(rows)
+                    except Exception as e:
+                        print(f"⚠️ Audit log write failed for {len(rows)} row(s) (non-critical): {str(e)}")
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """Per-process audit writer, started on first use."""
+    global _writer, _writer_pid
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = AuditWriter()
+            _writer_pid = os.getpid()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def record_audit(rows):
+    """
+    Store AuditLog rows once the surrounding transaction commits (right
+    away outside one). Audit failures never fail the request.
+    """
+    if not AUDIT_ASYNC:
+        try:
+            _bulk_write(rows)
+        except Exception as e:
+            print(f"Audit log error (non-critical): {str(e)}")
+        return
+    transaction.on_commit(lambda: get_audit_writer().submit(rows))
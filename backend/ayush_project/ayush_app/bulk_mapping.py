@@ -0,0 +1,141 @@
+import csv
+import json
+import os
+from itertools import islice
+from pathlib import Path
+
+# Defaults for `manage.py map_notes`
+BULK_CHUNK_SIZE = int(os.getenv("BULK_MAPPING_CHUNK_SIZE", "100"))
+BULK_PROCESSES = int(os.getenv("BULK_MAPPING_PROCESSES", str(os.cpu_count() or 1)))
+
+
+def detect_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if suffix == ".csv":
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path}; use --format csv|jsonl")
+
+
+def iter_notes(path, fmt=None, text_field="raw_text", id_field="id", patient_field="patient_ref"):
+    """
+    Stream (record_id, raw_text, patient_ref) tuples from a CSV or JSONL
+    file one row at a time, so memory stays flat for any input size.
+    Rows without an id are numbered by their position in the file.
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for position, row in enumerate(rows):
+            record_id = row.get(id_field) or position
+            yield record_id, (row.get(text_field) or "").strip(), row.get(patient_field) or f"Patient/{record_id}"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def summarize_state(record_id, state):
+    """Compact output row: one mapping per extracted term, no provenance."""
+    terms = state.get("term_results") or [state]
+    return {
+        "id": record_id,
+        "results": [
+            {
+                "ayush_term": term.get("ayush_term"),
+                "start": term.get("start"),
+                "end": term.get("end"),
+                "code": (term.get("best") or {}).get("code") or "UNK",
+                "title": (term.get("best") or {}).get("title"),
+                "confidence": term.get("confidence", 0.0),
+                "needs_human_review": term.get("needs_human_review", True),
+                "mapping_source": term.get("mapping_source"),
+                "route": term.get("route"),
+            }
+            for term in terms
+        ],
+    }
+
+
+def map_chunk(records, concurrency=None):
+    """
+    Map one chunk of (record_id, raw_text, patient_ref) records and return
+    output rows in the same order. Runs inside a pool worker process: the
+    chunk is submitted to that process's pipeline runtime, where batch.run_batch
+    maps the notes concurrently and dedupes repeated terms.
+    """
+    from .agents.langgraph_pipeline import PIPELINE_BATCH_TIMEOUT
+    from .agents.langgraph_pipeline.batch import run_batch
+    from .agents.langgraph_pipeline.runtime import get_runtime
+
+    rows = [None] * len(records)
+    runnable = []
+    for index, (record_id, raw_text, patient_ref) in enumerate(records):
+        if raw_text:
+            runnable.append((index, record_id, raw_text, patient_ref))
+        else:
+            rows[index] = {"id": record_id, "error": "empty text"}
+
+    if runnable:
+        try:
+            states = get_runtime().submit(
+                run_batch(
+                    [{"raw_text": raw_text, "patient_ref": patient_ref} for _, _, raw_text, patient_ref in runnable],
+                    concurrency,
+                ),
+                timeout=PIPELINE_BATCH_TIMEOUT,
+            )
+            for (index, record_id, _, _), state in zip(runnable, states):
+                rows[index] = summarize_state(record_id, state)
+        except Exception as e:
+            print(f"Bulk mapping chunk failed: {str(e)}")
+            for index, record_id, _, _ in runnable:
+                rows[index] = {"id": record_id, "error": str(e)}
+    return rows
+
+
+def init_worker():
+    """ProcessPoolExecutor initializer: make sure Django is set up in spawned workers."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+class Checkpoint:
+    """
+    Progress of a map_notes run: how many input records have been written
+    and the output size at that point. Output rows are written in input
+    order, so resuming means skipping `records` inputs and truncating the
+    output back to `output_bytes` (dropping anything written after the last
+    checkpoint). Saved atomically with a rename.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = 0
+        self.output_bytes = 0
+
+    def load(self):
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            self.records = data["records"]
+            self.output_bytes = data["output_bytes"]
+        return self
+
+    def save(self, records, output_bytes):
+        self.records = records
+        self.output_bytes = output_bytes
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"records": records, "output_bytes": output_bytes}))
+        os.replace(tmp, self.path)
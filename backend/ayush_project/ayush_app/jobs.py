@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import PipelineJob
+from .services import get_pipeline, save_pipeline_result
+
+# Queued jobs are drained by dedicated `manage.py run_pipeline_workers`
+# processes. Set above 0 to (also) run this many worker threads inside each
+# web process, started by the WSGI/ASGI entry points - opt-in, as they run
+# whole pipelines next to request handling.
+PIPELINE_JOB_WORKERS = int(os.getenv("PIPELINE_JOB_WORKERS", "0"))
+PIPELINE_JOB_POLL_INTERVAL = float(os.getenv("PIPELINE_JOB_POLL_INTERVAL", "2"))  # seconds
+# Jobs left running this long (seconds) by a dead worker are requeued by the
+# pools' periodic sweep, which also runs as each pool starts; 0 = never
+PIPELINE_JOB_STALE_AFTER = float(os.getenv("PIPELINE_JOB_STALE_AFTER", "900"))
+
+
+def enqueue_job(user, patient, raw_text, auto_push=False, budget=None, fields=None):
+    job = PipelineJob.objects.create(
+        user=user,
+        patient=patient,
+        raw_text=raw_text,
+        auto_push=auto_push,
+        budget=budget,
+        fields=fields,
+    )
+    pool = running_worker_pool()
+    if pool is not None:
+        # Wake an idle worker once the job row is visible to other connections
+        transaction.on_commit(pool.notify)
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to running and return it.
+    SKIP LOCKED lets concurrent workers pass over rows another worker holds;
+    the conditional update keeps the claim safe on databases that ignore
+    row locks (SQLite).
+    """
+    while True:
+        with transaction.atomic():
+            job = (
+                PipelineJob.objects.select_for_update(skip_locked=True)
+                .filter(status=PipelineJob.STATUS_QUEUED)
+                .order_by("created_at", "id")
+                .first()
+            )
+            if job is None:
+                return None
+            claimed = PipelineJob.objects.filter(pk=job.pk, status=PipelineJob.STATUS_QUEUED).update(
+                status=PipelineJob.STATUS_RUNNING,
+                started_at=timezone.now(),
+            )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job):
+    try:
+        patient = job.patient
+        result = get_pipeline().run(job.raw_text, f"Patient/{patient.ayush_id}", job.auto_push, budget=job.budget)
+        if not result:
+            raise RuntimeError("Pipeline returned empty result.")
+        diagnoses = save_pipeline_result(patient, patient.id, job.raw_text, result)
+        job.status = PipelineJob.STATUS_SUCCEEDED
+        job.result = result
+        job.diagnosis = diagnoses[0]
+    except Exception as e:
+        print(f"Pipeline job {job.pk} failed: {str(e)}")
+        job.status = PipelineJob.STATUS_FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "diagnosis", "error", "finished_at"])
+    return job
+
+
+def process_next_job():
+    """Claim and run one job. Returns the finished job, or None if the queue is empty."""
+    job = claim_next_job()
+    if job is None:
+        return None
+    return run_job(job)
+
+
+def requeue_stale_jobs(older_than_seconds):
+    """Return jobs left running by a dead worker to the queue."""
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    return PipelineJob.objects.filter(
+        status=PipelineJob.STATUS_RUNNING, started_at__lt=cutoff
+    ).update(status=PipelineJob.STATUS_QUEUED, started_at=None)
+
+
+class PipelineWorkerPool:
+    """
+    Threads that drain the PipelineJob table. Idle workers poll every
+    PIPELINE_JOB_POLL_INTERVAL seconds and are woken early by notify().
+    Every `stale_after / 2` seconds (and on start) one worker returns jobs
+    stuck in running for longer than `stale_after` to the queue.
+    """
+
+    def __init__(self, workers, poll_interval=PIPELINE_JOB_POLL_INTERVAL, stale_after=PIPELINE_JOB_STALE_AFTER):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._next_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"pipeline-job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _sweep_stale(self):
+        if self.stale_after <= 0:
+            return
+        with self._sweep_lock:
+            if time.monotonic() < self._next_sweep:
+                return
+            self._next_sweep = time.monotonic() + self.stale_after / 2
+        count = requeue_stale_jobs(self.stale_after)
+        if count:
+            print(f"🔁 Requeued {count} stale pipeline job(s)")
+
+    def _work(self):
+        try:
+            while not self._stop.is_set():
+                close_old_connections()
+                try:
+                    self._sweep_stale()
+                    job = process_next_job()
+                except Exception as e:
+                    print(f"Pipeline worker error: {str(e)}")
+                    job = None
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            connection.close()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def running_worker_pool():
+    """This process's worker pool, or None if it was not started here."""
+    pool = _pool
+    return pool if pool is not None and _pool_pid == os.getpid() else None
+
+
+def start_worker_pool():
+    """
+    Start this process's worker pool when PIPELINE_JOB_WORKERS > 0 (else
+    None). Only the WSGI/ASGI entry points call it, at startup.
+    """
+    global _pool, _pool_pid
+    if PIPELINE_JOB_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = PipelineWorkerPool(PIPELINE_JOB_WORKERS)
+            _pool.start()
+            _pool_pid = os.getpid()
+        return _pool
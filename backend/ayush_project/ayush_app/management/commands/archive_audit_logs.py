@@ -0,0 +1,63 @@
+import gzip
+import json
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from ayush_app.audit import AUDIT_RETENTION_DAYS
+from ayush_app.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Move audit log rows older than the retention period into a gzipped "
+        "JSON Lines archive, deleting them in bulk as each batch is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Archive file to append to (.jsonl.gz)")
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=AUDIT_RETENTION_DAYS,
+            help=f"Archive rows older than this many days (default: {AUDIT_RETENTION_DAYS})",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows read and deleted per batch")
+        parser.add_argument("--purge", action="store_true", help="Delete old rows without writing an archive")
+
+    def handle(self, *args, **options):
+        if not options["output"] and not options["purge"]:
+            raise CommandError("Pass --output FILE to archive old rows, or --purge to delete them.")
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive.")
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        old = AuditLog.objects.filter(timestamp__lt=cutoff).order_by("id")
+        archive = gzip.open(options["output"], "at", encoding="utf-8") if options["output"] else None
+        moved = 0
+        try:
+            while True:
+                rows = list(old.values("id", "action", "details", "timestamp")[:options["batch_size"]])
+                if not rows:
+                    break
+                if archive:
+                    for row in rows:
+                        archive.write(json.dumps({**row, "timestamp": row["timestamp"].isoformat()}) + "\n")
+                    # Make the batch durable before its rows leave the table: flush
+                    # the gzip member, then the file object, then fsync the file
+                    archive.flush()
+                    archive.buffer.fileobj.flush()
+                    os.fsync(archive.buffer.fileobj.fileno())
+                with transaction.atomic():
+                    AuditLog.objects.filter(id__in=[row["id"] for row in rows]).delete()
+                moved += len(rows)
+        finally:
+            if archive:
+                archive.close()
+
+        verb = "Archived" if archive else "Purged"
+        target = f" to {options['output']}" if archive else ""
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} audit log rows older than {cutoff:%Y-%m-%d}{target}"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ayush_app.agents.icd_index import DEFAULT_INDEX_PATH, build_index
+
+
+class Command(BaseCommand):
+    help = "Load an ICD-11 MMS tabular export into the local SQLite FTS5 search index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Path to the MMS tabulation export (.txt/.tsv or .csv)")
+        parser.add_argument(
+            "--output",
+            default=str(DEFAULT_INDEX_PATH),
+            help=f"Index file to write (default: {DEFAULT_INDEX_PATH})",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            count = build_index(options["source"], options["output"])
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} ICD-11 entities into {options['output']}"))
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ayush_app.agents.langgraph_pipeline.batch import BATCH_CONCURRENCY
+from ayush_app.bulk_mapping import (
+    BULK_CHUNK_SIZE,
+    BULK_PROCESSES,
+    Checkpoint,
+    chunked,
+    detect_format,
+    init_worker,
+    iter_notes,
+    map_chunk,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Map historical notes from a CSV/JSONL file to ICD-11 without the REST API. "
+        "Results are appended to a JSONL file in input order and the run resumes from its checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="CSV or JSONL file of notes")
+        parser.add_argument("--output", required=True, help="JSONL file to append results to")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from the file extension)")
+        parser.add_argument("--text-field", default="raw_text", help="Column/key holding the note text")
+        parser.add_argument("--id-field", default="id", help="Column/key holding the record id")
+        parser.add_argument("--patient-field", default="patient_ref", help="Column/key holding the FHIR patient reference")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=BULK_PROCESSES,
+            help=f"Worker processes (default: {BULK_PROCESSES}); 0 runs in this process",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=BATCH_CONCURRENCY,
+            help=f"Concurrent pipeline steps inside each process (default: {BATCH_CONCURRENCY})",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=BULK_CHUNK_SIZE,
+            help=f"Notes per unit of work and per checkpoint (default: {BULK_CHUNK_SIZE})",
+        )
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+        parser.add_argument(
+            "--progress-interval",
+            type=float,
+            default=10,
+            help="Seconds between throughput reports (default: 10)",
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options["input"]):
+            raise CommandError(f"Input file not found: {options['input']}")
+        checkpoint = Checkpoint(options["checkpoint"] or options["output"] + ".checkpoint")
+        if not options["restart"]:
+            checkpoint.load()
+
+        try:
+            fmt = options["format"] or detect_format(options["input"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        notes = iter_notes(
+            options["input"],
+            fmt,
+            options["text_field"],
+            options["id_field"],
+            options["patient_field"],
+        )
+        chunks = chunked(islice(notes, checkpoint.records, None), options["chunk_size"])
+        if checkpoint.records:
+            self.stdout.write(f"Resuming after {checkpoint.records} already mapped note(s)")
+
+        with open(options["output"], "a+b") as out:
+            out.seek(0, os.SEEK_END)
+            if out.tell() < checkpoint.output_bytes:
+                raise CommandError(
+                    f"{options['output']} is shorter than its checkpoint; pass --restart to start over"
+                )
+            # Drop rows written after the last checkpoint (e.g. by a killed run)
+            out.truncate(checkpoint.output_bytes)
+            out.seek(checkpoint.output_bytes)
+            self._run(chunks, out, checkpoint, options)
+
+    def _results(self, chunks, options):
+        """Yield mapped chunks in input order."""
+        concurrency = options["concurrency"]
+        if options["processes"] <= 0:
+            for chunk in chunks:
+                yield map_chunk(chunk, concurrency)
+            return
+
+        executor = ProcessPoolExecutor(max_workers=options["processes"], initializer=init_worker)
+        pending = deque()
+        try:
+            for chunk in chunks:
+                pending.append(executor.submit(map_chunk, chunk, concurrency))
+                # Keep every worker busy without reading the whole input ahead
+                if len(pending) >= options["processes"] * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, chunks, out, checkpoint, options):
+        started = time.monotonic()
+        last_report = started
+        done = errors = 0
+
+        for rows in self._results(chunks, options):
+            for row in rows:
+                out.write((json.dumps(row, default=str) + "\n").encode("utf-8"))
+            out.flush()
+            os.fsync(out.fileno())
+            done += len(rows)
+            errors += sum(1 for row in rows if "error" in row)
+            checkpoint.save(checkpoint.records + len(rows), out.tell())
+
+            now = time.monotonic()
+            if now - last_report >= options["progress_interval"]:
+                last_report = now
+                self.stdout.write(
+                    f"📈 {done} notes mapped ({checkpoint.records} total), "
+                    f"{done / (now - started):.1f} notes/s, {errors} error(s)"
+                )
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Mapped {done} note(s) in {elapsed:.1f}s ({done / elapsed:.1f} notes/s, {errors} error(s)); "
+            f"{checkpoint.records} total in {options['output']}"
+        ))
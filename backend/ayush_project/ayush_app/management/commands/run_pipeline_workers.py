@@ -0,0 +1,63 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from ayush_app.jobs import (
+    PIPELINE_JOB_POLL_INTERVAL,
+    PIPELINE_JOB_STALE_AFTER,
+    PipelineWorkerPool,
+    requeue_stale_jobs,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a pool of pipeline workers that drain queued /run_pipeline/?mode=async jobs. "
+        "Web processes do not run jobs unless PIPELINE_JOB_WORKERS > 0, so run at least one of these."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Number of worker threads (default: 2)")
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=PIPELINE_JOB_POLL_INTERVAL,
+            help="Seconds an idle worker waits before polling the queue again",
+        )
+        parser.add_argument(
+            "--requeue-stale",
+            type=int,
+            default=None,
+            metavar="SECONDS",
+            help="Requeue jobs stuck in 'running' for longer than SECONDS before starting",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=float,
+            default=PIPELINE_JOB_STALE_AFTER,
+            metavar="SECONDS",
+            help="While running, periodically requeue jobs stuck in 'running' this long (0 = never)",
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_stale"] is not None:
+            count = requeue_stale_jobs(options["requeue_stale"])
+            self.stdout.write(f"Requeued {count} stale job(s)")
+
+        pool = PipelineWorkerPool(options["workers"], options["poll_interval"], options["stale_after"])
+        stopping = []
+
+        def stop(signum, frame):
+            stopping.append(signum)
+            pool.notify()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        pool.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {options['workers']} pipeline worker(s)"))
+        while not stopping:
+            time.sleep(1)
+        self.stdout.write("Stopping pipeline workers...")
+        pool.stop()
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ayush_app', '0007_pipelinejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diagnosis',
+            index=models.Index(fields=['patient', 'created_at'], name='ayush_app_d_patient_b1f12a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['user', 'id'], name='ayush_app_p_user_id_601c29_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ayush_app', '0008_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='ayush_app_a_timesta_4de562_idx'),
+        ),
+    ]
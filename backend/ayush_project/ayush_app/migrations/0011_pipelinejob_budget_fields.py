@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-17 01:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ayush_app', '0010_confirmed_mappings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pipelinejob',
+            name='budget',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pipelinejob',
+            name='fields',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -7,6 +7,9 @@ class Patient(models.Model):
     ayush_id = models.CharField(max_length=50, unique=True)
     age = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [models.Index(fields=["user", "id"])]
+
     def __str__(self):
         return f"{self.name} ({self.ayush_id})"
 
@@ -19,14 +22,77 @@ class Diagnosis(models.Model):
     confidence_score = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
     raw_text = models.TextField()
+    # Pipeline route that produced the mapping ("" for manual entries)
+    route = models.CharField(max_length=20, blank=True, default="")
+    # Set when a clinician picks/confirms the ICD code (see services.record_review)
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["patient", "created_at"])]
 
     def __str__(self):
         return f"{self.ayush_term} [{self.icd_code}] for {self.patient}"
 
+class ConfirmedMapping(models.Model):
+    """
+    Clinician-reviewed diagnoses per (normalized term, ICD code), kept up to
+    date on review so the pipeline's confirmed route is one indexed lookup.
+    """
+    term = models.CharField(max_length=255)
+    icd_code = models.CharField(max_length=20)
+    confirmations = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["term", "icd_code"], name="unique_confirmed_mapping")]
+
+    def __str__(self):
+        return f"{self.term} → {self.icd_code} ({self.confirmations})"
+
+
 class AuditLog(models.Model):
     action = models.CharField(max_length=100)
     details = models.JSONField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["timestamp"])]
+
     def __str__(self):
         return f"{self.action} at {self.timestamp}"
+
+
+
+class PipelineJob(models.Model):
+    """Queued /run_pipeline/ submission drained by the pipeline worker pool."""
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
+    raw_text = models.TextField()
+    auto_push = models.BooleanField(default=False)
+    budget = models.FloatField(null=True, blank=True)  # latency budget (seconds) for the run; null = none
+    fields = models.JSONField(null=True, blank=True)  # ?fields= selection applied to `result` when polled
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    diagnosis = models.ForeignKey(Diagnosis, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"])]
+
+    def __str__(self):
+        return f"Pipeline job {self.pk} [{self.status}] for {self.patient}"
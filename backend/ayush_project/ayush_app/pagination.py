@@ -0,0 +1,28 @@
+# pagination.py
+import os
+
+from rest_framework.pagination import CursorPagination
+
+# Default and maximum page size for list endpoints (?page_size= overrides the default)
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "200"))
+
+
+class ListCursorPagination(CursorPagination):
+    """
+    Keyset pagination: each page is one index range scan from the cursor,
+    so page N costs the same as page 1 however many rows the user owns.
+    """
+
+    page_size = LIST_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = LIST_MAX_PAGE_SIZE
+
+
+class DiagnosisCursorPagination(ListCursorPagination):
+    # Newest first; id breaks ties between diagnoses saved in the same instant
+    ordering = ("-created_at", "-id")
+
+
+class PatientCursorPagination(ListCursorPagination):
+    ordering = ("-id",)
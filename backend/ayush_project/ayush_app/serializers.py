@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import Patient, Diagnosis, AuditLog
+from .agents.langgraph_pipeline.payloads import select_fields
+from .models import Patient, Diagnosis, AuditLog, PipelineJob
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -38,9 +39,29 @@ class DiagnosisSerializer(serializers.ModelSerializer):
     class Meta:
         model = Diagnosis
         fields = '__all__'
+        read_only_fields = ("route", "reviewed_by", "reviewed_at")
 
 
 class AuditLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = AuditLog
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class PipelineJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.IntegerField(source="id", read_only=True)
+    diagnosis_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = PipelineJob
+        fields = [
+            "job_id", "status", "patient", "diagnosis_id", "result", "error",
+            "created_at", "started_at", "finished_at",
+        ]
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data["result"] is not None:
+            data["result"] = select_fields(data["result"], instance.fields)
+        return data
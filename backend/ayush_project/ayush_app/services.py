@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .audit import compact_audit_details, record_audit
+from .models import ConfirmedMapping, Diagnosis, AuditLog
+
+# Lazy import to avoid errors during migrations
+_pipeline = None
+
+def get_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        from .agents.langgraph_pipeline import LangGraphAYUSHPipeline
+        _pipeline = LangGraphAYUSHPipeline()
+    return _pipeline
+
+
+def _diagnoses_from_result(patient, raw_text, result):
+    """One Diagnosis per extracted term (primary term first)."""
+    terms = result.get("term_results") or [result]
+    diagnoses = []
+    for term in terms:
+        best = term.get("best") or {}
+        diagnoses.append(Diagnosis(
+            patient=patient,
+            ayush_term=term.get("ayush_term", "Unknown"),
+            icd_code=best.get("code") or "UNK",
+            confidence_score=term.get("confidence", 0.0),
+            raw_text=raw_text,
+            route=term.get("route") or "",
+        ))
+    return diagnoses
+
+
+def save_pipeline_result(patient, patient_id, raw_text, result):
+    """
+    Store the best mapping of every extracted term as a Diagnosis and write
+    a compact audit log entry (written after commit, off the request
+    path). Shared by the synchronous view and the job workers. Returns the
+    diagnoses, primary term first.
+    """
+    diagnoses = _diagnoses_from_result(patient, raw_text, result)
+    for diag in diagnoses:
+        diag.save()
+
+    try:
+        record_audit([AuditLog(
+            action="run_pipeline",
+            details=compact_audit_details(patient_id, diagnoses, raw_text, result),
+        )])
+    except Exception as e:
+        # Don't fail if audit log fails
+        print(f"Audit log error (non-critical): {str(e)}")
+
+    return diagnoses
+
+
+def save_batch_results(entries):
+    """
+    Bulk variant of save_pipeline_result for (patient, raw_text, result)
+    entries: all Diagnosis rows are written with bulk_create in one
+    transaction, and the AuditLog rows are bulk-written once it commits.
+    Returns one list of diagnoses per entry, in order.
+    """
+    per_entry = [_diagnoses_from_result(patient, raw_text, result) for patient, raw_text, result in entries]
+    with transaction.atomic():
+        Diagnosis.objects.bulk_create([diag for diagnoses in per_entry for diag in diagnoses])
+        record_audit([
+            AuditLog(
+                action="run_pipeline_batch",
+                details=compact_audit_details(patient.id, diagnoses, raw_text, result),
+            )
+            for (patient, raw_text, result), diagnoses in zip(entries, per_entry)
+        ])
+    return per_entry
+
+
+def _counts_as_confirmation(term, code, route, reviewed):
+    """(term key, code) a reviewed diagnosis adds to ConfirmedMapping, or None."""
+    from .agents.langgraph_pipeline.routing import ROUTE_CONFIRMED, confirmed_term_key
+
+    # A reviewed result of the confirmed route itself would let the route confirm its own output
+    if not reviewed or route == ROUTE_CONFIRMED:
+        return None
+    key = confirmed_term_key(term)
+    return (key, code) if key and code else None
+
+
+def confirmation_of(diagnosis):
+    return _counts_as_confirmation(
+        diagnosis.ayush_term, diagnosis.icd_code, diagnosis.route, diagnosis.reviewed_at is not None
+    )
+
+
+def _adjust_confirmation(confirmation, delta):
+    if confirmation is None:
+        return
+    term, code = confirmation
+    row, _ = ConfirmedMapping.objects.get_or_create(term=term, icd_code=code)
+    ConfirmedMapping.objects.filter(pk=row.pk).update(confirmations=F("confirmations") + delta)
+    if delta < 0:
+        ConfirmedMapping.objects.filter(pk=row.pk, confirmations__lte=0).delete()
+
+
+def record_review(diagnosis, user, previous=None):
+    """
+    Mark a diagnosis as reviewed by a clinician and move its confirmation
+    in ConfirmedMapping. `previous` is confirmation_of() the row before the
+    update, so a changed code or term moves its count instead of adding one.
+    """
+    with transaction.atomic():
+        diagnosis.reviewed_by = user
+        diagnosis.reviewed_at = timezone.now()
+        diagnosis.save(update_fields=["reviewed_by", "reviewed_at"])
+        current = confirmation_of(diagnosis)
+        if current != previous:
+            _adjust_confirmation(previous, -1)
+            _adjust_confirmation(current, 1)
+
+
+def forget_review(diagnosis):
+    """Drop a deleted diagnosis's confirmation."""
+    _adjust_confirmation(confirmation_of(diagnosis), -1)
@@ -1,3 +1,1436 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .agents.extraction_agent import ExtractionAgent
+import httpx
+
+from . import audit, jobs, views
+from .agents import abdm_client, http_clients, icd_client, registry
+from .agents.icd_client import ICD11Client
+from .agents.icd_index import build_index
+from .agents.deadline import Deadline
+from .agents.llm_batcher import MicroBatcher
+from .agents import metrics, resilience, token_broker
+from .agents.resilience import CircuitOpenError, Dependency, RetryBudget
+from .agents.langgraph_pipeline import LangGraphAYUSHPipeline
+from .agents.langgraph_pipeline import routing
+from .agents.langgraph_pipeline.batch import run_batch
+from .agents.langgraph_pipeline.nodes import choose_route
+from .agents.langgraph_pipeline.runtime import PipelineRuntime
+from .agents.validation_agent import ValidationAgent, compact_candidates
+from .models import AuditLog, ConfirmedMapping, Diagnosis, Patient, PipelineJob
+from .agents import mapping_agent
+from .agents.translation_cache import TranslationCache
+from .agents.term_scanner import TermScanner
+from .agents.tools import build_mapping_index, deterministic_lookup, find_term_in_text
+
+
+class DeterministicLookupTests(SimpleTestCase):
+    def test_seed_lookup_shape(self):
+        det = deterministic_lookup("Vataja Jwara")
+        self.assertIsNotNone(det)
+        self.assertEqual(set(det), {"primary", "matches", "needs_review", "review_reason"})
+        self.assertEqual(det["primary"]["match_type"], "exact")
+
+    def test_priority_code_wins(self):
+        det = deterministic_lookup("visarpa")
+        self.assertEqual(det["primary"]["icd_code"], "1C13")
+
+    def test_results_are_copies(self):
+        det = deterministic_lookup("Jwara")
+        det["primary"]["icd_code"] = "XXXX"
+        self.assertNotEqual(deterministic_lookup("Jwara")["primary"]["icd_code"], "XXXX")
+
+    def test_synthetic_100k_index(self):
+        rows = [
+            {"ayush_term": f"Term{i} (Alias{i % 5000})", "icd_code": f"C{i}", "icd_title": "Title"}
+            for i in range(100_000)
+        ]
+        index = build_mapping_index(rows)
+        start = time.perf_counter()
+        for i in range(0, 100_000, 10):
+            self.assertEqual(deterministic_lookup(f"term{i}", index=index)["primary"]["icd_code"], f"C{i}")
+        self.assertLess(time.perf_counter() - start, 2.0)
+        alias = deterministic_lookup("alias7", index=index)
+        self.assertEqual(len(alias["matches"]), 20)
+        self.assertTrue(alias["needs_review"])
+
+
+class TermScannerTests(SimpleTestCase):
+    def test_longest_non_overlapping_hits_with_spans(self):
+        scanner = TermScanner({"jwara": "Jwara", "vataja jwara": "Vataja Jwara", "kasa": "Kasa"})
+        text = "Pt has Vataja Jwara, Kasa; no vikasa."
+        hits = scanner.best_matches(text)
+        self.assertEqual([h["term"] for h in hits], ["Vataja Jwara", "Kasa"])
+        self.assertEqual(text[hits[0]["start"]:hits[0]["end"]], "Vataja Jwara")
+        self.assertEqual(len(scanner.scan(text)), 3)
+
+    def test_find_term_in_text_prefers_longest(self):
+        self.assertEqual(find_term_in_text("Complains of Vataja Jwara"), "Vataja Jwara")
+        self.assertIsNone(find_term_in_text("nothing relevant here"))
+
+    def test_extraction_scan_first_skips_groq(self):
+        agent = ExtractionAgent(scan_first=True)
+        agent.client = None
+        self.assertEqual(agent.run("Clinical note: Kasa since a week"), "Kasa")
+
+
+ICD_SAMPLE = Path(__file__).resolve().parent / "data" / "icd11_mms_sample.tsv"
+
+
+class OfflineICDIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index_path = Path(self.tmp.name) / "icd.sqlite3"
+        self.count = build_index(ICD_SAMPLE, self.index_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_ingest_skips_rows_without_code(self):
+        self.assertEqual(self.count, 10)
+
+    def test_offline_search_matches_live_shape(self):
+        client = ICD11Client(mode="offline", index_path=self.index_path)
+        results = client.search("cough")
+        self.assertEqual(results[0], {
+            "code": "MD12",
+            "title": "Cough",
+            "description": "Sudden expulsion of air from the lungs.",
+        })
+        self.assertEqual(client.search("visarpa")[0]["code"], "1C13")
+        self.assertEqual(client.search("nonexistentterm"), [])
+
+    def test_missing_index_returns_empty(self):
+        client = ICD11Client(mode="offline", index_path=Path(self.tmp.name) / "missing.sqlite3")
+        self.assertEqual(client.search("fever"), [])
+
+    def test_failed_build_leaves_no_temp_file(self):
+        target = Path(self.tmp.name) / "rebuilt.sqlite3"
+        with self.assertRaises(FileNotFoundError):
+            build_index(Path(self.tmp.name) / "missing.tsv", target)
+        self.assertEqual(sorted(p.name for p in Path(self.tmp.name).iterdir()), ["icd.sqlite3"])
+
+    def test_async_offline_search_runs_off_the_loop(self):
+        client = ICD11Client(mode="offline", index_path=self.index_path)
+        search_threads = []
+
+        def search(query):
+            search_threads.append(threading.current_thread())
+            return []
+
+        with mock.patch.object(client, "_search_offline", search):
+            self.assertEqual(asyncio.run(client.asearch("cough")), [])
+        self.assertIsNot(search_threads[0], threading.main_thread())
+
+
+def _groq_reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class MultiTermExtractionTests(SimpleTestCase):
+    def test_json_terms_get_spans_and_are_deduplicated(self):
+        agent = ExtractionAgent(scan_first=False)
+        agent.client = mock.Mock()
+        agent.client.chat.completions.create.return_value = _groq_reply(
+            '```json\n["Kasa", "Vataja Jwara", "kasa", "Amavata"]\n```'
+        )
+        terms = agent.run_many("Kasa for a week with vataja jwara at night")
+        self.assertEqual(terms, [
+            {"term": "Kasa", "start": 0, "end": 4},
+            {"term": "Vataja Jwara", "start": 21, "end": 33},
+            {"term": "Amavata", "start": None, "end": None},
+        ])
+
+    def test_falls_back_to_scanner_without_groq(self):
+        agent = ExtractionAgent(scan_first=False)
+        agent.client = None
+        terms = agent.run_many("Vataja Jwara since monday, now Kasa too")
+        self.assertEqual([(t["term"], t["start"]) for t in terms], [("Vataja Jwara", 0), ("Kasa", 31)])
+
+
+class TranslationCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = TranslationCache(Path(self.tmp.name) / "cache.sqlite3", ttl=60, max_entries=2, touch_interval=0)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_normalized_key_and_counters(self):
+        self.cache.set("Vataja  Jwara", "simple", "m", "fever")
+        self.assertEqual(self.cache.get(" vataja jwara", "simple", "m"), "fever")
+        self.assertIsNone(self.cache.get("vataja jwara", "detailed", "m"))
+        self.assertIsNone(self.cache.get("vataja jwara", "simple", "other-model"))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 2})
+
+    def test_ttl_and_lru_eviction(self):
+        self.cache.set("a", "simple", "m", "1")
+        self.cache.set("b", "simple", "m", "2")
+        self.cache.get("a", "simple", "m")
+        self.cache.set("c", "simple", "m", "3")
+        self.assertIsNone(self.cache.get("b", "simple", "m"))
+        self.assertEqual(self.cache.get("a", "simple", "m"), "1")
+        self.cache.ttl = -1
+        self.assertIsNone(self.cache.get("c", "simple", "m"))
+
+    def test_recent_hits_do_not_write(self):
+        self.cache.touch_interval = 3600
+        self.cache.set("a", "simple", "m", "1")
+        with sqlite3.connect(self.cache.path) as conn:
+            before = conn.execute("SELECT accessed_at FROM translations").fetchone()
+        self.assertEqual(asyncio.run(self.cache.aget("a", "simple", "m")), "1")
+        with sqlite3.connect(self.cache.path) as conn:
+            self.assertEqual(conn.execute("SELECT accessed_at FROM translations").fetchone(), before)
+
+    def test_repeat_translation_skips_groq(self):
+        groq = mock.Mock()
+        groq.chat.completions.create.return_value = _groq_reply("Fever")
+        with mock.patch.object(mapping_agent, "get_groq_client", return_value=groq), \
+                mock.patch.object(mapping_agent, "get_translation_cache", return_value=self.cache):
+            first = asyncio.run(mapping_agent.translate_ayush_to_english_simple("Jwara"))
+            second = asyncio.run(mapping_agent.translate_ayush_to_english_simple("jwara"))
+        self.assertEqual((first, second), ("fever", "fever"))
+        self.assertEqual(groq.chat.completions.create.call_count, 1)
+
+
+class CombinedTranslationTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = TranslationCache(Path(self.tmp.name) / "cache.sqlite3")
+        self.groq = mock.Mock()
+        self.searched = []
+
+        async def icd(term, deadline=None):
+            self.searched.append(term)
+            return [{"code": "MG26", "title": "Fever", "description": "fever with chills"}]
+
+        patches = [
+            mock.patch.object(mapping_agent, "get_groq_client", return_value=self.groq),
+            mock.patch.object(mapping_agent, "get_translation_cache", return_value=self.cache),
+            mock.patch.object(mapping_agent, "async_icd", icd),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_one_groq_call_fills_all_translations(self):
+        self.groq.chat.completions.create.return_value = _groq_reply(
+            '{"simple": "Fever.", "simple_base": "fever", "detailed": "Fever with chills (acute)"}'
+        )
+        result = asyncio.run(mapping_agent.MappingAgent(combined=True).run("Vataja Jwara"))
+        self.assertEqual(self.groq.chat.completions.create.call_count, 1)
+        self.assertEqual((result["english_translation"], result["detailed_translation"]),
+                         ("fever", "fever with chills"))
+        self.assertEqual(self.searched, ["fever"])
+        self.assertEqual(self.cache.get("Vataja Jwara", "simple", mapping_agent.MAPPING_MODEL), "fever")
+        self.assertEqual(self.cache.get("Jwara", "simple_base", mapping_agent.MAPPING_MODEL), "fever")
+        self.assertEqual(self.cache.get("Vataja Jwara", "detailed", mapping_agent.MAPPING_MODEL),
+                         "fever with chills")
+
+    def test_cache_hits_return_simple_base_and_only_missing_entries_are_requested(self):
+        model = mapping_agent.MAPPING_MODEL
+        self.cache.set("Jwara", "simple_base", model, "fever")
+        self.cache.set("Vataja Jwara", "detailed", model, "fever with chills")
+        self.groq.chat.completions.create.return_value = _groq_reply("Fever")
+        combined = mapping_agent.translate_ayush_to_english_combined
+        self.assertEqual(asyncio.run(combined("Vataja Jwara", "Jwara")),
+                         {"simple": "fever", "simple_base": "fever", "detailed": "fever with chills"})
+        # Only the simple word was missing: one small individual call, not the combined prompt
+        self.assertEqual(self.groq.chat.completions.create.call_count, 1)
+        self.assertNotIn("JSON", self.groq.chat.completions.create.call_args.kwargs["messages"][0]["content"])
+
+        self.assertEqual(asyncio.run(combined("Vataja Jwara", "Jwara"))["simple_base"], "fever")
+        self.assertEqual(self.groq.chat.completions.create.call_count, 1)
+
+    def test_unparseable_reply_falls_back_to_individual_calls(self):
+        self.groq.chat.completions.create.side_effect = [
+            _groq_reply("fever, or fever with chills"),
+            _groq_reply("Fever"),
+            _groq_reply("fever with chills"),
+        ]
+        result = asyncio.run(mapping_agent.MappingAgent(combined=True, concurrent=False).run("Vataja Jwara"))
+        self.assertEqual(self.groq.chat.completions.create.call_count, 3)
+        self.assertEqual((result["english_translation"], result["detailed_translation"]),
+                         ("fever", "fever with chills"))
+
+    def test_parse_rejects_wrong_shapes(self):
+        parse = mapping_agent.parse_combined_translation
+        self.assertIsNone(parse('["fever"]'))
+        self.assertIsNone(parse('{"simple": "fever"}'))
+        self.assertIsNone(parse('{"simple": 1, "simple_base": null, "detailed": null}'))
+        self.assertEqual(
+            parse('```json\n{"simple": "Cough", "simple_base": null, "detailed": "dry cough"}\n```'),
+            {"simple": "cough", "simple_base": None, "detailed": "dry cough"},
+        )
+
+
+class MicroBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.groq = mock.Mock()
+        patches = [
+            mock.patch.object(mapping_agent, "get_groq_client", return_value=self.groq),
+            mock.patch.object(mapping_agent, "get_translation_cache", return_value=None),
+            mock.patch.object(mapping_agent, "GROQ_MICROBATCH", True),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_concurrent_requests_share_one_batch_and_missing_items_fall_back(self):
+        calls = []
+
+        async def batch_fn(payloads):
+            calls.append(payloads)
+            return {i: p * 10 for i, p in enumerate(payloads) if p != 4}
+
+        async def single_fn(payload):
+            calls.append(payload)
+            return -payload
+
+        batcher = MicroBatcher("test", batch_fn, single_fn, max_items=16, max_wait_ms=5)
+
+        async def main():
+            return await asyncio.gather(*(batcher.submit(i) for i in range(1, 6)))
+
+        self.assertEqual(asyncio.run(main()), [10, 20, 30, -4, 50])
+        self.assertEqual(calls, [[1, 2, 3, 4, 5], 4])
+
+    def test_translations_are_batched_into_one_groq_call(self):
+        self.groq.chat.completions.create.return_value = _groq_reply(
+            '{"1": {"simple": "fever", "simple_base": "fever", "detailed": "fever with chills"},'
+            ' "2": {"simple": "cough", "simple_base": "cough", "detailed": "productive cough"}}'
+        )
+
+        async def main():
+            return await asyncio.gather(
+                mapping_agent.translate_ayush_to_english_combined("Vataja Jwara", "Jwara"),
+                mapping_agent.translate_ayush_to_english_combined("Kaphaja Kasa", "Kasa"),
+            )
+
+        fever, cough = asyncio.run(main())
+        self.assertEqual((fever["detailed"], cough["detailed"]), ("fever with chills", "productive cough"))
+        self.assertEqual(self.groq.chat.completions.create.call_count, 1)
+
+    def test_unparseable_batch_falls_back_to_single_enrichment_calls(self):
+        def reply(messages, **kwargs):
+            prompt = messages[0]["content"]
+            if "numbered item" in prompt:
+                return _groq_reply("1. yes 2. no")
+            return _groq_reply("yes - fever code" if "MG26" in prompt else "no - different condition")
+
+        self.groq.chat.completions.create.side_effect = reply
+
+        async def main():
+            return await asyncio.gather(
+                mapping_agent.enrich_description_with_llm("MG26", "Fever", "fever"),
+                mapping_agent.enrich_description_with_llm("CA23", "Cough", "fever"),
+            )
+
+        first, second = asyncio.run(main())
+        self.assertEqual((first["matches"], second["matches"]), (True, False))
+        self.assertEqual(self.groq.chat.completions.create.call_count, 3)
+
+
+def _http_response(status_code=200, payload=None):
+    return SimpleNamespace(
+        status_code=status_code,
+        text="",
+        json=lambda: payload,
+        raise_for_status=lambda: None,
+    )
+
+
+def _isolate_tokens(test):
+    """Fresh process-local token managers (no shared file cache) for one test."""
+    token_broker.reset_token_managers()
+    patcher = mock.patch.object(token_broker, "TOKEN_CACHE_DIR", "")
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    test.addCleanup(token_broker.reset_token_managers)
+
+
+def _token_post(calls):
+    """requests.Session.post stand-in answering OAuth token requests."""
+    def post(url, **kwargs):
+        calls[url] = calls.get(url, 0) + 1
+        return _http_response(payload={"access_token": "t", "expires_in": 3600})
+    return post
+
+
+class ICDSearchCacheTests(SimpleTestCase):
+    def setUp(self):
+        _isolate_tokens(self)
+        icd_client._search_cache.clear()
+        patcher = mock.patch.multiple(icd_client, ICD_CLIENT_ID="id", ICD_CLIENT_SECRET="secret")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(icd_client._search_cache.clear)
+
+    def _post(self, entities):
+        def post(url, **kwargs):
+            if url == icd_client.ICD_TOKEN_URL:
+                return _http_response(payload={"access_token": "t", "expires_in": 3600})
+            return _http_response(payload={"destinationEntities": entities})
+        return mock.Mock(side_effect=post)
+
+    def test_results_carry_no_raw_entity_by_default(self):
+        post = self._post([{"theCode": "MG26", "title": "Fever", "matchingPVs": [], "extra": "x" * 1000}])
+        with mock.patch.object(icd_client.requests.Session, "post", post):
+            results = ICD11Client(mode="live").search("Fever")
+        self.assertEqual(results, [{"code": "MG26", "title": "Fever", "description": None}])
+
+    def test_repeat_query_is_served_from_cache_without_raw(self):
+        post = self._post([{"theCode": "MG26", "title": "<em>Fever</em>", "matchingPVs": []}])
+        with mock.patch.object(icd_client.requests.Session, "post", post), \
+                mock.patch.object(icd_client, "ICD_KEEP_RAW", True):
+            first = ICD11Client(mode="live").search("Fever")
+            second = ICD11Client(mode="live").search(" fever ")
+        self.assertIn("raw", first[0])
+        self.assertEqual(second, [{"code": "MG26", "title": "Fever", "description": None}])
+        self.assertEqual(sum(1 for c in post.call_args_list if c.args[0] == icd_client.ICD_SEARCH_URL), 1)
+
+    def test_negative_results_use_short_ttl(self):
+        post = self._post([])
+        with mock.patch.object(icd_client.requests.Session, "post", post), \
+                mock.patch.object(icd_client, "ICD_NEGATIVE_CACHE_TTL", 0):
+            ICD11Client(mode="live").search("nothing")
+            ICD11Client(mode="live").search("nothing")
+        self.assertEqual(sum(1 for c in post.call_args_list if c.args[0] == icd_client.ICD_SEARCH_URL), 2)
+
+    def test_cache_is_bounded(self):
+        cache = icd_client.SearchCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, [], 60)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), [])
+
+
+class ValidationPromptTests(SimpleTestCase):
+    CANDIDATES = [
+        {"code": "CA23", "title": "Cough", "description": "A sudden expulsion of air " * 20, "llm_reason": "x" * 500},
+        {"code": "CA23", "title": "Cough", "source": "csv"},
+        {"code": "MD12", "title": "Cough\nsymptom", "score": 0.7},
+        {"code": "CA22", "title": "Chronic cough"},
+    ]
+
+    def test_one_line_per_distinct_code_up_to_k(self):
+        listing, indexes = compact_candidates(self.CANDIDATES, top_k=2)
+        lines = listing.splitlines()
+        self.assertEqual(indexes, [0, 2])
+        self.assertTrue(lines[0].startswith("1. CA23 | Cough | A sudden expulsion"))
+        self.assertLessEqual(len(lines[0]), 140)
+        self.assertEqual(lines[1], "2. MD12 | Cough symptom")
+
+    def test_choice_maps_back_to_candidate_and_stats_recorded(self):
+        agent = ValidationAgent(groq_api_key="test")
+        create = mock.Mock(return_value=_groq_reply('{"best": 2, "confidence": 0.9, "reason": "ok"}'))
+        agent.client = mock.Mock(chat=mock.Mock(completions=mock.Mock(create=create)))
+        out = agent.run("Kasa", "Kasa since a week", self.CANDIDATES)
+        self.assertEqual(out["best"]["code"], "MD12")
+        self.assertEqual(out["confidence"], 0.7)
+        prompt = create.call_args.kwargs["messages"][0]["content"]
+        self.assertNotIn("llm_reason", prompt)
+        stats = out["prompt_stats"]
+        self.assertEqual((stats["candidates"], stats["shown"]), (4, 3))
+        self.assertEqual(stats["prompt_tokens_est"], -(-len(prompt) // 4))
+        self.assertIn("latency_ms", stats)
+
+
+class ResilienceTests(SimpleTestCase):
+    def setUp(self):
+        self.sleeps = []
+        patcher = mock.patch.object(resilience.time, "sleep", self.sleeps.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _unavailable(self, retry_after=None):
+        headers = {"retry-after": retry_after} if retry_after else {}
+        response = httpx.Response(503, headers=headers, request=httpx.Request("POST", "https://dep.test"))
+        return httpx.HTTPStatusError("unavailable", request=response.request, response=response)
+
+    def test_retries_honour_retry_after_and_stop_when_budget_is_spent(self):
+        dep = Dependency("dep", RetryBudget(ratio=0, min_per_second=0, max_tokens=2), max_attempts=5)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            raise self._unavailable(retry_after="1")
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            dep.call(flaky)
+        # First attempt plus two budgeted retries, each waiting the server's Retry-After
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.sleeps, [1.0, 1.0])
+
+    def test_breaker_opens_then_half_open_probe_closes_it(self):
+        dep = Dependency("dep", RetryBudget(), max_attempts=1, failure_threshold=2, recovery_timeout=60)
+        for _ in range(2):
+            with self.assertRaises(httpx.HTTPStatusError):
+                dep.call(mock.Mock(side_effect=self._unavailable()))
+        fn = mock.Mock(return_value="ok")
+        with self.assertRaises(CircuitOpenError):
+            dep.call(fn)
+        fn.assert_not_called()
+
+        dep.breaker.opened_at -= 61
+        self.assertTrue(dep.breaker.allow())  # the single probe slot
+        self.assertFalse(dep.breaker.allow())
+        dep.breaker.release()
+        self.assertEqual(dep.call(fn), "ok")
+        self.assertEqual(dep.snapshot()["state"], "closed")
+
+    def test_client_errors_do_not_open_the_breaker(self):
+        dep = Dependency("dep", RetryBudget(), failure_threshold=1)
+        response = httpx.Response(400, request=httpx.Request("POST", "https://dep.test"))
+        with self.assertRaises(httpx.HTTPStatusError):
+            dep.call(mock.Mock(side_effect=httpx.HTTPStatusError("bad", request=response.request, response=response)))
+        self.assertEqual(dep.snapshot()["state"], "closed")
+
+    def test_open_icd_circuit_fails_fast_to_empty_results(self):
+        dep = Dependency("ICD-11 API", RetryBudget(), failure_threshold=1)
+        dep.breaker.record_failure()
+        post = mock.Mock()
+        with mock.patch.object(icd_client, "icd_dependency", dep), \
+                mock.patch.multiple(icd_client, ICD_CLIENT_ID="id", ICD_CLIENT_SECRET="secret", ICD_ERROR_CACHE_TTL=0), \
+                mock.patch.object(icd_client.requests.Session, "post", post):
+            self.assertEqual(ICD11Client(mode="live").search("fever"), [])
+        post.assert_not_called()
+
+    def test_no_retry_once_the_deadline_would_pass(self):
+        dep = Dependency("dep", RetryBudget(), max_attempts=5)
+        fn = mock.Mock(side_effect=self._unavailable(retry_after="1"))
+        with self.assertRaises(httpx.HTTPStatusError):
+            dep.call(fn, Deadline.after(0.5))
+        self.assertEqual(fn.call_count, 1)
+        self.assertEqual(self.sleeps, [])
+
+
+class ConcurrentMappingTests(SimpleTestCase):
+    def _patches(self, delay=0.05):
+        async def simple(term, use_base_term=False, deadline=None):
+            await asyncio.sleep(delay)
+            return "fever"
+
+        async def detailed(term, deadline=None):
+            await asyncio.sleep(delay)
+            return "fever with chills"
+
+        async def icd(term, deadline=None):
+            await asyncio.sleep(delay)
+            return [
+                {"code": "MG26", "title": "Fever of other or unknown origin", "description": None},
+                {"code": "MG26.0", "title": "Fever with chills", "description": "fever with chills"},
+            ]
+
+        async def enrich(code, title, term, deadline=None):
+            await asyncio.sleep(delay)
+            return {"matches": True, "reason": f"{code} ok", "enriched_description": title}
+
+        return [
+            mock.patch.object(mapping_agent, "translate_ayush_to_english_simple", simple),
+            mock.patch.object(mapping_agent, "translate_ayush_to_english_detailed", detailed),
+            mock.patch.object(mapping_agent, "async_icd", icd),
+            mock.patch.object(mapping_agent, "enrich_description_with_llm", enrich),
+        ]
+
+    def test_concurrent_matches_sequential(self):
+        patches = self._patches()
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        start = time.perf_counter()
+        sequential = asyncio.run(mapping_agent.MappingAgent(concurrent=False, combined=False).run("Vataja Jwara"))
+        sequential_time = time.perf_counter() - start
+        start = time.perf_counter()
+        concurrent = asyncio.run(mapping_agent.MappingAgent(concurrent=True, combined=False).run("Vataja Jwara"))
+        concurrent_time = time.perf_counter() - start
+        self.assertEqual(sequential, concurrent)
+        self.assertLess(concurrent_time, sequential_time)
+
+    def test_low_budget_skips_detailed_translation_and_enrichment(self):
+        patches = self._patches(delay=0)
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        agent = mapping_agent.MappingAgent(concurrent=False, combined=False)
+        result = asyncio.run(agent.run("Vataja Jwara", deadline=Deadline.after(0.5)))
+        self.assertEqual([s["step"] for s in result["skipped_steps"]], ["detailed_translation", "enrichment"])
+        self.assertIsNone(result["detailed_translation"])
+        self.assertFalse(any(c.get("llm_enriched") for c in result["candidates"]))
+        # Without a deadline nothing is skipped
+        result = asyncio.run(agent.run("Vataja Jwara"))
+        self.assertEqual(result["skipped_steps"], [])
+        self.assertEqual(result["detailed_translation"], "fever with chills")
+
+
+class TokenBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.issued = []
+
+    def fetch(self, expires_in=3600, delay=0):
+        def fetch():
+            time.sleep(delay)
+            self.issued.append(f"t{len(self.issued) + 1}")
+            return {"access_token": self.issued[-1], "expires_in": expires_in}
+        return fetch
+
+    def manager(self, fetch, background=False):
+        manager = token_broker.TokenManager("svc", fetch, self.tmp.name, background=background)
+        self.addCleanup(manager.close)
+        return manager
+
+    def test_concurrent_callers_share_one_fetch(self):
+        manager = self.manager(self.fetch(delay=0.05))
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            tokens = list(pool.map(lambda _: manager.token(), range(10)))
+        self.assertEqual(tokens, ["t1"] * 10)
+        self.assertEqual(manager.fetches, 1)
+
+    def test_workers_share_tokens_through_the_cache_file(self):
+        first, second = self.manager(self.fetch()), self.manager(self.fetch())
+        self.assertEqual((first.token(), second.token()), ("t1", "t1"))
+        self.assertEqual((first.fetches, second.fetches), (1, 0))
+        self.assertEqual(os.stat(Path(self.tmp.name) / "svc.json").st_mode & 0o777, 0o600)
+        # A 401 refreshes once; the other worker picks the new token up from the file
+        self.assertEqual(first.invalidate("t1"), "t2")
+        self.assertEqual(second.invalidate("t1"), "t2")
+        self.assertEqual(first.invalidate("t1"), "t2")
+        self.assertEqual(self.issued, ["t1", "t2"])
+
+    def test_cache_dir_open_to_others_is_not_used(self):
+        os.chmod(self.tmp.name, 0o777)
+        first, second = self.manager(self.fetch()), self.manager(self.fetch())
+        self.assertEqual((first.token(), second.token()), ("t1", "t2"))
+        self.assertFalse((Path(self.tmp.name) / "svc.json").exists())
+
+    def test_cache_dir_owned_by_another_user_is_not_used(self):
+        with mock.patch.object(token_broker.os, "getuid", return_value=os.getuid() + 1):
+            manager = self.manager(self.fetch())
+            self.assertEqual(manager.token(), "t1")
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_token_is_refreshed_in_the_background_before_expiry(self):
+        with mock.patch.object(token_broker, "TOKEN_EXPIRY_MARGIN", 0):
+            manager = self.manager(self.fetch(expires_in=1), background=True)
+            self.assertEqual(manager.token(), "t1")
+            deadline = time.monotonic() + 3
+            while len(self.issued) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(manager.token(), "t2")
+            self.assertEqual(manager.fetches, 2)
+
+
+class AsyncHTTPClientTests(SimpleTestCase):
+    def setUp(self):
+        _isolate_tokens(self)
+        icd_client._search_cache.clear()
+        patcher = mock.patch.multiple(icd_client, ICD_CLIENT_ID="id", ICD_CLIENT_SECRET="secret")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(icd_client._search_cache.clear)
+        self.requests = []
+        self.time_out = 0
+
+        def handler(request):
+            self.requests.append(str(request.url))
+            if self.time_out:
+                self.time_out -= 1
+                raise httpx.ReadTimeout("timed out", request=request)
+            return httpx.Response(200, json={"destinationEntities": [{"theCode": "MD12", "title": "Cough"}]})
+
+        self.token_calls = {}
+        patcher = mock.patch.object(icd_client.requests.Session, "post", side_effect=_token_post(self.token_calls))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.built = 0
+        real_build = http_clients.build_async_client
+
+        def build(timeout):
+            self.built += 1
+            client = real_build(timeout)
+            client._transport = httpx.MockTransport(handler)
+            return client
+
+        patcher = mock.patch.object(http_clients, "build_async_client", build)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_asearch_reuses_pool_and_token(self):
+        client = ICD11Client(mode="live")
+
+        async def run():
+            first = await client.asearch("cough")
+            second = await client.asearch("productive cough")
+            await client.aclose()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first[0]["code"], "MD12")
+        self.assertEqual(second[0]["title"], "Cough")
+        self.assertEqual(self.built, 1)
+        self.assertEqual(self.token_calls, {icd_client.ICD_TOKEN_URL: 1})
+
+    def test_search_cut_short_by_budget_neither_trips_breaker_nor_caches(self):
+        dep = Dependency("ICD-11 API", RetryBudget(), failure_threshold=1)
+        client = ICD11Client(mode="live")
+        self.time_out = 1
+
+        async def run():
+            short = await client.asearch("cough", Deadline.after(0.01))
+            normal = await client.asearch("cough")
+            await client.aclose()
+            return short, normal
+
+        with mock.patch.object(icd_client, "icd_dependency", dep):
+            short, normal = asyncio.run(run())
+        self.assertEqual(short, [])
+        self.assertEqual(normal[0]["code"], "MD12")
+        self.assertEqual(dep.snapshot()["state"], "closed")
+        self.assertEqual(dep.snapshot()["consecutive_failures"], 0)
+
+
+class PipelineRuntimeTests(SimpleTestCase):
+    def setUp(self):
+        self.runtime = PipelineRuntime()
+        self.addCleanup(self.runtime.shutdown)
+
+    def test_submissions_share_one_loop(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        self.assertIs(self.runtime.submit(current_loop()), self.runtime.submit(current_loop()))
+
+    def test_timeout_cancels_task(self):
+        cancelled = []
+
+        async def slow():
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        with self.assertRaises(TimeoutError):
+            self.runtime.submit(slow(), timeout=0.05)
+        self.runtime.submit(asyncio.sleep(0.01))
+        self.assertEqual(cancelled, [True])
+
+    def test_stream_yields_items_and_cancels_on_close(self):
+        cancelled = []
+
+        async def numbers():
+            try:
+                for i in range(100):
+                    yield i
+                    await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        stream = self.runtime.stream(numbers())
+        self.assertEqual([next(stream) for _ in range(3)], [0, 1, 2])
+        stream.close()
+        self.runtime.submit(asyncio.sleep(0.05))
+        self.assertEqual(cancelled, [True])
+
+    def test_shutdown_runs_hooks_and_rejects_new_work(self):
+        closed = []
+
+        async def hook():
+            closed.append(True)
+
+        self.runtime.add_shutdown_hook(hook)
+        self.runtime.shutdown()
+        self.assertEqual(closed, [True])
+        with self.assertRaises(RuntimeError):
+            self.runtime.submit(asyncio.sleep(0))
+
+
+class AgentRegistryReuseTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = {}
+        _isolate_tokens(self)
+
+        def handler(request):
+            url = str(request.url)
+            self.calls[url] = self.calls.get(url, 0) + 1
+            if url == icd_client.ICD_SEARCH_URL:
+                return httpx.Response(200, json={"destinationEntities": [{"theCode": "CA23", "title": "Cough"}]})
+            return httpx.Response(201, json={"id": "cond-1"})
+
+        self.built = 0
+        real_build = http_clients.build_async_client
+
+        def build(timeout):
+            self.built += 1
+            client = real_build(timeout)
+            client._transport = httpx.MockTransport(handler)
+            return client
+
+        validated = {"best": {"code": "CA23", "title": "Cough"}, "confidence": 0.95,
+                     "reason": "ok", "needs_human_review": False}
+        patches = [
+            mock.patch.object(http_clients, "build_async_client", build),
+            mock.patch.object(icd_client.requests.Session, "post", side_effect=_token_post(self.calls)),
+            mock.patch.multiple(icd_client, ICD_CLIENT_ID="id", ICD_CLIENT_SECRET="secret", ICD_CACHE_TTL=0),
+            mock.patch.multiple(abdm_client, ABDM_CLIENT_ID="id", ABDM_CLIENT_SECRET="secret",
+                                ABDM_TOKEN_URL="https://abdm.test/token", ABDM_FHIR_BASE="https://abdm.test/fhir"),
+            mock.patch.object(ValidationAgent, "run", return_value=validated),
+            mock.patch.object(mapping_agent, "client", ICD11Client(mode="live")),
+            mock.patch.object(registry, "_registry", None),
+            mock.patch.object(routing, "FAST_PATH", False),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_tokens_and_connections_reused_across_100_runs(self):
+        pipeline = LangGraphAYUSHPipeline()
+        for i in range(100):
+            result = pipeline.run(f"Patient {i} presents with Kasa", "Patient/AY00001", auto_push=True)
+            self.assertTrue(result["pushed"])
+        self.assertEqual(self.calls[icd_client.ICD_SEARCH_URL], 100)
+        self.assertEqual(self.calls["https://abdm.test/fhir/Condition"], 100)
+        self.assertEqual(self.calls[icd_client.ICD_TOKEN_URL], 1)
+        self.assertEqual(self.calls["https://abdm.test/token"], 1)
+        # One pooled async client each for ICD and ABDM
+        self.assertEqual(self.built, 2)
+        self.assertIs(registry.get_registry().extraction(), registry.get_registry().extraction())
+
+
+FAKE_RESULT = {
+    "ayush_term": "Kasa",
+    "best": {"code": "CA23", "title": "Cough"},
+    "confidence": 0.8,
+    "reason": "test",
+    "needs_human_review": True,
+}
+
+
+class PipelineAPITestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("doctor", "doctor@example.com", "pass12345")
+        self.patient = Patient.objects.create(user=self.user, name="Test", ayush_id="AY00001", age=30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        pipeline = mock.Mock()
+        pipeline.run.return_value = dict(FAKE_RESULT)
+        for module in (jobs, views):
+            patcher = mock.patch.object(module, "get_pipeline", return_value=pipeline)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.pipeline = pipeline
+
+
+class RunPipelineViewTests(PipelineAPITestCase):
+    def test_synchronous_run_is_default(self):
+        resp = self.client.post(
+            "/api/run_pipeline/",
+            {"patient_id": self.patient.id, "raw_text": "Kasa since a week"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["result"]["best"]["code"], "CA23")
+        self.assertTrue(Diagnosis.objects.filter(pk=resp.json()["diagnosis_id"]).exists())
+
+    def test_budget_ms_sets_the_latency_budget(self):
+        data = {"patient_id": self.patient.id, "raw_text": "Kasa since a week", "budget_ms": 3000}
+        resp = self.client.post("/api/run_pipeline/", data, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.pipeline.run.call_args.kwargs["budget"], 3.0)
+        resp = self.client.post("/api/run_pipeline/", dict(data, budget_ms="soon"), format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_stream_emits_one_event_per_node(self):
+        def stream(raw_text, patient_ref, auto_push=False, budget=None):
+            yield "extract", {"ayush_term": "Kasa"}
+            yield "map", {"candidates": [{"code": "CA23"}], "mapping_source": "deterministic"}
+            yield "validate", dict(FAKE_RESULT)
+            yield "output", dict(FAKE_RESULT, fhir={"resourceType": "Condition"}, pushed=False)
+
+        self.pipeline.stream.side_effect = stream
+        resp = self.client.post(
+            "/api/run_pipeline/stream/",
+            {"patient_id": self.patient.id, "raw_text": "Kasa since a week"},
+            format="json",
+        )
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        body = b"".join(resp.streaming_content).decode()
+        events = [line.split(": ", 1)[1] for line in body.splitlines() if line.startswith("event: ")]
+        self.assertEqual(events, ["extract", "map", "validate", "output", "done"])
+        self.assertEqual(Diagnosis.objects.get(patient=self.patient).icd_code, "CA23")
+
+    def test_one_diagnosis_per_extracted_term(self):
+        self.pipeline.run.return_value = dict(FAKE_RESULT, term_results=[
+            {"term_index": 0, "ayush_term": "Kasa", "best": {"code": "CA23"}, "confidence": 0.8},
+            {"term_index": 1, "ayush_term": "Vataja Jwara", "best": {"code": "MG26"}, "confidence": 0.7},
+        ])
+        resp = self.client.post(
+            "/api/run_pipeline/",
+            {"patient_id": self.patient.id, "raw_text": "Kasa with Vataja Jwara"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        ids = resp.json()["diagnosis_ids"]
+        self.assertEqual(ids[0], resp.json()["diagnosis_id"])
+        self.assertEqual(
+            [Diagnosis.objects.get(pk=pk).icd_code for pk in ids], ["CA23", "MG26"]
+        )
+
+    def test_internal_status_is_staff_only(self):
+        self.assertEqual(self.client.get("/api/internal/status/").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        resp = self.client.get("/api/internal/status/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(set(resp.json()["dependencies"]), {"groq", "icd", "abdm"})
+        self.assertIn("tokens", resp.json()["retry_budget"])
+        self.assertEqual(set(resp.json()["routes"]["routes"]), set(routing.ROUTES))
+
+    def test_metrics_endpoint_is_staff_only_prometheus_text(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        with mock.patch.object(metrics, "METRICS_ENABLED", True):
+            metrics.reset_metrics()
+            self.addCleanup(metrics.reset_metrics)
+            metrics.count_cache("icd_search", True)
+            resp = self.client.get("/api/metrics/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        worker = os.getpid()
+        self.assertIn(f'ayush_cache_requests_total{{cache="icd_search",result="hit",worker="{worker}"}} 1', resp.content.decode())
+
+    def test_batch_bulk_creates_and_reports_per_item(self):
+        self.pipeline.run_batch.side_effect = lambda items: [dict(FAKE_RESULT) for _ in items]
+        resp = self.client.post(
+            "/api/run_pipeline/batch/",
+            {"items": [
+                {"patient_id": self.patient.id, "raw_text": "Kasa"},
+                {"patient_id": 999999, "raw_text": "Kasa"},
+                {"patient_id": self.patient.id, "raw_text": "Kasa again"},
+            ]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual(results[1], {"index": 1, "error": "Patient not found."})
+        self.assertEqual(Diagnosis.objects.filter(patient=self.patient).count(), 2)
+        self.assertEqual(
+            {results[0]["diagnosis_id"], results[2]["diagnosis_id"]},
+            set(Diagnosis.objects.values_list("id", flat=True)),
+        )
+
+
+    def test_batch_rejects_malformed_items_and_trims_results(self):
+        resp = self.client.post(
+            "/api/run_pipeline/batch/",
+            {"items": [{"patient_id": self.patient.id, "raw_text": "Kasa"}, {"patient_id": [1], "raw_text": "Kasa"}]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["index"], 1)
+
+        self.pipeline.run_batch.side_effect = lambda items: [
+            dict(FAKE_RESULT, raw_text=i["raw_text"], patient_ref=i["patient_ref"]) for i in items
+        ]
+        item = {"patient_id": str(self.patient.id), "raw_text": "Kasa"}
+        result = self.client.post("/api/run_pipeline/batch/", {"items": [item]}, format="json").json()["results"][0]
+        self.assertNotIn("raw_text", result["result"])
+        self.assertNotIn("patient_ref", result["result"])
+        resp = self.client.post("/api/run_pipeline/batch/?fields=best", {"items": [item]}, format="json")
+        self.assertEqual(resp.json()["results"][0]["result"], {"best": FAKE_RESULT["best"]})
+
+
+class PipelineJobTests(PipelineAPITestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(jobs, "PIPELINE_JOB_WORKERS", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_async_submission_and_polling(self):
+        resp = self.client.post(
+            "/api/run_pipeline/?mode=async",
+            {"patient_id": self.patient.id, "raw_text": "Kasa since a week"},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()["job_id"]
+        self.assertEqual(self.client.get(f"/api/pipeline_jobs/{job_id}/").json()["status"], "queued")
+
+        job = jobs.process_next_job()
+        self.assertEqual(job.id, job_id)
+        self.assertIsNone(jobs.process_next_job())
+
+        body = self.client.get(f"/api/pipeline_jobs/{job_id}/").json()
+        self.assertEqual(body["status"], "succeeded")
+        self.assertEqual(body["result"]["best"]["code"], "CA23")
+        self.assertEqual(Diagnosis.objects.get(pk=body["diagnosis_id"]).icd_code, "CA23")
+
+    def test_async_job_keeps_budget_and_field_selection(self):
+        resp = self.client.post(
+            "/api/run_pipeline/?mode=async&fields=best,confidence",
+            {"patient_id": self.patient.id, "raw_text": "Kasa since a week", "budget_ms": 250},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 202)
+        jobs.process_next_job()
+        self.assertEqual(self.pipeline.run.call_args.kwargs["budget"], 0.25)
+
+        body = self.client.get(f"/api/pipeline_jobs/{resp.json()['job_id']}/").json()
+        self.assertEqual(set(body["result"]), {"best", "confidence"})
+        self.assertEqual(body["result"]["best"]["code"], "CA23")
+
+    def test_failed_job_records_error(self):
+        self.pipeline.run.side_effect = RuntimeError("boom")
+        job = jobs.enqueue_job(self.user, self.patient, "text")
+        jobs.process_next_job()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (PipelineJob.STATUS_FAILED, "boom"))
+
+    def test_jobs_are_private_to_their_user(self):
+        job = jobs.enqueue_job(self.user, self.patient, "text")
+        other = User.objects.create_user("other", "other@example.com", "pass12345")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"/api/pipeline_jobs/{job.id}/").status_code, 404)
+
+    def test_enqueue_never_starts_a_pool(self):
+        with mock.patch.object(jobs, "PIPELINE_JOB_WORKERS", 2), \
+                mock.patch.object(jobs, "PipelineWorkerPool") as pool_cls:
+            jobs.enqueue_job(self.user, self.patient, "text")
+        pool_cls.assert_not_called()
+        self.assertIsNone(jobs.running_worker_pool())
+
+    def test_pool_requeues_stale_jobs_on_start_and_periodically(self):
+        def stale_job():
+            job = jobs.enqueue_job(self.user, self.patient, "text")
+            started = timezone.now() - timedelta(minutes=5)
+            PipelineJob.objects.filter(pk=job.pk).update(status=PipelineJob.STATUS_RUNNING, started_at=started)
+            return job
+
+        first = stale_job()
+        pool = jobs.PipelineWorkerPool(0, stale_after=60)
+        pool._sweep_stale()
+        first.refresh_from_db()
+        self.assertEqual(first.status, PipelineJob.STATUS_QUEUED)
+
+        second = stale_job()
+        pool._sweep_stale()  # not due again for another stale_after / 2
+        second.refresh_from_db()
+        self.assertEqual(second.status, PipelineJob.STATUS_RUNNING)
+        pool._next_sweep = 0
+        pool._sweep_stale()
+        second.refresh_from_db()
+        self.assertEqual(second.status, PipelineJob.STATUS_QUEUED)
+
+
+class ListPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("doctor", "doctor@example.com", "pass12345")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.patient = Patient.objects.create(user=self.user, name="A", ayush_id="AY00001", age=30)
+        self.other = Patient.objects.create(user=self.user, name="B", ayush_id="AY00002", age=40)
+        for i in range(5):
+            Diagnosis.objects.create(patient=self.patient, ayush_term=f"t{i}", icd_code="X", confidence_score=0.9, raw_text="")
+        Diagnosis.objects.create(patient=self.other, ayush_term="other", icd_code="Y", confidence_score=0.9, raw_text="")
+
+    def test_diagnoses_filtered_by_patient_and_cursor_paginated(self):
+        resp = self.client.get("/api/diagnoses/", {"patient": self.patient.id, "page_size": 2})
+        self.assertEqual(resp.status_code, 200)
+        seen = []
+        while True:
+            seen += [d["ayush_term"] for d in resp.data["results"]]
+            if not resp.data["next"]:
+                break
+            resp = self.client.get(resp.data["next"])
+        self.assertEqual(seen, ["t4", "t3", "t2", "t1", "t0"])
+
+    def test_invalid_patient_filter_rejected(self):
+        self.assertEqual(self.client.get("/api/diagnoses/", {"patient": "abc"}).status_code, 400)
+
+    def test_patients_paginated_and_private(self):
+        intruder = User.objects.create_user("other", "other@example.com", "pass12345")
+        Patient.objects.create(user=intruder, name="C", ayush_id="AY00003", age=50)
+        resp = self.client.get("/api/patients/")
+        self.assertEqual([p["name"] for p in resp.data["results"]], ["B", "A"])
+        self.assertIsNone(resp.data["next"])
+
+
+class ResultFieldsTests(PipelineAPITestCase):
+    def test_fields_selects_result_keys(self):
+        data = {"patient_id": self.patient.id, "raw_text": "Kasa"}
+        resp = self.client.post("/api/run_pipeline/?fields=best,confidence", data, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["result"], {"best": FAKE_RESULT["best"], "confidence": 0.8})
+        self.assertIn("diagnosis_id", resp.data)
+
+    def test_unknown_field_rejected_before_running(self):
+        data = {"patient_id": self.patient.id, "raw_text": "Kasa"}
+        resp = self.client.post("/api/run_pipeline/?fields=best,secret", data, format="json")
+        self.assertEqual(resp.status_code, 400)
+        self.pipeline.run.assert_not_called()
+
+
+class AuditLogTests(PipelineAPITestCase):
+    def run_pipeline(self):
+        result = {
+            **FAKE_RESULT,
+            "candidates": [{"code": "CA23", "title": "Cough", "raw": {"payload": "x" * 5000}}],
+            "provenance": [{"step": "mapping", "value": {"raw": "x" * 5000}}, {"step": "output", "error": "offline"}],
+        }
+        self.pipeline.run.return_value = result
+        resp = self.client.post("/api/run_pipeline/", {"patient_id": self.patient.id, "raw_text": "Kasa"}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        return result
+
+    def test_compact_record_written_after_commit(self):
+        written = []
+        writer = audit.AuditWriter(write=written.extend)
+        self.addCleanup(writer.close)
+        with mock.patch.object(audit, "AUDIT_ASYNC", True), \
+                mock.patch.object(audit, "get_audit_writer", return_value=writer):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                result = self.run_pipeline()
+                # Nothing is queued until the request's transaction commits
+                self.assertEqual(written, [])
+        self.assertEqual(len(callbacks), 1)
+        writer.flush()
+        self.assertEqual(AuditLog.objects.count(), 0)
+        details = written[0].details
+        self.assertLess(len(json.dumps(details)), 1000)
+        self.assertEqual(details["raw_text_sha256"], audit.content_hash("Kasa"))
+        self.assertEqual(details["terms"][0]["candidate_codes"], ["CA23"])
+        self.assertEqual(details["terms"][0]["candidates_sha256"], audit.content_hash(result["candidates"]))
+        self.assertEqual(details["steps"], [{"step": "mapping"}, {"step": "output", "error": "offline"}])
+        self.assertNotIn("pipeline_state_zlib", details)
+
+    def test_full_state_kept_compressed_when_enabled(self):
+        with mock.patch.object(audit, "AUDIT_ASYNC", False), mock.patch.object(audit, "AUDIT_STORE_STATE", True):
+            result = self.run_pipeline()
+        details = AuditLog.objects.get().details
+        self.assertEqual(audit.decode_audit_state(details)["provenance"], result["provenance"])
+        self.assertLess(len(details["pipeline_state_zlib"]), 1000)
+
+    def test_archive_moves_old_rows_out(self):
+        AuditLog.objects.bulk_create([AuditLog(action="run_pipeline", details={"n": i}) for i in range(5)])
+        AuditLog.objects.filter(details__n__lt=3).update(timestamp=timezone.now() - timedelta(days=100))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "audit.jsonl.gz"
+            call_command("archive_audit_logs", output=str(path), days=90, batch_size=2, stdout=io.StringIO())
+            with gzip.open(path, "rt") as f:
+                archived = [json.loads(line)["details"]["n"] for line in f]
+        self.assertEqual(archived, [0, 1, 2])
+        self.assertEqual(sorted(AuditLog.objects.values_list("details__n", flat=True)), [3, 4])
+
+
+class FakeAgentsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.mapped = []
+        self.validated = []
+        self.active = 0
+        self.max_active = 0
+
+        async def map_run(term, deadline=None):
+            self.mapped.append(term)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return {"candidates": [{"code": "CA23", "title": "Cough", "score": 0.8}],
+                    "mapping_source": "deterministic", "needs_manual_review": False}
+
+        def validate_run(term, raw_text, candidates, deadline=None):
+            self.validated.append((term, raw_text))
+            return {"best": candidates[0], "confidence": 0.8, "reason": "ok", "needs_human_review": True}
+
+        agents = registry.AgentRegistry()
+        agents._instances = {
+            "extraction": ExtractionAgent(scan_first=True),
+            "mapping": mock.Mock(run=map_run),
+            "validation": mock.Mock(run=validate_run),
+        }
+        patcher = mock.patch.object(registry, "_registry", agents)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(registry, "_registry_pid", os.getpid())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # These tests exercise the full mapping + validation route
+        patcher = mock.patch.object(routing, "FAST_PATH", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class BatchPipelineTests(FakeAgentsTestCase):
+    def test_identical_terms_are_mapped_and_validated_once(self):
+        items = [
+            {"raw_text": "Kasa since a week", "patient_ref": "Patient/AY00001"},
+            {"raw_text": "Kasa since a week", "patient_ref": "Patient/AY00002"},
+            {"raw_text": "Productive Kasa at night", "patient_ref": "Patient/AY00003"},
+            {"raw_text": "Vataja Jwara", "patient_ref": "Patient/AY00004"},
+        ]
+        states = asyncio.run(run_batch(items))
+        self.assertEqual(sorted(self.mapped), ["Kasa", "Vataja Jwara"])
+        self.assertEqual(len(self.validated), 3)
+        self.assertEqual([s["best"]["code"] for s in states], ["CA23"] * 4)
+        self.assertEqual([s["fhir"]["subject"]["reference"] for s in states],
+                         [item["patient_ref"] for item in items])
+        self.assertIsNot(states[0]["candidates"], states[1]["candidates"])
+
+    def test_every_term_of_a_note_is_mapped(self):
+        states = asyncio.run(run_batch([
+            {"raw_text": "Kasa with Vataja Jwara", "patient_ref": "Patient/AY00001"},
+            {"raw_text": "Vataja Jwara", "patient_ref": "Patient/AY00002"},
+        ]))
+        self.assertEqual(sorted(self.mapped), ["Kasa", "Vataja Jwara"])
+        self.assertEqual([len(s["fhir_conditions"]) for s in states], [2, 1])
+
+
+class MultiTermPipelineTests(FakeAgentsTestCase):
+    NOTE = "Kasa since a week, Vataja Jwara and Amavata in the knees"
+
+    def test_fan_out_builds_one_condition_per_term(self):
+        result = LangGraphAYUSHPipeline().run(self.NOTE, "Patient/AY00001")
+        self.assertEqual([t["ayush_term"] for t in result["term_results"]], ["Kasa", "Vataja Jwara", "Amavata"])
+        self.assertEqual(result["term_results"][1]["start"], self.NOTE.index("Vataja"))
+        self.assertEqual(len(result["fhir_conditions"]), 3)
+        self.assertEqual(
+            [c["code"]["coding"][1]["code"] for c in result["fhir_conditions"]], ["Kasa", "Vataja Jwara", "Amavata"]
+        )
+        # Primary term stays at the top level for single-term consumers
+        self.assertEqual((result["ayush_term"], result["best"]["code"]), ("Kasa", "CA23"))
+        self.assertEqual(self.max_active, 3)
+
+    def test_parallel_terms_are_capped(self):
+        LangGraphAYUSHPipeline(max_parallel_terms=1).run(self.NOTE, "Patient/AY00001")
+        self.assertEqual(len(self.mapped), 3)
+        self.assertEqual(self.max_active, 1)
+
+    def test_low_budget_skips_validation_and_records_it(self):
+        result = LangGraphAYUSHPipeline().run(self.NOTE, "Patient/AY00001", budget=0.5)
+        self.assertEqual(self.validated, [])
+        self.assertEqual(
+            [(s["step"], s["term_index"]) for s in result["skipped_steps"]],
+            [("validation", 0), ("validation", 1), ("validation", 2)],
+        )
+        self.assertEqual(result["term_results"][1]["skipped_steps"][0]["step"], "validation")
+        self.assertEqual(result["best"]["code"], "CA23")
+        self.assertTrue(result["needs_human_review"])
+
+    def test_candidates_and_provenance_are_slim(self):
+        async def map_run(term, deadline=None):
+            return {"candidates": [{"code": "CA23", "title": "Cough", "score": 0.8, "raw": {"x": "y" * 5000}}],
+                    "mapping_source": "icd11_search", "needs_manual_review": False}
+
+        with mock.patch.object(registry._registry._instances["mapping"], "run", map_run):
+            result = LangGraphAYUSHPipeline().run("Kasa", "Patient/AY00001")
+        self.assertEqual(result["candidates"], [{"code": "CA23", "title": "Cough", "score": 0.8}])
+        steps = {p["step"]: p["value"] for p in result["provenance"]}
+        self.assertEqual(steps["mapping"]["candidate_codes"], ["CA23"])
+        self.assertEqual(steps["validation"], {"code": "CA23", "confidence": 0.8, "needs_human_review": True})
+        self.assertEqual(set(steps["output"]), {"fhir_id", "pushed"})
+        self.assertLess(len(json.dumps(result["provenance"])), 1000)
+
+
+class MetricsTests(FakeAgentsTestCase):
+    def enable(self):
+        patcher = mock.patch.object(metrics, "METRICS_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.reset_metrics()
+        self.addCleanup(metrics.reset_metrics)
+
+    def test_dependency_attempts_timed_by_outcome(self):
+        self.enable()
+        dep = Dependency("dep", RetryBudget(), max_attempts=1)
+        dep.call(lambda: "ok")
+        with self.assertRaises(ValueError):
+            dep.call(mock.Mock(side_effect=ValueError("bad")))
+        self.assertEqual(metrics.DEPENDENCY_SECONDS.count(dependency="dep", outcome="ok"), 1)
+        self.assertEqual(metrics.DEPENDENCY_SECONDS.count(dependency="dep", outcome="error"), 1)
+        self.assertEqual(metrics.DEPENDENCY_IN_FLIGHT.value(dependency="dep"), 0)
+        text = metrics.render_prometheus()
+        self.assertIn(
+            f'ayush_dependency_call_seconds_bucket{{dependency="dep",outcome="ok",worker="{os.getpid()}",le="+Inf"}} 1',
+            text,
+        )
+        self.assertIn("# TYPE ayush_dependency_call_seconds histogram", text)
+
+    def test_run_records_node_timings_in_provenance(self):
+        self.enable()
+        validate = registry._registry._instances["validation"].run
+
+        def timed_validate(*args, **kwargs):
+            # Runs in the node thread pool; the run's timings must follow it there
+            with metrics.time_dependency("Groq"):
+                return validate(*args, **kwargs)
+
+        with mock.patch.object(registry._registry._instances["validation"], "run", timed_validate):
+            result = LangGraphAYUSHPipeline().run("Kasa with Vataja Jwara", "Patient/AY00001")
+        timings = result["provenance"][-1]
+        self.assertEqual(timings["step"], "timings")
+        steps = timings["value"]["steps"]
+        self.assertEqual(steps["mapping"]["count"], 2)
+        self.assertTrue({"extract", "route", "validation", "reduce", "output"} <= set(steps))
+        self.assertEqual(timings["value"]["dependencies"]["Groq"]["count"], 2)
+        self.assertEqual(metrics.STEP_SECONDS.count(step="extract"), 1)
+        self.assertEqual(metrics.PIPELINE_RUN_SECONDS.count(), 1)
+
+    def test_disabled_metrics_record_nothing(self):
+        metrics.reset_metrics()
+        self.assertIs(metrics.time_step("extract"), metrics.time_dependency("Groq"))
+        result = LangGraphAYUSHPipeline().run("Kasa", "Patient/AY00001")
+        self.assertNotIn("timings", [p["step"] for p in result["provenance"]])
+        self.assertEqual(metrics.STEP_SECONDS.count(step="extract"), 0)
+
+
+class FastPathRoutingTests(FakeAgentsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.counters = routing.RouteCounters()
+        patches = [
+            mock.patch.object(routing, "FAST_PATH", True),
+            mock.patch.object(routing, "FAST_PATH_CONFIRMED_MIN_COUNT", 0),
+            mock.patch.object(routing, "route_counters", self.counters),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_seed_routes(self):
+        self.assertEqual(routing.fast_path("Kasa")[0], routing.ROUTE_EXACT)
+        route, fields = routing.fast_path("visarpa")
+        self.assertEqual((route, fields["best"]["code"]), (routing.ROUTE_PRIORITY, "1C13"))
+        self.assertFalse(fields["needs_human_review"])
+        # Several seed rows with different codes still need the full path
+        self.assertIsNone(routing.fast_path("Adhmana"))
+        self.assertIsNone(routing.fast_path("Unheard-of Roga"))
+
+    def test_confident_terms_skip_mapping_and_validation(self):
+        note = "Kasa since a week, Visarpa on the leg and Adhmana after meals"
+        result = LangGraphAYUSHPipeline().run(note, "Patient/AY00001")
+        self.assertEqual([t["route"] for t in result["term_results"]], ["exact", "priority", "full"])
+        self.assertEqual(self.mapped, ["Adhmana"])
+        self.assertEqual(len(self.validated), 1)
+        self.assertEqual(len(result["fhir_conditions"]), 3)
+        self.assertEqual((result["route"], result["best"]["code"]), ("exact", "CA23"))
+        snapshot = self.counters.snapshot()
+        self.assertEqual(snapshot["total"], 3)
+        self.assertEqual(snapshot["routes"]["full"]["fraction"], round(1 / 3, 4))
+
+    def test_batch_routes_each_distinct_term_once(self):
+        states = asyncio.run(run_batch([
+            {"raw_text": "Kasa since a week", "patient_ref": "Patient/AY00001"},
+            {"raw_text": "Kasa since a week", "patient_ref": "Patient/AY00002"},
+            {"raw_text": "Adhmana after meals", "patient_ref": "Patient/AY00003"},
+        ]))
+        self.assertEqual(self.mapped, ["Adhmana"])
+        self.assertEqual([s["route"] for s in states], ["exact", "exact", "full"])
+        self.assertEqual(self.counters.snapshot()["routes"]["exact"]["count"], 2)
+
+
+class ConfirmedRouteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("doctor", "doctor@example.com", "pass12345")
+        self.patient = Patient.objects.create(user=self.user, name="Test", ayush_id="AY00001", age=30)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def diagnose(self, code, route="full"):
+        return Diagnosis.objects.create(patient=self.patient, ayush_term="Pandu", icd_code=code,
+                                        confidence_score=0.95, raw_text="Pandu", route=route)
+
+    def review(self, diagnosis, code):
+        resp = self.client.patch(f"/api/diagnoses/{diagnosis.id}/", {"icd_code": code}, format="json")
+        self.assertEqual(resp.status_code, 200)
+
+    def test_only_clinician_reviews_confirm_a_mapping(self):
+        # Confident pipeline output alone never confirms anything
+        first, second = self.diagnose("3A00"), self.diagnose("3A01")
+        self.diagnose("3A00")
+        self.assertIsNone(routing.confirmed_fast_path("pandu"))
+        self.review(first, "3A00")
+        self.assertIsNone(routing.confirmed_fast_path("pandu"))
+        self.review(second, "3A00")
+        route, fields = routing.confirmed_fast_path("pandu")
+        self.assertEqual((route, fields["best"]["code"]), (routing.ROUTE_CONFIRMED, "3A00"))
+        self.assertIn("2 clinician reviews", fields["reason"])
+        # Re-reviewing with another code moves the confirmation and makes the term ambiguous
+        self.review(second, "3A01")
+        self.assertIsNone(routing.confirmed_fast_path("pandu"))
+        self.client.delete(f"/api/diagnoses/{second.id}/")
+        self.assertEqual(list(ConfirmedMapping.objects.values_list("icd_code", "confirmations")), [("3A00", 1)])
+
+    def test_confirmed_route_results_do_not_confirm_themselves(self):
+        for _ in range(3):
+            self.review(self.diagnose("3A00", route=routing.ROUTE_CONFIRMED), "3A00")
+        self.assertFalse(ConfirmedMapping.objects.exists())
+
+    def test_auto_push_runs_skip_the_confirmed_route(self):
+        with mock.patch.object(routing, "confirmed_fast_path",
+                               return_value=(routing.ROUTE_CONFIRMED, {})) as confirmed:
+            term = "Unheard-of Roga"  # not in the seed mappings
+            self.assertEqual(asyncio.run(choose_route(term, auto_push=True)), (routing.ROUTE_FULL, None))
+            confirmed.assert_not_called()
+            self.assertEqual(asyncio.run(choose_route(term))[0], routing.ROUTE_CONFIRMED)
+
+
+class MapNotesCommandTests(FakeAgentsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input = Path(self.tmp.name) / "notes.csv"
+        self.output = Path(self.tmp.name) / "mapped.jsonl"
+
+    def write_notes(self, rows):
+        with open(self.input, "a") as f:
+            if f.tell() == 0:
+                f.write("id,raw_text\n")
+            f.writelines(f"{rid},{text}\n" for rid, text in rows)
+
+    def map_notes(self):
+        call_command("map_notes", str(self.input), output=str(self.output),
+                     processes=0, chunk_size=2, stdout=io.StringIO())
+        return [json.loads(line) for line in self.output.read_text().splitlines()]
+
+    def test_writes_results_in_order_and_resumes_from_checkpoint(self):
+        self.write_notes([("n1", "Kasa since a week"), ("n2", ""), ("n3", "Vataja Jwara with Kasa")])
+        rows = self.map_notes()
+        self.assertEqual([r["id"] for r in rows], ["n1", "n2", "n3"])
+        self.assertEqual(rows[1]["error"], "empty text")
+        self.assertEqual([t["code"] for t in rows[2]["results"]], ["CA23", "CA23"])
+        mapped = len(self.mapped)
+
+        # A killed run may leave rows behind its checkpoint; they are dropped on resume
+        with open(self.output, "a") as f:
+            f.write('{"id": "partial"}\n')
+        self.write_notes([("n4", "Kasa")])
+        rows = self.map_notes()
+        self.assertEqual([r["id"] for r in rows], ["n1", "n2", "n3", "n4"])
+        self.assertEqual(len(self.mapped), mapped + 1)
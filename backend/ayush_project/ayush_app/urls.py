@@ -4,6 +4,7 @@ from .views import MeView, RegisterView, RunPipeline, GoogleAuthView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import PatientListCreateView, PatientRetrieveUpdateDestroyView
 from .views import DiagnosisListCreateView, DiagnosisRetrieveUpdateDestroyView
+from .views import PipelineJobDetailView, RunPipelineBatch, RunPipelineStream, InternalStatusView, MetricsView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -15,7 +16,12 @@ urlpatterns = [
     path('diagnoses/', DiagnosisListCreateView.as_view(), name='diagnosis-list-create'),
     path('diagnoses/<int:pk>/', DiagnosisRetrieveUpdateDestroyView.as_view(), name='diagnosis-detail'),
     path("run_pipeline/", RunPipeline.as_view()),
+    path("run_pipeline/batch/", RunPipelineBatch.as_view(), name="run-pipeline-batch"),
+    path("run_pipeline/stream/", RunPipelineStream.as_view(), name="run-pipeline-stream"),
+    path("pipeline_jobs/<int:pk>/", PipelineJobDetailView.as_view(), name="pipeline-job-detail"),
     path("me/", MeView.as_view(), name="me"),
+    path("internal/status/", InternalStatusView.as_view(), name="internal-status"),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 
 
 ]
\ No newline at end of file
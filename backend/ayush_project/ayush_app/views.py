@@ -3,12 +3,13 @@ from rest_framework.generics import CreateAPIView , ListCreateAPIView ,RetrieveU
 from django.contrib.auth.models import User 
 from .models import Patient, Diagnosis , AuditLog
 from .serializers import RegisterSerializer 
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework import generics, status
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.conf import settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import PatientSerializer, DiagnosisSerializer
+from .pagination import DiagnosisCursorPagination, PatientCursorPagination
 # Create your views here.
 
 class RegisterView(CreateAPIView):
@@ -19,6 +20,7 @@ class RegisterView(CreateAPIView):
 class PatientListCreateView(generics.ListCreateAPIView):
     serializer_class = PatientSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PatientCursorPagination
 
     def get_queryset(self):
         return Patient.objects.filter(user=self.request.user)
@@ -58,8 +60,19 @@ class DiagnosisListCreateView(generics.ListCreateAPIView):
     serializer_class = DiagnosisSerializer
     permission_classes = [IsAuthenticated]
 
+    pagination_class = DiagnosisCursorPagination
+
     def get_queryset(self):
-        return Diagnosis.objects.filter(patient__user=self.request.user)
+        queryset = Diagnosis.objects.filter(patient__user=self.request.user)
+        patient_id = self.request.query_params.get("patient")
+        if patient_id:
+            try:
+                patient_id = int(patient_id)
+            except ValueError:
+                raise ValidationError({"patient": "Must be a patient id."})
+            # Served by the (patient, created_at) index
+            queryset = queryset.filter(patient_id=patient_id)
+        return queryset
 
     def perform_create(self, serializer):
         patient = serializer.validated_data.get("patient")
@@ -77,28 +90,71 @@ class DiagnosisRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         return Diagnosis.objects.filter(patient__user=self.request.user)
 
     def perform_update(self, serializer):
+        from .services import confirmation_of, record_review
+
         patient = serializer.validated_data.get("patient")
         if patient and patient.user != self.request.user:
             raise PermissionDenied("You cannot assign diagnoses to another user's patient.")
-        serializer.save()
+        previous = confirmation_of(serializer.instance)
+        diagnosis = serializer.save()
+        # Choosing the ICD code (the dashboard's manual review) is a clinician's confirmation
+        if "icd_code" in serializer.validated_data:
+            record_review(diagnosis, self.request.user, previous)
+
+    def perform_destroy(self, instance):
+        from .services import forget_review
+
+        forget_review(instance)
+        instance.delete()
 
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
+import json
+import os
+
+from .models import Patient, Diagnosis, AuditLog, PipelineJob
+from .jobs import enqueue_job
+from .serializers import PipelineJobSerializer
+from .services import get_pipeline, save_batch_results, save_pipeline_result
+from .agents.deadline import PIPELINE_LATENCY_BUDGET
+from .agents.langgraph_pipeline.payloads import BATCH_RESULT_FIELDS, parse_fields, select_fields
+
+
+def _wants_async(request):
+    if request.query_params.get("mode") == "async":
+        return True
+    return str(request.data.get("async", "")).lower() in ("1", "true", "yes")
+
+
+def _latency_budget(request, default=PIPELINE_LATENCY_BUDGET):
+    """
+    Latency budget in seconds for a run: the request's `budget_ms`, else
+    `default` (PIPELINE_LATENCY_BUDGET for interactive runs); None for no
+    deadline.
+    """
+    budget_ms = request.data.get("budget_ms")
+    if budget_ms in (None, ""):
+        return default or None
+    try:
+        budget_ms = int(budget_ms)
+    except (TypeError, ValueError):
+        budget_ms = 0
+    if budget_ms <= 0:
+        raise ValidationError({"budget_ms": "Must be a positive number of milliseconds."})
+    return budget_ms / 1000
+
+
+def _result_fields(request):
+    """Result keys requested with ?fields=best,confidence; None for the whole result."""
+    try:
+        return parse_fields(request.query_params.get("fields"))
+    except ValueError as e:
+        raise ValidationError({"fields": str(e)})
 
-from .models import Patient, Diagnosis, AuditLog
-
-# Lazy import to avoid errors during migrations
-_pipeline = None
-
-def get_pipeline():
-    global _pipeline
-    if _pipeline is None:
-        from .agents.langgraph_pipeline import LangGraphAYUSHPipeline
-        _pipeline = LangGraphAYUSHPipeline()
-    return _pipeline
 
 class RunPipeline(APIView):
     permission_classes = [IsAuthenticated]
@@ -122,17 +178,37 @@ class RunPipeline(APIView):
         # 2. FETCH PATIENT
         # -----------------------------
         patient = get_object_or_404(Patient, id=patient_id, user=request.user)
-
+        fields = _result_fields(request)
+
+        # Async submission: queue the run and return the job id immediately.
+        # An explicit budget_ms bounds the run once a worker starts it, and
+        # ?fields= applies when the job is polled.
+        if _wants_async(request):
+            job = enqueue_job(
+                request.user, patient, raw_text, auto_push,
+                budget=_latency_budget(request, default=None),
+                fields=fields,
+            )
+            return Response(
+                {
+                    "message": "Pipeline job queued.",
+                    "job_id": job.id,
+                    "status": job.status,
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
 
         # -----------------------------
         # 3. RUN AGENTIC PIPELINE
         # -----------------------------
+        budget = _latency_budget(request)
         try:
             pipeline = get_pipeline()
             result = pipeline.run(
                 raw_text,
                 f"Patient/{patient.ayush_id}",
-                auto_push
+                auto_push,
+                budget=budget
             )
         except Exception as e:
             import traceback
@@ -156,22 +232,11 @@ class RunPipeline(APIView):
                 status=500
             )
         
-        best = result.get("best", {})
-        icd_code = best.get("code") or "UNK"
-        confidence = result.get("confidence", 0.0)
-        ayush_term = result.get("ayush_term", "Unknown")
-
         # -----------------------------
-        # 5. STORE DIAGNOSIS IN DB
+        # 5. STORE DIAGNOSIS IN DB (+ AUDIT LOG)
         # -----------------------------
         try:
-            diag = Diagnosis.objects.create(
-                patient=patient,
-                ayush_term=ayush_term,
-                icd_code=icd_code,
-                confidence_score=confidence,
-                raw_text=raw_text
-            )
+            diagnoses = save_pipeline_result(patient, patient_id, raw_text, result)
         except Exception as e:
             import traceback
             print(f"Diagnosis creation error: {str(e)}")
@@ -185,30 +250,216 @@ class RunPipeline(APIView):
             )
 
         # -----------------------------
-        # 6. AUDIT LOG (Optional but recommended)
+        # 6. RETURN RESPONSE
         # -----------------------------
-        try:
-            AuditLog.objects.create(
-                action="run_pipeline",
-                details={
-                    "patient_id": patient_id,
-                    "diagnosis_id": diag.id,
-                    "pipeline_state": result
-                }
+        return Response({
+            "message": "Pipeline executed successfully.",
+            "diagnosis_id": diagnoses[0].id,
+            "diagnosis_ids": [d.id for d in diagnoses],
+            "result": select_fields(result, fields)
+        })
+
+
+PIPELINE_BATCH_MAX_ITEMS = int(os.getenv("PIPELINE_BATCH_MAX_ITEMS", "500"))
+
+
+def _batch_item_error(item):
+    """Why a batch item is malformed, or None for a dict with an id-like patient_id and some raw_text."""
+    if not isinstance(item, dict):
+        return "Each item must be an object."
+    patient_id = item.get("patient_id")
+    if isinstance(patient_id, bool) or not (
+        isinstance(patient_id, int) or (isinstance(patient_id, str) and patient_id.isdigit())
+    ):
+        return "Field 'patient_id' must be an integer id."
+    if not isinstance(item.get("raw_text"), str) or not item["raw_text"].strip():
+        return "Field 'raw_text' must be a non-empty string."
+    return None
+
+
+class RunPipelineBatch(APIView):
+    """
+    Run the pipeline over many {patient_id, raw_text, auto_push} items in one
+    request. Identical extracted terms are mapped and validated once, and all
+    diagnoses are stored with a single bulk insert. Returns per-item results
+    in input order, trimmed like /run_pipeline/ (?fields= applies to each;
+    by default the note is not echoed back). A malformed item fails the
+    whole request with its index.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        items = request.data.get("items")
+        if not isinstance(items, list) or not items:
+            return Response({"error": "Field 'items' must be a non-empty list."}, status=400)
+        if len(items) > PIPELINE_BATCH_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {PIPELINE_BATCH_MAX_ITEMS} items per batch."},
+                status=400
             )
-        except Exception as e:
-            # Don't fail if audit log fails
-            print(f"Audit log error (non-critical): {str(e)}")
 
-        # -----------------------------
-        # 7. RETURN RESPONSE
-        # -----------------------------
+        for index, item in enumerate(items):
+            error = _batch_item_error(item)
+            if error:
+                return Response({"error": error, "index": index}, status=400)
+        fields = _result_fields(request)
+
+        patients = {
+            p.id: p
+            for p in Patient.objects.filter(user=request.user, id__in={int(item["patient_id"]) for item in items})
+        }
+
+        results = [None] * len(items)
+        runnable = []
+        for index, item in enumerate(items):
+            patient = patients.get(int(item["patient_id"]))
+            if patient is None:
+                results[index] = {"index": index, "error": "Patient not found."}
+                continue
+            runnable.append((index, patient, item))
+
+        if runnable:
+            try:
+                states = get_pipeline().run_batch([
+                    {
+                        "raw_text": item["raw_text"],
+                        "patient_ref": f"Patient/{patient.ayush_id}",
+                        "auto_push": bool(item.get("auto_push", False)),
+                    }
+                    for _, patient, item in runnable
+                ])
+                diagnoses = save_batch_results([
+                    (patient, item["raw_text"], state)
+                    for (_, patient, item), state in zip(runnable, states)
+                ])
+            except Exception as e:
+                import traceback
+                print(f"Batch pipeline error: {str(e)}")
+                print(f"Traceback: {traceback.format_exc()}")
+                return Response({"error": f"Batch pipeline execution failed: {str(e)}"}, status=500)
+
+            for (index, _, _), state, item_diagnoses in zip(runnable, states, diagnoses):
+                results[index] = {
+                    "index": index,
+                    "diagnosis_id": item_diagnoses[0].id,
+                    "diagnosis_ids": [d.id for d in item_diagnoses],
+                    "result": select_fields(state, BATCH_RESULT_FIELDS if fields is None else fields),
+                }
+
         return Response({
-            "message": "Pipeline executed successfully.",
-            "diagnosis_id": diag.id,
-            "result": result
+            "message": f"Processed {len(runnable)} of {len(items)} items.",
+            "results": results
         })
 
+
+# Fields sent to the client per pipeline event; map/validate fire once per term
+STREAM_EVENT_FIELDS = {
+    "extract": ["ayush_term", "ayush_terms"],
+    "map": [
+        "term_index", "ayush_term", "candidates", "mapping_source", "needs_manual_review",
+        "english_translation", "detailed_translation",
+    ],
+    "validate": ["term_index", "ayush_term", "best", "confidence", "reason", "needs_human_review", "skipped_steps"],
+    "output": ["fhir", "fhir_conditions", "pushed", "push_response", "skipped_steps"],
+}
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class RunPipelineStream(APIView):
+    """
+    Server-Sent Events variant of /run_pipeline/: emits extract, then map and
+    validate once per extracted term, then output, then a `done` event
+    carrying the diagnosis ids.
+    Clients may disconnect early (e.g. once they have the candidates); the
+    remaining nodes are cancelled and no diagnosis is stored.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        patient_id = request.data.get("patient_id")
+        raw_text = request.data.get("raw_text")
+        auto_push = bool(request.data.get("auto_push", False))
+
+        if not patient_id or not raw_text:
+            return Response(
+                {"error": "Fields 'patient_id' and 'raw_text' are required."},
+                status=400
+            )
+
+        patient = get_object_or_404(Patient, id=patient_id, user=request.user)
+        budget = _latency_budget(request)
+
+        def events():
+            final_state = None
+            try:
+                stream = get_pipeline().stream(raw_text, f"Patient/{patient.ayush_id}", auto_push, budget=budget)
+                for node, state in stream:
+                    fields = STREAM_EVENT_FIELDS.get(node, [])
+                    yield _sse(node, {k: state.get(k) for k in fields})
+                    if node == "output":
+                        final_state = state
+            except Exception as e:
+                print(f"Pipeline stream error: {str(e)}")
+                yield _sse("error", {"error": f"Pipeline execution failed: {str(e)}"})
+                return
+
+            if not final_state:
+                yield _sse("error", {"error": "Pipeline returned empty result."})
+                return
+            try:
+                diagnoses = save_pipeline_result(patient, patient_id, raw_text, final_state)
+            except Exception as e:
+                print(f"Diagnosis creation error: {str(e)}")
+                yield _sse("error", {"error": f"Failed to save diagnosis: {str(e)}"})
+                return
+            yield _sse("done", {"diagnosis_id": diagnoses[0].id, "diagnosis_ids": [d.id for d in diagnoses]})
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+        return response
+
+
+class PipelineJobDetailView(generics.RetrieveAPIView):
+    serializer_class = PipelineJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return PipelineJob.objects.filter(user=self.request.user)
+
+
+class MetricsView(APIView):
+    """
+    Staff-only Prometheus scrape target (text exposition format); empty unless
+    METRICS_ENABLED. Reports only the worker process that serves the scrape,
+    labelled worker=..., so each worker must be scraped separately (e.g. on
+    its own port) - through a shared load balancer scrapes hit a random one.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from django.http import HttpResponse
+
+        from .agents.metrics import render_prometheus
+        return HttpResponse(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class InternalStatusView(APIView):
+    """
+    Staff-only view of pipeline health: circuit breakers, the shared retry
+    budget, and how extracted terms are split across the fast-path routes.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        from .agents.langgraph_pipeline.routing import route_counters
+        from .agents.resilience import resilience_status
+        return Response({**resilience_status(), "routes": route_counters.snapshot()})
+
+
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ayush_project.settings')
 
 application = get_asgi_application()
+
+# Opt-in: also drain queued /run_pipeline/ jobs from this process when
+# PIPELINE_JOB_WORKERS > 0 (otherwise run `manage.py run_pipeline_workers`).
+from ayush_app.jobs import start_worker_pool  # noqa: E402
+
+start_worker_pool()
@@ -4,11 +4,16 @@ import { patientAPI, diagnosisAPI, pipelineAPI } from '../services/api';
 import PatientModal from '../components/PatientModal';
 import './Dashboard.css';
 
+// List endpoints are cursor-paginated; `next` is a full URL carrying the cursor
+const nextCursor = (next) => (next ? new URL(next).searchParams.get('cursor') : null);
+
 function Dashboard() {
   const { user, logout } = useAuth();
   const [patients, setPatients] = useState([]);
   const [selectedPatient, setSelectedPatient] = useState(null);
   const [diagnoses, setDiagnoses] = useState([]);
+  const [patientsCursor, setPatientsCursor] = useState(null);
+  const [diagnosesCursor, setDiagnosesCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [pipelineState, setPipelineState] = useState(null);
   const [rawText, setRawText] = useState('');
@@ -34,23 +39,27 @@ function Dashboard() {
     }
   }, [selectedPatient]);
 
-  const fetchPatients = async () => {
+  const fetchPatients = async (cursor = null) => {
     try {
-      const response = await patientAPI.list();
-      setPatients(response.data);
-      if (response.data.length > 0 && !selectedPatient) {
-        setSelectedPatient(response.data[0]);
+      const response = await patientAPI.list(cursor ? { cursor } : undefined);
+      const { results, next } = response.data;
+      setPatients((prev) => (cursor ? [...prev, ...results] : results));
+      setPatientsCursor(nextCursor(next));
+      if (results.length > 0 && !selectedPatient) {
+        setSelectedPatient(results[0]);
       }
     } catch (error) {
       console.error('Error fetching patients:', error);
     }
   };
 
-  const fetchDiagnoses = async (patientId) => {
+  const fetchDiagnoses = async (patientId, cursor = null) => {
     try {
-      const response = await diagnosisAPI.list();
-      const filtered = response.data.filter((d) => d.patient === patientId);
-      setDiagnoses(filtered);
+      const params = cursor ? { patient: patientId, cursor } : { patient: patientId };
+      const response = await diagnosisAPI.list(params);
+      const { results, next } = response.data;
+      setDiagnoses((prev) => (cursor ? [...prev, ...results] : results));
+      setDiagnosesCursor(nextCursor(next));
     } catch (error) {
       console.error('Error fetching diagnoses:', error);
     }
@@ -324,6 +333,11 @@ function Dashboard() {
               {patients.length === 0 && (
                 <p className="empty-state">No patients yet. Add one to get started.</p>
               )}
+              {patientsCursor && (
+                <button onClick={() => fetchPatients(patientsCursor)} className="load-more-button">
+                  Load more
+                </button>
+              )}
             </div>
           </div>
         </div>
@@ -541,6 +555,14 @@ function Dashboard() {
                   {diagnoses.length === 0 && (
                     <p className="empty-state">No diagnoses yet. Run a pipeline to get started.</p>
                   )}
+                  {diagnosesCursor && (
+                    <button
+                      onClick={() => fetchDiagnoses(selectedPatient.id, diagnosesCursor)}
+                      className="load-more-button"
+                    >
+                      Load more
+                    </button>
+                  )}
                 </div>
               </div>
             </>
@@ -62,7 +62,7 @@ export const authAPI = {
 
 // Patient API
 export const patientAPI = {
-  list: () => api.get('/patients/'),
+  list: (params) => api.get('/patients/', { params }),
   create: (data) => api.post('/patients/', data),
   get: (id) => api.get(`/patients/${id}/`),
   update: (id, data) => api.put(`/patients/${id}/`, data),
@@ -71,7 +71,7 @@ export const patientAPI = {
 
 // Diagnosis API
 export const diagnosisAPI = {
-  list: () => api.get('/diagnoses/'),
+  list: (params) => api.get('/diagnoses/', { params }),
   create: (data) => api.post('/diagnoses/', data),
   get: (id) => api.get(`/diagnoses/${id}/`),
   update: (id, data) => api.put(`/diagnoses/${id}/`, data),